@@ -8,8 +8,10 @@ import os
 import sys
 import logging
 from datetime import datetime
+from decimal import Decimal, InvalidOperation
 from pathlib import Path
 from functools import wraps
+from typing import Optional
 from flask import Flask, request, jsonify, session
 from flask_cors import CORS
 from flask_limiter import Limiter
@@ -25,10 +27,19 @@ logger = logging.getLogger(__name__)
 project_root = Path(__file__).parent
 sys.path.insert(0, str(project_root))
 
-from src.processors.email_processor import EmailProcessor  # noqa: E402
+from src.processors.email_accounts import email_sources  # noqa: E402
+from src.processors.fetch_coordinator import FetchCoordinator  # noqa: E402
+from src.processors.ingestion_pipeline import (  # noqa: E402
+    IngestionPipeline
+)
+from src.processors.imap_pool import get_connection_pool  # noqa: E402
 from src.processors.pdf_parser import ReceiptParser  # noqa: E402
-from src.processors.ledger_manager import LedgerManager  # noqa: E402
-from src.processors.bank_processor import BankProcessor  # noqa: E402
+from src.processors.ledger_manager import get_ledger_manager  # noqa: E402
+from src.processors.bank_processor import (  # noqa: E402
+    BankProcessor, MATCH_BACKENDS, MATCH_MODES
+)
+from src.processors.matching import MatchTolerance  # noqa: E402
+from src.core.config import MAX_UPLOAD_SIZE_MB  # noqa: E402
 
 app = Flask(__name__)
 app.secret_key = os.environ.get('SECRET_KEY', secrets.token_hex(32))
@@ -57,7 +68,7 @@ UPLOAD_FOLDER.mkdir(exist_ok=True)
 
 # File upload configuration
 ALLOWED_EXTENSIONS = {'csv'}
-MAX_FILE_SIZE = 10 * 1024 * 1024  # 10MB
+MAX_FILE_SIZE = MAX_UPLOAD_SIZE_MB * 1024 * 1024
 
 # Simple user credentials (in production, use proper user management)
 ADMIN_USERNAME = os.environ.get('ADMIN_USERNAME')
@@ -92,6 +103,74 @@ def allowed_file(filename):
            filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
 
+def parse_ledger_query(args) -> dict:
+    """Convert /api/ledger query parameters to query_transactions arguments"""
+    query = {}
+
+    for name in ('start_date', 'end_date'):
+        if args.get(name):
+            try:
+                query[name] = datetime.strptime(
+                    args[name], '%Y-%m-%d'
+                ).date()
+            except ValueError:
+                raise ValueError(f'Invalid {name} format. Use YYYY-MM-DD')
+
+    if args.get('payee'):
+        query['payee_prefix'] = args['payee']
+
+    for name in ('min_amount', 'max_amount'):
+        if args.get(name):
+            try:
+                value = Decimal(args[name])
+            except InvalidOperation:
+                value = None
+            # NaN and Infinity parse, but do not compare in the index
+            if value is None or not value.is_finite():
+                raise ValueError(f'Invalid {name}. Use a decimal number')
+            query[name] = value
+
+    order = args.get('order', 'asc')
+    if order not in ('asc', 'desc'):
+        raise ValueError('Invalid order. Use asc or desc')
+    query['descending'] = order == 'desc'
+
+    for name in ('limit', 'offset'):
+        if args.get(name):
+            try:
+                value = int(args[name])
+            except ValueError:
+                value = -1
+            if value < 0:
+                raise ValueError(f'Invalid {name}. Use a non-negative integer')
+            query[name] = value
+
+    if args.get('cursor'):
+        query['cursor'] = args['cursor']
+
+    return query
+
+
+def parse_match_tolerance(form) -> Optional[MatchTolerance]:
+    """Build match tolerances from bank statement upload form fields"""
+    fields = ('date_window_days', 'amount_tolerance',
+              'amount_tolerance_percent')
+    if not any(form.get(name) for name in fields):
+        return None
+
+    try:
+        return MatchTolerance(
+            days=int(form.get('date_window_days') or 0),
+            amount=float(form.get('amount_tolerance') or 0),
+            percent=float(form.get('amount_tolerance_percent') or 0)
+        )
+    except ValueError:
+        raise ValueError(
+            'Invalid match tolerance. Use non-negative numbers for '
+            'date_window_days, amount_tolerance and amount_tolerance_percent'
+        )
+
+
 @app.route('/api/test-session')
 def test_session():
     """Test endpoint to check session state"""
@@ -193,9 +272,17 @@ def process_emails():
         # Parse optional date parameters
         start_date_str = None
         end_date_str = None
+        sync = False
         if request.is_json:
             start_date_str = request.json.get('start_date')
             end_date_str = request.json.get('end_date')
+            sync = bool(request.json.get('sync'))
+
+        if sync and (start_date_str or end_date_str):
+            return jsonify({
+                'success': False,
+                'error': 'sync cannot be combined with a date range'
+            }), 400
 
         start_date = None
         end_date = None
@@ -222,35 +309,45 @@ def process_emails():
                     'error': 'Invalid end_date format. Use YYYY-MM-DD'
                 }), 400
 
-        email_processor = EmailProcessor()
         receipt_parser = ReceiptParser()
-        ledger_manager = LedgerManager()
-
-        attachments = email_processor.fetch_pdf_attachments(
-            start_date=start_date,
-            end_date=end_date
-        )
+        ledger_manager = get_ledger_manager()
         processed_count = 0
         results = []
 
-        for filename, file_path in attachments:
-            receipt_data = receipt_parser.parse_receipt(file_path)
-            if receipt_data.get('amount'):
-                ledger_manager.add_transaction(receipt_data)
-                processed_count += 1
-                results.append({
-                    'filename': filename,
-                    'merchant': receipt_data.get('merchant', 'Unknown'),
-                    'amount': receipt_data.get('amount', 'Unknown'),
-                    'date': receipt_data.get('date', 'Unknown')
-                })
+        # Accounts and folders are fetched concurrently; pooled sessions
+        # skip the TLS handshake and login per request
+        coordinator = FetchCoordinator(
+            email_sources(),
+            connect=lambda account: get_connection_pool(account).connection()
+        )
+        batches = coordinator.iter_attachments(
+            sync=sync,
+            start_date=start_date,
+            end_date=end_date,
+            defer_checkpoints=True
+        )
 
-        email_processor.close()
+        # PDFs are parsed while later batches download; each batch is
+        # committed before its sync checkpoint is saved
+        pipeline = IngestionPipeline(receipt_parser, ledger_manager)
+        for filename, receipt_data in pipeline.run(batches):
+            processed_count += 1
+            results.append({
+                'filename': filename,
+                'merchant': receipt_data.get('merchant', 'Unknown'),
+                'amount': receipt_data.get('amount', 'Unknown'),
+                'date': receipt_data.get('date', 'Unknown')
+            })
 
         return jsonify({
             'success': True,
             'processed_count': processed_count,
             'results': results,
+            'errors': [
+                f'{account.user}/{folder}: {error}'
+                for (account, folder), error in coordinator.errors
+            ],
+            'sync': sync,
             'time_window': {
                 'start_date': start_date_str,
                 'end_date': end_date_str
@@ -299,7 +396,28 @@ def upload_bank_statement():
         if file_size > MAX_FILE_SIZE:
             return jsonify({
                 'success': False,
-                'error': 'File too large. Maximum 10MB allowed'
+                'error': (
+                    f'File too large. Maximum {MAX_UPLOAD_SIZE_MB}MB allowed'
+                )
+            }), 400
+
+        try:
+            tolerance = parse_match_tolerance(request.form)
+            match_mode = request.form.get('match_mode') or None
+            if match_mode and match_mode not in MATCH_MODES:
+                raise ValueError(
+                    f'Invalid match_mode. Use one of: {", ".join(MATCH_MODES)}'
+                )
+            match_backend = request.form.get('backend') or None
+            if match_backend and match_backend not in MATCH_BACKENDS:
+                raise ValueError(
+                    'Invalid backend. Use one of: '
+                    f'{", ".join(MATCH_BACKENDS)}'
+                )
+        except ValueError as e:
+            return jsonify({
+                'success': False,
+                'error': str(e)
             }), 400
 
         # Secure filename
@@ -310,12 +428,17 @@ def upload_bank_statement():
         file.save(file_path)
         
         # Process file
-        bank_processor = BankProcessor(LedgerManager())
-        bank_transactions = bank_processor.parse_csv(str(file_path))
-        comparison = bank_processor.compare_transactions(bank_transactions)
-        
-        # Clean up uploaded file
-        file_path.unlink(missing_ok=True)
+        bank_processor = BankProcessor(get_ledger_manager(), tolerance)
+        try:
+            # Stream rows straight into the comparison
+            comparison = bank_processor.compare_transactions(
+                bank_processor.iter_csv(str(file_path)),
+                mode=match_mode,
+                backend=match_backend
+            )
+        finally:
+            # Clean up uploaded file
+            file_path.unlink(missing_ok=True)
         
         return jsonify({
             'success': True,
@@ -339,14 +462,24 @@ def upload_bank_statement():
 @require_auth
 @limiter.limit("100 per hour")
 def view_ledger():
-    """Get ledger transactions"""
+    """Get ledger transactions with optional filters and pagination"""
     try:
-        ledger_manager = LedgerManager()
-        transactions = ledger_manager.get_transactions()
-        
+        ledger_manager = get_ledger_manager()
+        try:
+            query = parse_ledger_query(request.args)
+            result = ledger_manager.query_transactions(**query)
+        except ValueError as e:
+            return jsonify({
+                'success': False,
+                'error': str(e)
+            }), 400
+
         return jsonify({
             'success': True,
-            'transactions': transactions
+            'transactions': result['transactions'],
+            'total': result['total'],
+            'total_amount': result['total_amount'],
+            'next_cursor': result['next_cursor']
         })
     except Exception as e:
         logger.error(f"Error viewing ledger: {e}")
@@ -37,17 +37,16 @@ function Dashboard() {
     try {
       setLoading(true);
       const [ledgerResponse, healthResponse] = await Promise.all([
-        ledgerService.getTransactions(),
+        ledgerService.getTransactions({ limit: 5, order: 'desc' }),
         healthService.checkHealth(),
       ]);
 
-      const transactions = ledgerResponse.transactions || [];
-      const totalAmount = transactions.reduce((sum, tx) => sum + parseFloat(tx.amount || 0), 0);
+      const recentTransactions = (ledgerResponse.transactions || []).reverse();
 
       setStats({
-        totalTransactions: transactions.length,
-        totalAmount,
-        recentTransactions: transactions.slice(-5),
+        totalTransactions: ledgerResponse.total || 0,
+        totalAmount: parseFloat(ledgerResponse.total_amount || 0),
+        recentTransactions,
         health: healthResponse.status,
       });
     } catch (err) {
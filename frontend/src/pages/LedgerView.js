@@ -53,7 +53,12 @@ const columns = [
 function LedgerView() {
   const [transactions, setTransactions] = useState([]);
   const [loading, setLoading] = useState(true);
+  const [initialLoad, setInitialLoad] = useState(true);
   const [error, setError] = useState(null);
+  const [paginationModel, setPaginationModel] = useState({
+    page: 0,
+    pageSize: 10,
+  });
   const [stats, setStats] = useState({
     totalTransactions: 0,
     totalAmount: 0,
@@ -61,28 +66,32 @@ function LedgerView() {
   });
 
   useEffect(() => {
-    loadTransactions();
-  }, []);
+    loadTransactions(paginationModel);
+  }, [paginationModel]);
 
-  const loadTransactions = async () => {
+  const loadTransactions = async ({ page, pageSize }) => {
     try {
       setLoading(true);
-      const response = await ledgerService.getTransactions();
+      // Only fetch the visible page, the server reports totals
+      const response = await ledgerService.getTransactions({
+        limit: pageSize,
+        offset: page * pageSize,
+      });
       
       const txData = response.transactions || [];
       const rows = txData.map((tx, index) => ({
-        id: index,
+        id: page * pageSize + index,
         ...tx,
       }));
       
       setTransactions(rows);
       
-      // Calculate stats
-      const totalAmount = txData.reduce((sum, tx) => sum + parseFloat(tx.amount || 0), 0);
-      const averageAmount = txData.length > 0 ? totalAmount / txData.length : 0;
+      const totalTransactions = response.total || 0;
+      const totalAmount = parseFloat(response.total_amount || 0);
+      const averageAmount = totalTransactions > 0 ? totalAmount / totalTransactions : 0;
       
       setStats({
-        totalTransactions: txData.length,
+        totalTransactions,
         totalAmount,
         averageAmount,
       });
@@ -91,10 +100,11 @@ function LedgerView() {
       console.error('Ledger error:', err);
     } finally {
       setLoading(false);
+      setInitialLoad(false);
     }
   };
 
-  if (loading) {
+  if (initialLoad) {
     return (
       <Box display="flex" justifyContent="center" alignItems="center" minHeight="400px">
         <CircularProgress />
@@ -180,8 +190,11 @@ function LedgerView() {
         <DataGrid
           rows={transactions}
           columns={columns}
-          pageSize={10}
-          rowsPerPageOptions={[10, 25, 50]}
+          paginationMode="server"
+          rowCount={stats.totalTransactions}
+          paginationModel={paginationModel}
+          onPaginationModelChange={setPaginationModel}
+          pageSizeOptions={[10, 25, 50]}
           disableSelectionOnClick
           loading={loading}
           sx={{
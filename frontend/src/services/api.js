@@ -81,8 +81,8 @@ export const bankService = {
 };
 
 export const ledgerService = {
-  async getTransactions() {
-    const response = await api.get('/api/ledger');
+  async getTransactions(query = {}) {
+    const response = await api.get('/api/ledger', { params: query });
     return response.data;
   },
 };
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+
+"""
+Benchmark bank statement CSV parsing: per-row format search vs. streaming
+
+Usage: python scripts/bench_bank_csv.py [ROWS]
+"""
+
+import csv
+import random
+import resource
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+from pathlib import Path
+from unittest.mock import Mock
+
+# Add project root to path
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from src.processors.bank_processor import BankProcessor  # noqa: E402
+
+DEFAULT_ROWS = 1_000_000
+
+
+def write_statement(path: Path, rows: int) -> None:
+    """Write a synthetic MM/DD/YYYY statement, the slowest legacy case"""
+    rng = random.Random(rows)
+    start = date(2024, 1, 1)
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['Date', 'Description', 'Amount', 'Type'])
+        for i in range(rows):
+            tx_date = start + timedelta(days=rng.randrange(365))
+            writer.writerow([
+                tx_date.strftime('%m/%d/%Y'),
+                f'MERCHANT {i % 5000}',
+                f'{rng.uniform(1, 500):.2f}',
+                'DEBIT'
+            ])
+
+
+def legacy_parse(bank_processor: BankProcessor, path: Path) -> int:
+    """The previous parser: DictReader into a list, every format per row"""
+    transactions = []
+    with open(path, 'r', encoding='utf-8') as file:
+        for row in csv.DictReader(file):
+            transactions.append({
+                'date': bank_processor._parse_date(row.get('Date', '')),
+                'description': row.get('Description', ''),
+                'amount': row.get('Amount', 0),
+                'type': row.get('Type', '')
+            })
+    return len(transactions)
+
+
+def streaming_parse(bank_processor: BankProcessor, path: Path) -> int:
+    """Consume the streaming parser without keeping the rows"""
+    return sum(1 for _ in bank_processor.iter_csv(str(path)))
+
+
+def max_rss_mb() -> float:
+    """Peak resident memory of this process in MB"""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def bench(name: str, parse, bank_processor: BankProcessor, path: Path) -> None:
+    """Time one parser and report its throughput and memory growth"""
+    rss_before = max_rss_mb()
+    start = time.perf_counter()
+    count = parse(bank_processor, path)
+    elapsed = time.perf_counter() - start
+    print(
+        f'{name:<10} {count:>10,} rows | {elapsed:7.2f}s | '
+        f'{count / elapsed:>10,.0f} rows/s | '
+        f'peak RSS +{max_rss_mb() - rss_before:7.1f} MB'
+    )
+
+
+def main() -> int:
+    """Main entry point"""
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_ROWS
+    bank_processor = BankProcessor(Mock())
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = Path(tmp_dir) / 'statement.csv'
+        write_statement(path, rows)
+        print(f'Statement: {path.stat().st_size / 1e6:.1f} MB')
+
+        # Streaming first, as peak RSS only ever grows
+        bench('streaming', streaming_parse, bank_processor, path)
+        bench('legacy', legacy_parse, bank_processor, path)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+
+"""
+Benchmark email fetching against a local fake IMAP server with latency
+
+Compares downloading whole messages (RFC822) with the BODYSTRUCTURE-first
+download of PDF parts, at several FETCH batch sizes.
+
+Usage: python scripts/bench_imap_fetch.py [MESSAGES] [LATENCY_MS]
+"""
+
+import contextlib
+import io
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from email import message_from_bytes
+from pathlib import Path
+from unittest.mock import patch
+
+# Add project root to path
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from src.processors.email_processor import EmailProcessor  # noqa: E402
+from tests.fake_imap_server import (  # noqa: E402
+    FakeIMAPServer, PASSWORD, USER, build_message
+)
+
+DEFAULT_MESSAGES = 1000
+DEFAULT_LATENCY_MS = 20
+BATCH_SIZES = (1, 50, 200)
+
+
+def fill_mailbox(server: FakeIMAPServer, count: int) -> None:
+    """Add receipts with a PDF and an image, and image-only newsletters"""
+    start = datetime(2024, 1, 1)
+    for i in range(count):
+        if i % 2:
+            attachments = [('banner.png', b'\x89PNG' + b'0' * 200_000)]
+        else:
+            attachments = [
+                (f'receipt{i}.pdf', b'%PDF-1.4 ' + b'0' * 20_000),
+                ('logo.png', b'\x89PNG' + b'0' * 50_000)
+            ]
+        server.add_message(build_message(
+            f'Message {i}', start + timedelta(hours=i), attachments
+        ))
+
+
+def full_download(processor: EmailProcessor, batch_size: int) -> int:
+    """Download whole messages and count their PDFs, as before"""
+    messages = processor._search('INBOX', None, None)
+    count = 0
+    for offset in range(0, len(messages), batch_size):
+        response = processor.client.fetch(
+            messages[offset:offset + batch_size], ['RFC822']
+        )
+        for data in response.values():
+            email_message = message_from_bytes(data[b'RFC822'])
+            count += sum(
+                1 for part in email_message.walk()
+                if (part.get_filename() or '').lower().endswith('.pdf')
+            )
+    return count
+
+
+def selective_download(processor: EmailProcessor, batch_size: int) -> int:
+    """Download only the PDF parts"""
+    return sum(
+        len(batch)
+        for batch in processor.iter_pdf_attachments(batch_size=batch_size)
+    )
+
+
+def bench(server: FakeIMAPServer, name: str, fetch, batch_size: int) -> None:
+    """Fetch every message one way and report time and bytes"""
+    for folder in server.folders.values():
+        for msg in folder:
+            msg.flags.clear()
+    fetches_before = server.command_count('FETCH')
+    bytes_before = server.bytes_sent
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        processor = EmailProcessor()
+        start = time.perf_counter()
+        count = fetch(processor, batch_size)
+        elapsed = time.perf_counter() - start
+        processor.close()
+
+    fetches = server.command_count('FETCH') - fetches_before
+    megabytes = (server.bytes_sent - bytes_before) / 1e6
+    print(
+        f'{name:<10} batch {batch_size:>4} | {count:>6,} PDFs | '
+        f'{fetches:>6,} FETCH | {megabytes:8.1f} MB | {elapsed:7.2f}s'
+    )
+
+
+def main() -> int:
+    """Main entry point"""
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_MESSAGES
+    latency_ms = (
+        float(sys.argv[2]) if len(sys.argv) > 2 else DEFAULT_LATENCY_MS
+    )
+
+    with tempfile.TemporaryDirectory() as tmp_dir, \
+            FakeIMAPServer(latency=latency_ms / 1000) as server:
+        fill_mailbox(server, count)
+        print(f'{count:,} messages, {latency_ms:g} ms per round trip')
+        with patch.multiple(
+            'src.processors.email_processor',
+            EMAIL_HOST='127.0.0.1',
+            EMAIL_PORT=server.port,
+            EMAIL_SSL=False,
+            EMAIL_USER=USER,
+            EMAIL_PASSWORD=PASSWORD,
+            EMAIL_ARCHIVE_ATTACHMENTS=False,
+            ATTACHMENTS_DIR=Path(tmp_dir)
+        ):
+            for batch_size in BATCH_SIZES:
+                bench(server, 'full', full_download, batch_size)
+                bench(server, 'selective', selective_download, batch_size)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
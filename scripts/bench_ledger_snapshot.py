@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+
+"""
+Benchmark ledger snapshot loading against a full Beancount text parse
+
+Usage: python scripts/bench_ledger_snapshot.py [SIZE ...]
+"""
+
+import random
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+from pathlib import Path
+
+# Add project root to path
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from beancount.parser import parser  # noqa: E402
+from src.processors.ledger_snapshot import (  # noqa: E402
+    hash_file, load_snapshot, save_snapshot
+)
+
+DEFAULT_SIZES = [10_000, 100_000, 1_000_000]
+MERCHANTS = [
+    'Walmart Supercenter', 'Starbucks Coffee', 'Amazon.com',
+    'Shell Gas Station', 'Whole Foods Market', 'Uber', 'Costco Wholesale'
+]
+
+
+def write_ledger(path: Path, size: int) -> None:
+    """Write a synthetic ledger with the given number of transactions"""
+    rng = random.Random(size)
+    start = date(2020, 1, 1)
+    with open(path, 'w') as f:
+        f.write('1970-01-01 open Assets:Checking USD\n')
+        f.write('1970-01-01 open Expenses:Receipts USD\n')
+        for _ in range(size):
+            tx_date = start + timedelta(days=rng.randrange(1500))
+            amount = f'{rng.uniform(1, 500):.2f}'
+            f.write(
+                f'{tx_date} * "{rng.choice(MERCHANTS)}" "Receipt from email"\n'
+                f'  Expenses:Receipts   {amount} USD\n'
+                f'  Assets:Checking    -{amount} USD\n'
+            )
+
+
+def bench(size: int) -> None:
+    """Time text parsing and snapshot loading for one ledger size"""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        ledger_file = Path(tmp_dir) / 'ledger.beancount'
+        write_ledger(ledger_file, size)
+
+        start = time.perf_counter()
+        entries, errors, _ = parser.parse_file(str(ledger_file))
+        parse_time = time.perf_counter() - start
+        if errors:
+            raise RuntimeError(f'Synthetic ledger has {len(errors)} errors')
+
+        source_hash = hash_file(ledger_file)
+        save_snapshot(ledger_file, source_hash, entries)
+
+        start = time.perf_counter()
+        snapshot_hash = hash_file(ledger_file)
+        loaded = load_snapshot(ledger_file, snapshot_hash)
+        load_time = time.perf_counter() - start
+        if loaded is None or len(loaded) != len(entries):
+            raise RuntimeError('Snapshot did not round-trip')
+
+        ledger_mb = ledger_file.stat().st_size / 1e6
+        print(
+            f'{size:>10,} entries | {ledger_mb:8.1f} MB | '
+            f'parse {parse_time:8.2f}s | snapshot {load_time:8.2f}s | '
+            f'{parse_time / load_time:6.1f}x'
+        )
+
+
+def main() -> int:
+    """Main entry point"""
+    sizes = [int(arg) for arg in sys.argv[1:]] or DEFAULT_SIZES
+    for size in sizes:
+        bench(size)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+
+"""
+Benchmark parsing receipts from memory against saving and reopening them,
+one at a time against the parse_many process pool, and against the
+receipt cache
+
+Point DIR at the disk attachments are saved to, e.g. a container's
+ephemeral volume, to see the cost of the write-then-read round trip.
+
+Usage: python scripts/bench_receipt_parse.py [ROUNDS] [DIR]
+"""
+
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# Add project root to path
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from src.processors.pdf_parser import ReceiptParser  # noqa: E402
+from src.processors.receipt_cache import ReceiptCache  # noqa: E402
+
+DEFAULT_ROUNDS = 20
+RECEIPTS_DIR = project_root / 'data' / 'sample_data' / 'receipts'
+
+
+def from_disk(parser: ReceiptParser, directory: Path, payloads) -> None:
+    """Save each payload, then parse it from its path, as before"""
+    for filename, payload in payloads:
+        file_path = directory / filename
+        with open(file_path, 'wb') as f:
+            f.write(payload)
+            f.flush()
+            os.fsync(f.fileno())
+        parser.parse_receipt(file_path)
+        file_path.unlink()
+
+
+def from_memory(parser: ReceiptParser, directory: Path, payloads) -> None:
+    """Parse each payload straight from memory"""
+    for filename, payload in payloads:
+        parser.parse_receipt(payload, filename)
+
+
+def parallel(parser: ReceiptParser, directory: Path, payloads) -> None:
+    """Parse the payloads from memory on the warm process pool"""
+    for result in parser.parse_many(payloads):
+        pass
+
+
+def cached(parser: ReceiptParser, directory: Path, payloads) -> None:
+    """Parse each payload through a receipt cache in directory"""
+    cached_parser = ReceiptParser(
+        ReceiptCache(directory / 'receipt_cache.sqlite3')
+    )
+    from_memory(cached_parser, directory, payloads)
+
+
+def main() -> int:
+    """Main entry point"""
+    rounds = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_ROUNDS
+    payloads = [
+        (path.name, path.read_bytes())
+        for path in sorted(RECEIPTS_DIR.glob('*.pdf'))
+    ]
+    if not payloads:
+        print('No sample receipts found. Run generate_sample_pdfs.py first.')
+        return 1
+
+    parser = ReceiptParser()
+    parser.cache = None
+    # Start the pool's workers before timing
+    list(parser.parse_many(payloads))
+    with tempfile.TemporaryDirectory(
+        dir=sys.argv[2] if len(sys.argv) > 2 else None
+    ) as tmp_dir:
+        print(f'{len(payloads)} receipts x {rounds} rounds in {tmp_dir}')
+        for name, parse in (
+            ('disk', from_disk), ('memory', from_memory),
+            ('pool', parallel), ('cached', cached)
+        ):
+            with contextlib.redirect_stdout(io.StringIO()):
+                start = time.perf_counter()
+                for _ in range(rounds):
+                    parse(parser, Path(tmp_dir), payloads)
+                elapsed = time.perf_counter() - start
+            per_receipt = elapsed / (rounds * len(payloads)) * 1000
+            print(f'{name:<7} {elapsed:7.2f}s | {per_receipt:6.2f} ms/receipt')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+
+"""
+Benchmark receipt template dispatch as the number of templates grows
+
+Each round dispatches the sample receipts' text among the built-in
+templates plus COUNT synthetic ones, through the registry's domain and
+keyword index and through a scan trying every template in turn, then
+times the whole parse_text with the index.
+
+Usage: python scripts/bench_receipt_templates.py [COUNT ...]
+"""
+
+import contextlib
+import io
+import sys
+import time
+from pathlib import Path
+
+# Add project root to path
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from src.processors.pdf_parser import ReceiptParser  # noqa: E402
+from src.processors.receipt_templates import (  # noqa: E402
+    HEADER_LINES, TEMPLATES, ReceiptTemplate, TemplateRegistry
+)
+
+DEFAULT_COUNTS = [0, 100, 1000, 10000]
+ROUNDS = 200
+RECEIPTS_DIR = project_root / 'data' / 'sample_data' / 'receipts'
+
+
+def templates(count: int):
+    """The built-in templates and count synthetic merchants"""
+    return TEMPLATES + [
+        ReceiptTemplate(
+            f'Merchant {n}', [f'merchant{n}.example.com'],
+            [f'MERCHANT {n}']
+        )
+        for n in range(count)
+    ]
+
+
+def scan(candidates, text: str, sender: str):
+    """The first template whose domain or keyword matches, trying all"""
+    domain = sender.rpartition('@')[2]
+    header = [
+        ' '.join(line.upper().split())
+        for line in text.splitlines()[:HEADER_LINES]
+    ]
+    for template in candidates:
+        if domain in template.domains or any(
+            line.startswith(keyword)
+            for keyword in template.keywords for line in header
+        ):
+            return template
+    return None
+
+
+def main() -> int:
+    """Main entry point"""
+    counts = [int(arg) for arg in sys.argv[1:]] or DEFAULT_COUNTS
+    parser = ReceiptParser()
+    parser.cache = None
+    with contextlib.redirect_stdout(io.StringIO()):
+        texts = [
+            parser.extract_text(path)
+            for path in sorted(RECEIPTS_DIR.glob('*.pdf'))
+        ]
+    if not texts:
+        print('No sample receipts found. Run generate_sample_pdfs.py first.')
+        return 1
+
+    # Mail from senders no template knows, the worst case for the scan
+    sender = 'receipts@example.org'
+    print(f'{len(texts)} receipts x {ROUNDS} rounds')
+    for count in counts:
+        candidates = templates(count)
+        registry = parser.templates = TemplateRegistry(candidates)
+        timings = []
+        for run in (
+            lambda text: registry.match(text, sender),
+            lambda text: scan(candidates, text, sender),
+            lambda text: parser.parse_text(text, sender=sender)
+        ):
+            start = time.perf_counter()
+            for _ in range(ROUNDS):
+                for text in texts:
+                    run(text)
+            timings.append(
+                (time.perf_counter() - start) / (ROUNDS * len(texts)) * 1e6
+            )
+
+        index, scanned, parsed = timings
+        print(
+            f'{len(candidates):>6} templates | dispatch: index '
+            f'{index:7.1f} us, scan {scanned:7.1f} us | '
+            f'parse {parsed:6.1f} us/receipt'
+        )
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+
+"""
+Benchmark bank reconciliation: Python backend vs. columnar backend
+
+Usage: python scripts/bench_reconcile.py [ROWS]
+"""
+
+import random
+import sys
+import time
+from datetime import date, timedelta
+from pathlib import Path
+from unittest.mock import Mock
+
+# Add project root to path
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from src.processors.bank_processor import BankProcessor  # noqa: E402
+from src.processors.columnar import columnar_available  # noqa: E402
+
+DEFAULT_ROWS = 1_000_000
+
+
+def make_transactions(rows: int) -> tuple:
+    """Build a ledger and a statement where most rows match"""
+    rng = random.Random(rows)
+    start = date(2024, 1, 1)
+    ledger = []
+    bank = []
+    for i in range(rows):
+        tx_date = start + timedelta(days=rng.randrange(365))
+        amount = f'{rng.uniform(1, 500):.2f}'
+        ledger.append({
+            'date': tx_date,
+            'payee': f'Merchant {i % 5000}',
+            'amount': amount,
+            'currency': 'USD'
+        })
+        if rng.random() < 0.9:
+            bank.append({
+                'date': tx_date,
+                'description': f'MERCHANT {i % 5000}',
+                'amount': amount,
+                'type': 'DEBIT'
+            })
+    rng.shuffle(bank)
+    return ledger, bank
+
+
+def bench(name: str, bank_processor: BankProcessor, bank: list) -> dict:
+    """Time one backend and report its throughput"""
+    start = time.perf_counter()
+    result = bank_processor.compare_transactions(bank, backend=name)
+    elapsed = time.perf_counter() - start
+    print(
+        f'{name:<10} {len(bank):>10,} rows | {elapsed:7.2f}s | '
+        f'{len(result["matches"]):>10,} matches'
+    )
+    return result
+
+
+def main() -> int:
+    """Main entry point"""
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_ROWS
+    ledger, bank = make_transactions(rows)
+    ledger_manager = Mock()
+    ledger_manager.get_transactions.return_value = ledger
+    bank_processor = BankProcessor(ledger_manager)
+
+    python = bench('python', bank_processor, bank)
+    if not columnar_available():
+        print('columnar   skipped: NumPy is not installed')
+        return 0
+    columnar = bench('columnar', bank_processor, bank)
+    print(f'Identical results: {python == columnar}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -16,12 +16,108 @@ EMAIL_HOST = os.getenv('EMAIL_HOST', 'imap.gmail.com')
 EMAIL_PORT = int(os.getenv('EMAIL_PORT', '993'))
 EMAIL_USER = os.getenv('EMAIL_USER')
 EMAIL_PASSWORD = os.getenv('EMAIL_PASSWORD')
+EMAIL_SSL = os.getenv('EMAIL_SSL', 'true').lower() == 'true'
+# Comma separated folders (labels) of the account above
+EMAIL_FOLDERS = [
+    folder.strip()
+    for folder in os.getenv('EMAIL_FOLDERS', 'INBOX').split(',')
+    if folder.strip()
+]
+# Optional JSON list of accounts replacing the one above, e.g.
+# [{"user": "a@x.com", "password": "...", "folders": ["INBOX", "Receipts"]}]
+EMAIL_ACCOUNTS = os.getenv('EMAIL_ACCOUNTS', '')
+# Sources (account, folder) fetched at the same time
+EMAIL_MAX_CONCURRENT_FETCHES = int(
+    os.getenv('EMAIL_MAX_CONCURRENT_FETCHES', '4')
+)
+# Keep a copy of each fetched PDF in ATTACHMENTS_DIR, written in the
+# background; receipts are parsed from memory either way
+EMAIL_ARCHIVE_ATTACHMENTS = (
+    os.getenv('EMAIL_ARCHIVE_ATTACHMENTS', 'true').lower() == 'true'
+)
+# Messages requested per IMAP FETCH round trip
+EMAIL_FETCH_BATCH_SIZE = int(os.getenv('EMAIL_FETCH_BATCH_SIZE', '100'))
+# Pooled sessions for the API: per-account cap, NOOP interval and how
+# long a job waits for a free session
+EMAIL_POOL_SIZE = int(os.getenv('EMAIL_POOL_SIZE', '2'))
+EMAIL_KEEPALIVE_SECONDS = float(os.getenv('EMAIL_KEEPALIVE_SECONDS', '300'))
+EMAIL_POOL_TIMEOUT_SECONDS = float(
+    os.getenv('EMAIL_POOL_TIMEOUT_SECONDS', '30')
+)
+# watch-emails: IDLE renewal (servers may drop IDLE after 29 minutes) and
+# the longest wait between reconnect attempts
+EMAIL_IDLE_SECONDS = float(os.getenv('EMAIL_IDLE_SECONDS', '1500'))
+EMAIL_RECONNECT_MAX_SECONDS = float(
+    os.getenv('EMAIL_RECONNECT_MAX_SECONDS', '300')
+)
+
+# Ingestion pipeline: fetched batches buffered ahead of the ledger commits
+INGEST_QUEUE_BATCHES = int(os.getenv('INGEST_QUEUE_BATCHES', '2'))
+# Most pages of a receipt extracted; the first and last pages come first
+# and extraction stops once the date, amount and merchant are found
+RECEIPT_PAGE_BUDGET = int(os.getenv('RECEIPT_PAGE_BUDGET', '10'))
+# Processes parsing receipts at the same time (default: one per core)
+PARSE_WORKERS = int(os.getenv('PARSE_WORKERS', str(os.cpu_count() or 1)))
+# Per-document limits of a parse worker, which is killed and replaced when
+# exceeded (0 MB for no memory limit)
+PARSE_TIMEOUT_SECONDS = float(os.getenv('PARSE_TIMEOUT_SECONDS', '60'))
+PARSE_MEMORY_LIMIT_MB = int(os.getenv('PARSE_MEMORY_LIMIT_MB', '1024'))
+# Times a document that exceeded them is tried again on a fresh worker
+PARSE_RETRIES = int(os.getenv('PARSE_RETRIES', '1'))
+
+# Fava configuration
+FAVA_HOST = os.getenv('FAVA_HOST', 'localhost')
+FAVA_PORT = int(os.getenv('FAVA_PORT', '5000'))
 
 # Project paths
 PROJECT_ROOT = Path(__file__).parent.parent.parent
 DATA_DIR = PROJECT_ROOT / 'data' / 'ledger'
 BEANCOUNT_FILE = DATA_DIR / 'ledger.beancount'
 ATTACHMENTS_DIR = PROJECT_ROOT / 'data' / 'attachments'
+# gc-attachments keeps unreferenced attachments stored more recently, as
+# their receipts may still be on their way to the ledger
+ATTACHMENT_GC_GRACE_HOURS = float(os.getenv('ATTACHMENT_GC_GRACE_HOURS', '24'))
+
+# UIDVALIDITY and last processed UID per folder for sync-emails
+EMAIL_SYNC_STATE_FILE = Path(os.getenv(
+    'EMAIL_SYNC_STATE_FILE', PROJECT_ROOT / 'data' / 'email_sync_state.json'
+))
+
+# (Message-ID, attachment) pairs already in the ledger, so re-runs skip
+# those messages before downloading them
+INGESTION_INDEX_FILE = Path(os.getenv(
+    'INGESTION_INDEX_FILE', PROJECT_ROOT / 'data' / 'ingested.sqlite3'
+))
+
+# Extracted text and fields of parsed receipts by PDF content hash, so
+# re-parsing the same PDF skips pdfplumber (0 MB disables the cache)
+RECEIPT_CACHE_FILE = Path(os.getenv(
+    'RECEIPT_CACHE_FILE', PROJECT_ROOT / 'data' / 'receipt_cache.sqlite3'
+))
+RECEIPT_CACHE_MAX_MB = float(os.getenv('RECEIPT_CACHE_MAX_MB', '64'))
+
+# PDFs that exceeded the parse limits, kept with the reason and skipped
+QUARANTINE_DIR = PROJECT_ROOT / 'data' / 'quarantine'
+
+# Bank statement uploads. Rows are parsed as a stream, but the comparison
+# and its JSON response hold every row, so keep this modest
+MAX_UPLOAD_SIZE_MB = int(os.getenv('MAX_UPLOAD_SIZE_MB', '10'))
+
+# Bank reconciliation tolerances (0 requires exact date and amount)
+MATCH_DATE_WINDOW_DAYS = int(os.getenv('MATCH_DATE_WINDOW_DAYS', '0'))
+MATCH_AMOUNT_TOLERANCE = float(os.getenv('MATCH_AMOUNT_TOLERANCE', '0'))
+MATCH_AMOUNT_TOLERANCE_PERCENT = float(
+    os.getenv('MATCH_AMOUNT_TOLERANCE_PERCENT', '0')
+)
+# 'greedy' or 'assignment' (one-to-one matching)
+MATCH_MODE = os.getenv('MATCH_MODE', 'greedy')
+# 'python' or 'columnar' (vectorized, requires NumPy)
+MATCH_BACKEND = os.getenv('MATCH_BACKEND', 'python')
+
+# Ledger loading
+LEDGER_SNAPSHOT_ENABLED = (
+    os.getenv('LEDGER_SNAPSHOT_ENABLED', 'true').lower() == 'true'
+)
 
 # Create directories if they don't exist
 DATA_DIR.mkdir(parents=True, exist_ok=True)
@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+
+"""
+Content-addressed attachment store: deduplicated blobs and a message index
+"""
+
+import hashlib
+import os
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, Optional, Tuple
+from src.core.config import ATTACHMENTS_DIR, ATTACHMENT_GC_GRACE_HOURS
+from src.processors.sqlite_store import ProcessRegistry, SQLiteDatabase
+
+INDEX_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS attachments (
+    message_id TEXT NOT NULL,
+    filename TEXT NOT NULL,
+    sha256 TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    stored_at REAL NOT NULL,
+    PRIMARY KEY (message_id, filename)
+);
+CREATE INDEX IF NOT EXISTS attachments_sha256 ON attachments (sha256);
+'''
+
+
+def content_hash(payload: bytes) -> str:
+    """The key an attachment is stored under"""
+    return hashlib.sha256(payload).hexdigest()
+
+
+class AttachmentStore:
+    def __init__(self, root: Optional[Path] = None) -> None:
+        """Store attachments under root (default ATTACHMENTS_DIR)
+
+        Blobs live in root/sha256/ab/cd/<hash>, so identical PDFs are kept
+        once and no directory grows too large to list. index.sqlite3 maps
+        (message id, filename) to the hash. Writes run on one background
+        thread so fetching and parsing never wait on the disk.
+        """
+        self.root = Path(root or ATTACHMENTS_DIR)
+        self.blob_dir = self.root / 'sha256'
+        self.index_path = self.root / 'index.sqlite3'
+        self._db = SQLiteDatabase(self.index_path, INDEX_SCHEMA)
+        self._executor = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix='attachment-store'
+        )
+
+    def put(
+        self,
+        payload: bytes,
+        filename: str,
+        message_id: Optional[str] = None
+    ) -> str:
+        """Queue an attachment to be stored and return its hash"""
+        sha256 = content_hash(payload)
+        self._executor.submit(
+            self._store, sha256, payload, filename, message_id
+        )
+        return sha256
+
+    def wait(self) -> None:
+        """Block until every attachment queued so far is stored"""
+        self._executor.submit(lambda: None).result()
+
+    def path(self, sha256: str) -> Path:
+        """Where the blob of a hash is stored"""
+        return self.blob_dir / sha256[:2] / sha256[2:4] / sha256
+
+    def get(self, sha256: str) -> Optional[bytes]:
+        """Read a stored attachment, or None if it is not stored"""
+        try:
+            return self.path(sha256).read_bytes()
+        except FileNotFoundError:
+            return None
+
+    def lookup(self, message_id: str, filename: str) -> Optional[str]:
+        """The hash of an attachment of a message, if stored"""
+        with self._db.connect() as db:
+            row = db.execute(
+                'SELECT sha256 FROM attachments '
+                'WHERE message_id = ? AND filename = ?',
+                (message_id, filename)
+            ).fetchone()
+        return row[0] if row else None
+
+    def gc(
+        self,
+        referenced: Iterable[str],
+        grace_hours: Optional[float] = None
+    ) -> Tuple[int, int]:
+        """Remove blobs not in referenced and return (blobs, bytes) freed
+
+        Blobs stored within the grace period are kept, as their receipts
+        may not have reached the ledger yet.
+        """
+        if grace_hours is None:
+            grace_hours = ATTACHMENT_GC_GRACE_HOURS
+        referenced = set(referenced)
+        cutoff = time.time() - grace_hours * 3600
+        self.wait()
+
+        removed = []
+        freed = 0
+        for blob in self._blobs():
+            if blob.name in referenced:
+                continue
+            try:
+                stat = blob.stat()
+                if stat.st_mtime > cutoff:
+                    continue
+                blob.unlink()
+            except FileNotFoundError:
+                continue
+            removed.append(blob.name)
+            freed += stat.st_size
+            for shard in (blob.parent, blob.parent.parent):
+                try:
+                    shard.rmdir()
+                except OSError:
+                    break
+
+        if removed:
+            with self._db.connect() as db:
+                db.executemany(
+                    'DELETE FROM attachments WHERE sha256 = ?',
+                    [(sha256,) for sha256 in removed]
+                )
+                db.commit()
+        return len(removed), freed
+
+    def stats(self) -> Dict[str, int]:
+        """Count stored blobs and their total size"""
+        blobs = 0
+        size = 0
+        for blob in self._blobs():
+            blobs += 1
+            size += blob.stat().st_size
+        return {'blobs': blobs, 'bytes': size}
+
+    def _blobs(self) -> Iterator[Path]:
+        if not self.blob_dir.exists():
+            return
+        for first in sorted(self.blob_dir.iterdir()):
+            for second in sorted(first.iterdir()):
+                for blob in second.iterdir():
+                    if not blob.name.endswith('.tmp'):
+                        yield blob
+
+    def _store(
+        self,
+        sha256: str,
+        payload: bytes,
+        filename: str,
+        message_id: Optional[str]
+    ) -> None:
+        """Write the blob unless already stored, then index it"""
+        try:
+            path = self.path(sha256)
+            if path.exists():
+                # Restarts the GC grace period of a re-fetched duplicate
+                os.utime(path)
+            else:
+                path.parent.mkdir(parents=True, exist_ok=True)
+                tmp_path = path.with_name(path.name + '.tmp')
+                with open(tmp_path, 'wb') as f:
+                    f.write(payload)
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(tmp_path, path)
+
+            with self._db.connect() as db:
+                db.execute(
+                    'INSERT OR REPLACE INTO attachments '
+                    'VALUES (?, ?, ?, ?, ?)',
+                    (
+                        message_id or '', filename, sha256, len(payload),
+                        time.time()
+                    )
+                )
+                db.commit()
+        except (OSError, sqlite3.Error) as exc:
+            print(f'Failed to store {filename}: {exc}')
+
+
+_stores: ProcessRegistry[AttachmentStore] = ProcessRegistry()
+
+
+def get_attachment_store(root: Optional[Path] = None) -> AttachmentStore:
+    """Get the process-wide store of a directory (default ATTACHMENTS_DIR)"""
+    root = Path(root or ATTACHMENTS_DIR)
+    return _stores.get(root, lambda: AttachmentStore(root))
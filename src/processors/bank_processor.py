@@ -5,41 +5,202 @@ Bank statement processor for parsing CSV files and comparing with ledger
 """
 
 import csv
-from datetime import datetime
-from typing import Dict, List
+from datetime import date, datetime
+from itertools import chain, islice
+from typing import Callable, Dict, Iterable, Iterator, List, Optional
+from src.core.config import (
+    MATCH_DATE_WINDOW_DAYS, MATCH_AMOUNT_TOLERANCE,
+    MATCH_AMOUNT_TOLERANCE_PERCENT, MATCH_MODE, MATCH_BACKEND
+)
+from src.processors.columnar import compare_columnar
 from src.processors.ledger_manager import LedgerManager
+from src.processors.matching import (
+    LedgerCandidateIndex, MatchTolerance, assign_one_to_one
+)
+
+MATCH_MODES = ('greedy', 'assignment')
+MATCH_BACKENDS = ('python', 'columnar')
+
+DATE_FORMATS = ['%Y-%m-%d', '%m/%d/%Y', '%d/%m/%Y', '%Y/%m/%d']
+DATE_SAMPLE_ROWS = 100
+DATE_CACHE_SIZE = 4096
+
+# Header names accepted for each field, checked in order
+COLUMN_ALIASES = {
+    'date': ['date', 'transaction date', 'posting date', 'posted date'],
+    'description': ['description', 'memo', 'payee', 'merchant'],
+    'amount': ['amount', 'transaction amount'],
+    'type': ['type', 'transaction type']
+}
+
+
+def _split_date(value: str, separator: str) -> List[int]:
+    """Split a date string into exactly three integer fields"""
+    parts = value.split(separator)
+    if len(parts) != 3:
+        raise ValueError(f'Not a date: {value}')
+    return [int(part) for part in parts]
+
+
+def _parse_mdy(value: str) -> date:
+    """Parse a MM/DD/YYYY date"""
+    month, day, year = _split_date(value, '/')
+    return date(year, month, day)
+
+
+def _parse_dmy(value: str) -> date:
+    """Parse a DD/MM/YYYY date"""
+    day, month, year = _split_date(value, '/')
+    return date(year, month, day)
+
+
+def _parse_ymd_slash(value: str) -> date:
+    """Parse a YYYY/MM/DD date"""
+    year, month, day = _split_date(value, '/')
+    return date(year, month, day)
+
+
+def _parse_ymd_dash(value: str) -> date:
+    """Parse a YYYY-MM-DD date"""
+    year, month, day = _split_date(value, '-')
+    return date(year, month, day)
+
+
+# Equivalent to strptime with DATE_FORMATS for well-formed values
+_FAST_DATE_PARSERS = {
+    '%Y-%m-%d': _parse_ymd_dash,
+    '%m/%d/%Y': _parse_mdy,
+    '%d/%m/%Y': _parse_dmy,
+    '%Y/%m/%d': _parse_ymd_slash
+}
+
+
+def _fits_format(value: str, fmt: str) -> bool:
+    """Check whether a date string parses with a format"""
+    try:
+        datetime.strptime(value, fmt)
+        return True
+    except ValueError:
+        return False
+
+
+def _cell(row: List[str], column: Optional[int], default):
+    """Get a CSV cell, or the default when the column is missing"""
+    if column is None or column >= len(row):
+        return default
+    return row[column]
 
 
 class BankProcessor:
-    def __init__(self, ledger_manager: LedgerManager) -> None:
+    def __init__(
+        self,
+        ledger_manager: LedgerManager,
+        tolerance: Optional[MatchTolerance] = None
+    ) -> None:
         self.ledger_manager = ledger_manager
+        self.tolerance = tolerance or MatchTolerance(
+            days=MATCH_DATE_WINDOW_DAYS,
+            amount=MATCH_AMOUNT_TOLERANCE,
+            percent=MATCH_AMOUNT_TOLERANCE_PERCENT
+        )
 
     def parse_csv(self, csv_path: str) -> List[Dict]:
         """Parse bank statement CSV file using pure Python"""
         try:
-            transactions = []
-            
-            with open(csv_path, 'r', encoding='utf-8') as file:
-                reader = csv.DictReader(file)
-                for row in reader:
-                    transaction = {
-                        'date': self._parse_date(row.get('Date', '')),
-                        'description': row.get('Description', ''),
-                        'amount': row.get('Amount', 0),
-                        'type': row.get('Type', '')
-                    }
-                    transactions.append(transaction)
-
-            return transactions
+            return list(self.iter_csv(csv_path))
         except Exception as e:
             print(f'Error parsing CSV: {e}')
             return []
 
+    def iter_csv(self, csv_path: str) -> Iterator[Dict]:
+        """Stream normalized rows from a bank statement CSV file
+
+        The column layout and date format are detected once per file, so
+        rows are parsed without retrying every format.
+        """
+        with open(csv_path, 'r', encoding='utf-8-sig', newline='') as file:
+            reader = csv.reader(file)
+            header = next(reader, None)
+            if header is None:
+                return
+
+            columns = self._detect_columns(header)
+            date_col = columns.get('date')
+            description_col = columns.get('description')
+            amount_col = columns.get('amount')
+            type_col = columns.get('type')
+
+            # Buffer a bounded sample to pick the date format
+            sample = list(islice(reader, DATE_SAMPLE_ROWS))
+            parse_date = self._date_parser([
+                row[date_col] for row in sample
+                if date_col is not None and date_col < len(row)
+            ])
+
+            for row in chain(sample, reader):
+                if not row:
+                    continue
+                yield {
+                    'date': parse_date(_cell(row, date_col, '')),
+                    'description': _cell(row, description_col, ''),
+                    'amount': _cell(row, amount_col, 0),
+                    'type': _cell(row, type_col, '')
+                }
+
+    def _detect_columns(self, header: List[str]) -> Dict[str, int]:
+        """Map normalized field names to column positions"""
+        positions = {
+            name.strip().lower(): position
+            for position, name in enumerate(header)
+        }
+        columns = {}
+        for field, aliases in COLUMN_ALIASES.items():
+            for alias in aliases:
+                if alias in positions:
+                    columns[field] = positions[alias]
+                    break
+        return columns
+
+    def _date_parser(self, samples: List[str]) -> Callable[[str], date]:
+        """Build a parser for the date format used by the sample values"""
+        samples = [value.strip() for value in samples if value.strip()]
+
+        # The format fitting the most samples wins, earlier ones on ties
+        date_format = None
+        best_count = 0
+        for fmt in DATE_FORMATS:
+            count = sum(1 for value in samples if _fits_format(value, fmt))
+            if count > best_count:
+                date_format, best_count = fmt, count
+
+        cache = {}
+
+        def parse(value: str) -> date:
+            """Parse one date, memoizing repeated values"""
+            parsed = cache.get(value)
+            if parsed is None:
+                if date_format:
+                    try:
+                        parsed = _FAST_DATE_PARSERS[date_format](
+                            value.strip()
+                        )
+                    except ValueError:
+                        pass
+                if parsed is None:
+                    # Rows in another format still get the full search
+                    parsed = self._parse_date(value)
+                if len(cache) >= DATE_CACHE_SIZE:
+                    cache.clear()
+                cache[value] = parsed
+            return parsed
+
+        return parse
+
     def _parse_date(self, date_str: str) -> datetime:
         """Parse date string to datetime"""
         try:
             # Try common date formats
-            for fmt in ['%Y-%m-%d', '%m/%d/%Y', '%d/%m/%Y', '%Y/%m/%d']:
+            for fmt in DATE_FORMATS:
                 try:
                     return datetime.strptime(date_str.strip(), fmt).date()
                 except ValueError:
@@ -48,41 +209,80 @@ class BankProcessor:
         except Exception:
             return datetime.now().date()
 
-    def compare_transactions(self, bank_transactions: List[Dict]) -> Dict:
-        """Compare bank transactions with ledger"""
+    def compare_transactions(
+        self,
+        bank_transactions: Iterable[Dict],
+        tolerance: Optional[MatchTolerance] = None,
+        mode: Optional[str] = None,
+        backend: Optional[str] = None
+    ) -> Dict:
+        """Compare bank transactions with ledger
+
+        In 'greedy' mode each bank transaction takes its best candidate,
+        even one already matched. 'assignment' mode matches one-to-one,
+        maximizing the number of matches and then their total score.
+        The 'columnar' backend runs exact greedy matching on NumPy arrays.
+        """
+        mode = mode or MATCH_MODE
+        if mode not in MATCH_MODES:
+            raise ValueError(f'Unknown match mode: {mode}')
+        backend = backend or MATCH_BACKEND
+        if backend not in MATCH_BACKENDS:
+            raise ValueError(f'Unknown match backend: {backend}')
+        tolerance = tolerance or self.tolerance
+
         ledger_transactions = self.ledger_manager.get_transactions()
 
+        if backend == 'columnar':
+            if mode != 'greedy' or not tolerance.is_exact:
+                raise ValueError(
+                    'The columnar backend only supports exact greedy matching'
+                )
+            return compare_columnar(
+                list(bank_transactions), ledger_transactions
+            )
+
         # Normalize amounts for comparison
         bank_normalized = self._normalize_transactions(bank_transactions)
         ledger_normalized = self._normalize_transactions(ledger_transactions)
 
+        ledger_index = LedgerCandidateIndex(ledger_normalized, tolerance)
+
+        if mode == 'assignment':
+            assignment = assign_one_to_one([
+                ledger_index.candidates(bank_tx) for bank_tx in bank_normalized
+            ])
+        else:
+            # Closest ledger transaction, earliest in the ledger on ties
+            assignment = {}
+            for row, bank_tx in enumerate(bank_normalized):
+                best = ledger_index.best(bank_tx)
+                if best is not None:
+                    score, position = best
+                    assignment[row] = (position, score)
+
         # Find matches
         matches = []
-        ledger_only = []
         bank_only = []
+        matched_positions = set()
 
-        for bank_tx in bank_normalized:
-            matched = False
-            for ledger_tx in ledger_normalized:
-                if self._transactions_match(bank_tx, ledger_tx):
-                    matches.append({
-                        'bank': bank_tx,
-                        'ledger': ledger_tx
-                    })
-                    matched = True
-                    break
-            if not matched:
+        for row, bank_tx in enumerate(bank_normalized):
+            if row in assignment:
+                position, score = assignment[row]
+                matches.append({
+                    'bank': bank_tx,
+                    'ledger': ledger_normalized[position],
+                    'score': score
+                })
+                matched_positions.add(position)
+            else:
                 bank_only.append(bank_tx)
 
         # Find ledger-only transactions
-        for ledger_tx in ledger_normalized:
-            matched = False
-            for match in matches:
-                if match['ledger'] == ledger_tx:
-                    matched = True
-                    break
-            if not matched:
-                ledger_only.append(ledger_tx)
+        ledger_only = [
+            ledger_tx for position, ledger_tx in enumerate(ledger_normalized)
+            if position not in matched_positions
+        ]
 
         return {
             'matches': matches,
@@ -90,7 +290,10 @@ class BankProcessor:
             'bank_only': bank_only
         }
 
-    def _normalize_transactions(self, transactions: List[Dict]) -> List[Dict]:
+    def _normalize_transactions(
+        self,
+        transactions: Iterable[Dict]
+    ) -> List[Dict]:
         """Normalize transaction format for comparison"""
         normalized = []
         for tx in transactions:
@@ -104,11 +307,3 @@ class BankProcessor:
                 'description': tx.get('description', tx.get('payee', ''))
             })
         return normalized
-
-    def _transactions_match(self, tx1: Dict, tx2: Dict) -> bool:
-        """Check if two transactions match"""
-        # Simple matching logic - can be enhanced
-        amount_match = abs(tx1['amount'] - tx2['amount']) < 0.01
-        date_match = tx1['date'] == tx2['date']
-        
-        return amount_match and date_match
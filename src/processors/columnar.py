@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+
+"""
+Vectorized bank reconciliation backend built on NumPy arrays
+"""
+
+from typing import Dict, List
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is only needed for the columnar backend
+    np = None
+
+# Packs (day, cents) into one sortable int64 key
+_CENTS_BITS = 40
+_CENTS_OFFSET = 1 << (_CENTS_BITS - 1)
+
+
+def columnar_available() -> bool:
+    """Whether the columnar backend can be used"""
+    return np is not None
+
+
+def compare_columnar(
+    bank_transactions: List[Dict],
+    ledger_transactions: List[Dict]
+) -> Dict:
+    """Exact greedy comparison with the same output as BankProcessor
+
+    Each bank transaction matches the first ledger transaction, in ledger
+    order, with the same date and amount in cents.
+    """
+    if np is None:
+        raise RuntimeError(
+            'The columnar backend requires NumPy (pip install numpy)'
+        )
+
+    bank = _to_columns(bank_transactions)
+    ledger = _to_columns(ledger_transactions)
+
+    # A stable sort keeps ledger order within equal keys, so the left
+    # insertion point is the first matching ledger transaction
+    ledger_order = np.argsort(ledger['keys'], kind='stable')
+    ledger_sorted = ledger['keys'][ledger_order]
+    slots = np.searchsorted(ledger_sorted, bank['keys'], side='left')
+    in_range = slots < len(ledger_sorted)
+    found = np.zeros(len(bank['keys']), dtype=bool)
+    found[in_range] = ledger_sorted[slots[in_range]] == bank['keys'][in_range]
+    matched_ledger = np.full(len(bank['keys']), -1, dtype=np.int64)
+    matched_ledger[found] = ledger_order[slots[found]]
+
+    ledger_matched = np.zeros(len(ledger['keys']), dtype=bool)
+    ledger_matched[matched_ledger[found]] = True
+
+    bank_rows = _to_rows(bank)
+    ledger_rows = _to_rows(ledger)
+
+    matches = []
+    bank_only = []
+    for row, position in enumerate(matched_ledger.tolist()):
+        if position >= 0:
+            matches.append({
+                'bank': bank_rows[row],
+                'ledger': ledger_rows[position],
+                'score': 1.0
+            })
+        else:
+            bank_only.append(bank_rows[row])
+
+    ledger_only = [
+        ledger_rows[position]
+        for position in np.flatnonzero(~ledger_matched).tolist()
+    ]
+
+    return {
+        'matches': matches,
+        'ledger_only': ledger_only,
+        'bank_only': bank_only
+    }
+
+
+def _to_columns(transactions: List[Dict]) -> Dict:
+    """Load transactions into arrays with normalized amounts and keys"""
+    count = len(transactions)
+    dates = [tx.get('date') for tx in transactions]
+    descriptions = [
+        tx.get('description', tx.get('payee', '')) for tx in transactions
+    ]
+
+    raw_amounts = np.array(
+        [str(tx.get('amount', 0)) for tx in transactions], dtype=str
+    )
+    try:
+        amounts = raw_amounts.astype(np.float64)
+    except ValueError:
+        # Only strip currency formatting when some amount carries it
+        amounts = np.char.replace(
+            np.char.replace(raw_amounts, '$', ''), ',', ''
+        ).astype(np.float64)
+    cents = np.rint(amounts * 100).astype(np.int64)
+    days = np.fromiter(
+        (tx_date.toordinal() for tx_date in dates), dtype=np.int64,
+        count=count
+    )
+
+    return {
+        'dates': dates,
+        'amounts': amounts,
+        'descriptions': descriptions,
+        'keys': (days << _CENTS_BITS) + (cents + _CENTS_OFFSET)
+    }
+
+
+def _to_rows(columns: Dict) -> List[Dict]:
+    """Build the normalized transaction dicts used in comparison results"""
+    return [
+        {'date': tx_date, 'amount': amount, 'description': description}
+        for tx_date, amount, description in zip(
+            columns['dates'], columns['amounts'].tolist(),
+            columns['descriptions']
+        )
+    ]
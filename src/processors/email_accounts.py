@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+
+"""
+Email accounts and the (account, folder) sources receipts are fetched from
+"""
+
+import json
+from contextlib import contextmanager
+from typing import Iterator, List, Optional, Tuple
+from imapclient import IMAPClient
+from src.core.config import (
+    EMAIL_HOST, EMAIL_PORT, EMAIL_SSL, EMAIL_USER, EMAIL_PASSWORD,
+    EMAIL_ACCOUNTS, EMAIL_FOLDERS
+)
+
+
+class EmailAccount:
+    def __init__(
+        self,
+        user: str,
+        password: str,
+        host: Optional[str] = None,
+        port: Optional[int] = None,
+        ssl: Optional[bool] = None,
+        folders: Optional[List[str]] = None
+    ) -> None:
+        self.user = user
+        self.password = password
+        self.host = host or EMAIL_HOST
+        self.port = port or EMAIL_PORT
+        self.ssl = EMAIL_SSL if ssl is None else ssl
+        self.folders = folders or ['INBOX']
+
+    @classmethod
+    def from_config(cls) -> 'EmailAccount':
+        """The single account configured by EMAIL_USER and friends"""
+        return cls(EMAIL_USER, EMAIL_PASSWORD, folders=EMAIL_FOLDERS)
+
+    @property
+    def key(self) -> Tuple[str, int, str]:
+        return (self.host, self.port, self.user)
+
+    def connect(self) -> IMAPClient:
+        """Open and log in a new session"""
+        if not self.user or not self.password:
+            raise ValueError('Email credentials not configured')
+
+        print(f'Connecting to {self.host} as {self.user}...')
+        client = IMAPClient(self.host, port=self.port, ssl=self.ssl)
+        try:
+            client.login(self.user, self.password)
+        except Exception as exc:
+            try:
+                client.shutdown()
+            except Exception:
+                pass
+            raise RuntimeError(
+                f'Failed to login to email server as {self.user}'
+            ) from exc
+        return client
+
+    @contextmanager
+    def session(self) -> Iterator[IMAPClient]:
+        """A session that is logged out afterwards"""
+        client = self.connect()
+        try:
+            yield client
+        finally:
+            try:
+                client.logout()
+            except Exception:
+                pass
+
+
+def load_email_accounts() -> List[EmailAccount]:
+    """Accounts from EMAIL_ACCOUNTS, or the single configured account
+
+    EMAIL_ACCOUNTS is a JSON list of objects with user, password and
+    optional host, port, ssl and folders.
+    """
+    if not EMAIL_ACCOUNTS:
+        return [EmailAccount.from_config()]
+
+    try:
+        entries = json.loads(EMAIL_ACCOUNTS)
+        return [
+            EmailAccount(
+                entry['user'], entry['password'], entry.get('host'),
+                entry.get('port'), entry.get('ssl'), entry.get('folders')
+            )
+            for entry in entries
+        ]
+    except (ValueError, TypeError, KeyError) as exc:
+        raise ValueError(f'Invalid EMAIL_ACCOUNTS setting: {exc}') from exc
+
+
+def email_sources(
+    folder: Optional[str] = None
+) -> List[Tuple[EmailAccount, str]]:
+    """Every (account, folder) pair, or one folder across all accounts"""
+    return [
+        (account, source_folder)
+        for account in load_email_accounts()
+        for source_folder in ([folder] if folder else account.folders)
+    ]
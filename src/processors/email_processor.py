@@ -4,21 +4,83 @@
 Email processor for fetching emails with PDF attachments
 """
 
+import base64
+import binascii
 import email
+import quopri
 from email import message
-from datetime import datetime, date, timedelta
-from pathlib import Path
-from typing import List, Tuple, Optional
-from imapclient import IMAPClient
+from email.header import decode_header, make_header
+from email.utils import decode_rfc2231
+from functools import partial
+from datetime import date, timedelta
+from typing import Callable, Dict, Iterable, Iterator, List, Tuple, Optional
+from urllib.parse import unquote
+from imapclient import IMAPClient, SEEN
+from imapclient.response_types import BodyData
 from src.core.config import (
-    EMAIL_HOST, EMAIL_USER, EMAIL_PASSWORD, ATTACHMENTS_DIR
+    EMAIL_HOST, EMAIL_PORT, EMAIL_SSL, EMAIL_USER, EMAIL_PASSWORD,
+    EMAIL_FETCH_BATCH_SIZE, EMAIL_ARCHIVE_ATTACHMENTS, ATTACHMENTS_DIR,
+    INGESTION_INDEX_FILE
 )
+from src.processors.attachment_store import (
+    AttachmentStore, get_attachment_store
+)
+from src.processors.ingestion_index import IngestionIndex, get_ingestion_index
+from src.processors.sync_state import SyncStateStore
+
+
+class AttachmentBatch(list):
+    """The (filename, payload) attachments of one fetched batch of messages
+
+    message_ids[i] and senders[i] are the Message-ID and From address of
+    the i-th attachment's email, if known. checkpoint, when set, records
+    the batch as processed and is called by the consumer once the batch
+    is committed.
+    """
+
+    def __init__(
+        self,
+        attachments: Iterable[Tuple[str, bytes]] = (),
+        checkpoint: Optional[Callable[[], None]] = None,
+        message_ids: Optional[Iterable[Optional[str]]] = None,
+        senders: Optional[Iterable[Optional[str]]] = None
+    ) -> None:
+        super().__init__(attachments)
+        self.checkpoint = checkpoint
+        self.message_ids = (
+            list(message_ids) if message_ids is not None
+            else [None] * len(self)
+        )
+        self.senders = (
+            list(senders) if senders is not None else [None] * len(self)
+        )
 
 
 class EmailProcessor:
-    def __init__(self) -> None:
-        self.client = None
-        self._connect()
+    def __init__(
+        self,
+        client: Optional[IMAPClient] = None,
+        account: Optional[str] = None,
+        store: Optional[AttachmentStore] = None,
+        ingested: Optional[IngestionIndex] = None
+    ) -> None:
+        """Use a logged-in client, e.g. from a pool, or connect a new one
+
+        account names the client's user for sync checkpoints and defaults
+        to the configured EMAIL_USER. Attachments are also kept in store,
+        by default the one in ATTACHMENTS_DIR when
+        EMAIL_ARCHIVE_ATTACHMENTS is set. Messages whose PDFs are all in
+        ingested (default INGESTION_INDEX_FILE) are not downloaded.
+        """
+        self.client = client
+        self.account = account or EMAIL_USER
+        if store is None and EMAIL_ARCHIVE_ATTACHMENTS:
+            store = get_attachment_store(ATTACHMENTS_DIR)
+        self.store = store
+        self.ingested = ingested or get_ingestion_index(INGESTION_INDEX_FILE)
+        self._owns_client = client is None
+        if self._owns_client:
+            self._connect()
 
     def _connect(self) -> None:
         """Connect to email server"""
@@ -26,7 +88,7 @@ class EmailProcessor:
             raise ValueError('Email credentials not configured')
 
         print(f'Connecting to {EMAIL_HOST}...')
-        self.client = IMAPClient(EMAIL_HOST)
+        self.client = IMAPClient(EMAIL_HOST, port=EMAIL_PORT, ssl=EMAIL_SSL)
         try:
             print(f'Logging in as {EMAIL_USER}...')
             self.client.login(EMAIL_USER, EMAIL_PASSWORD)
@@ -40,8 +102,227 @@ class EmailProcessor:
         folder: str = 'INBOX',
         start_date: Optional[date] = None,
         end_date: Optional[date] = None
-    ) -> List[Tuple[str, Path]]:
+    ) -> List[Tuple[str, bytes]]:
         """Fetch emails with PDF attachments within optional time window"""
+        attachments = []
+        for batch in self.iter_pdf_attachments(folder, start_date, end_date):
+            attachments.extend(batch)
+        return attachments
+
+    def iter_pdf_attachments(
+        self,
+        folder: str = 'INBOX',
+        start_date: Optional[date] = None,
+        end_date: Optional[date] = None,
+        batch_size: Optional[int] = None
+    ) -> Iterator[AttachmentBatch]:
+        """Yield the PDF attachments of each batch of unread messages
+
+        Fetched messages are marked read, so each runs once.
+        """
+        messages = self._search(folder, start_date, end_date)
+        for msg_ids, attachments in self._fetch_batches(
+            messages, start_date, end_date, batch_size
+        ):
+            # BODY.PEEK leaves messages unread, so mark the batch read as
+            # the full RFC822 download used to
+            self.client.add_flags(msg_ids, [SEEN], silent=True)
+            yield attachments
+
+    def sync_pdf_attachments(
+        self,
+        folder: str = 'INBOX',
+        state: Optional[SyncStateStore] = None,
+        batch_size: Optional[int] = None,
+        defer_checkpoints: bool = False
+    ) -> Iterator[AttachmentBatch]:
+        """Yield the PDF attachments of messages new since the last sync
+
+        Independent of read state: the folder's UIDVALIDITY and highest
+        processed UID are checkpointed in the sync state file. A batch is
+        checkpointed when the next one is requested, so process each
+        batch fully before advancing; an interrupted batch is fetched
+        again by the next sync. With defer_checkpoints, batches are only
+        checkpointed by calling their checkpoint(), so consumers may read
+        ahead of what they have committed.
+        """
+        if not self.client:
+            raise RuntimeError('Email client not connected')
+
+        state = state or SyncStateStore()
+        try:
+            print(f'Selecting folder: {folder}')
+            folder_info = self.client.select_folder(folder, readonly=True)
+            uidvalidity = folder_info[b'UIDVALIDITY']
+
+            checkpoint = state.get(self.account, folder)
+            if checkpoint and checkpoint['uidvalidity'] == uidvalidity:
+                last_uid = checkpoint['last_uid']
+                print(f'Syncing messages after UID {last_uid}')
+                criteria = ['UID', f'{last_uid + 1}:*']
+            else:
+                if checkpoint:
+                    print('UIDVALIDITY changed, resyncing the whole folder')
+                else:
+                    print('No sync checkpoint, syncing the whole folder')
+                last_uid = 0
+                criteria = ['ALL']
+
+            # "n:*" always includes the highest UID, even when below n
+            messages = sorted(
+                uid for uid in self.client.search(criteria) if uid > last_uid
+            )
+            print(f'Found {len(messages)} new messages')
+        except Exception as exc:
+            print(f'Search failed: {exc}')
+            raise RuntimeError('Failed to fetch emails') from exc
+
+        if not messages:
+            state.save(self.account, folder, uidvalidity, last_uid)
+            return
+
+        for msg_ids, attachments in self._fetch_batches(
+            messages, None, None, batch_size
+        ):
+            checkpoint = partial(
+                state.save, self.account, folder, uidvalidity, msg_ids[-1]
+            )
+            if defer_checkpoints:
+                attachments.checkpoint = checkpoint
+                yield attachments
+            else:
+                yield attachments
+                checkpoint()
+
+    def _fetch_batches(
+        self,
+        messages: List[int],
+        start_date: Optional[date],
+        end_date: Optional[date],
+        batch_size: Optional[int]
+    ) -> Iterator[Tuple[List[int], AttachmentBatch]]:
+        """Yield (message ids, PDF attachments) for each batch
+
+        For each batch of batch_size messages, the BODYSTRUCTURE and
+        ENVELOPE are fetched first, then only the PDF parts are
+        downloaded. Messages without a PDF part, or whose PDFs were all
+        ingested before, are never downloaded.
+        """
+        batch_size = batch_size or EMAIL_FETCH_BATCH_SIZE
+
+        for offset in range(0, len(messages), batch_size):
+            msg_ids = messages[offset:offset + batch_size]
+            print(
+                f'Fetching messages {offset + 1}-{offset + len(msg_ids)} '
+                f'of {len(messages)}...'
+            )
+            structures = self.client.fetch(
+                msg_ids, ['BODYSTRUCTURE', 'ENVELOPE']
+            )
+            ingested = self.ingested.ingested_filenames(
+                _message_id(data.get(b'ENVELOPE'))
+                for data in structures.values()
+            )
+
+            # Messages needing the same parts share one FETCH
+            wanted = {}
+            for msg_id in msg_ids:
+                # Messages expunged since the search are simply missing
+                data = structures.get(msg_id)
+                if not data:
+                    continue
+                print(f'Processing message {msg_id}...')
+                if not self._in_time_window(
+                    data.get(b'ENVELOPE'), start_date, end_date
+                ):
+                    continue
+
+                parts = list(_pdf_parts(data.get(b'BODYSTRUCTURE')))
+                if not parts:
+                    print('  No PDF attachments found')
+                    continue
+                envelope = data.get(b'ENVELOPE')
+                message_id = _message_id(envelope)
+                done = ingested.get(message_id, set())
+                if all(filename in done for _, filename, _ in parts):
+                    print('  Already ingested, skipping download')
+                    continue
+                sections = tuple(number for number, _, _ in parts)
+                wanted.setdefault(sections, []).append(
+                    (msg_id, message_id, _sender(envelope), parts)
+                )
+
+            downloaded = []
+            for sections, targets in wanted.items():
+                downloaded.extend(self._download_parts(sections, targets))
+            yield msg_ids, AttachmentBatch(
+                [(name, payload) for name, payload, _, _ in downloaded],
+                message_ids=[entry[2] for entry in downloaded],
+                senders=[entry[3] for entry in downloaded]
+            )
+
+    def _download_parts(
+        self,
+        sections: Tuple[str, ...],
+        targets: List[Tuple[
+            int, Optional[str], Optional[str], List[Tuple[str, str, bytes]]
+        ]]
+    ) -> List[Tuple[str, bytes, Optional[str], Optional[str]]]:
+        """Download and decode the given PDF parts of several messages
+
+        Returns (filename, payload, Message-ID, sender) per part.
+        """
+        response = self.client.fetch(
+            [msg_id for msg_id, _, _, _ in targets],
+            [f'BODY.PEEK[{number}]' for number in sections]
+        )
+
+        attachments = []
+        for msg_id, message_id, sender, parts in targets:
+            data = response.get(msg_id, {})
+            for number, filename, encoding in parts:
+                payload = data.get(f'BODY[{number}]'.encode())
+                if payload is None:
+                    continue
+                print(f'  Found PDF attachment: {filename}')
+                payload = _decode_part(payload, encoding)
+                if self.store:
+                    self.store.put(payload, filename, message_id)
+                attachments.append((filename, payload, message_id, sender))
+        return attachments
+
+    def _in_time_window(
+        self,
+        envelope,
+        start_date: Optional[date],
+        end_date: Optional[date]
+    ) -> bool:
+        """Check the envelope date against the optional time window"""
+        if not start_date and not end_date:
+            return True
+
+        email_date = envelope.date.date() if envelope and envelope.date \
+            else None
+        if not email_date:
+            print('  Could not parse email date')
+            return True
+
+        print(f'  Email date: {email_date}')
+        if start_date and email_date < start_date:
+            print(f'  Skipping - before start date {start_date}')
+            return False
+        if end_date and email_date > end_date:
+            print(f'  Skipping - after end date {end_date}')
+            return False
+        return True
+
+    def _search(
+        self,
+        folder: str,
+        start_date: Optional[date],
+        end_date: Optional[date]
+    ) -> List[int]:
+        """Select the folder and find unread messages in the time window"""
         if not self.client:
             raise RuntimeError('Email client not connected')
 
@@ -68,48 +349,7 @@ class EmailProcessor:
             print(f'Search failed: {exc}')
             raise RuntimeError('Failed to fetch emails') from exc
 
-        attachments = []
-        for msg_id in messages:
-            print(f'Processing message {msg_id}...')
-            response = self.client.fetch([msg_id], ['RFC822'])
-            email_body = response[msg_id][b'RFC822']
-            email_message = email.message_from_bytes(email_body)
-
-            # Check email date if time window is specified
-            if start_date or end_date:
-                email_date = self._get_email_date(email_message)
-                if email_date:
-                    print(f'  Email date: {email_date}')
-                    if start_date and email_date < start_date:
-                        print(f'  Skipping - before start date {start_date}')
-                        continue
-                    if end_date and email_date > end_date:
-                        print(f'  Skipping - after end date {end_date}')
-                        continue
-                else:
-                    print('  Could not parse email date')
-
-            pdf_count = 0
-            for part in email_message.walk():
-                if part.get_content_maintype() == 'multipart':
-                    continue
-
-                filename = part.get_filename()
-                if filename and filename.lower().endswith('.pdf'):
-                    pdf_count += 1
-                    print(f'  Found PDF attachment: {filename}')
-                    # Save attachment
-                    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-                    file_path = ATTACHMENTS_DIR / f"{timestamp}_{filename}"
-                    with open(file_path, 'wb') as f:
-                        f.write(part.get_payload(decode=True))
-
-                    attachments.append((filename, file_path))
-
-            if pdf_count == 0:
-                print('  No PDF attachments found')
-
-        return attachments
+        return list(messages)
 
     def _get_email_date(
         self,
@@ -128,6 +368,105 @@ class EmailProcessor:
             return None
 
     def close(self) -> None:
-        """Close email connection"""
-        if self.client:
+        """Close email connection, unless it was passed in"""
+        if self.client and self._owns_client:
             self.client.logout()
+
+
+def _pdf_parts(body, number: str = '') -> Iterator[Tuple[str, str, bytes]]:
+    """Find (part number, filename, encoding) of PDFs in a BODYSTRUCTURE"""
+    if not body:
+        return
+    if body.is_multipart:
+        for index, child in enumerate(body[0], 1):
+            yield from _pdf_parts(
+                child, f'{number}.{index}' if number else str(index)
+            )
+        return
+
+    number = number or '1'
+    content_type = (body[0] + b'/' + body[1]).lower()
+    if content_type == b'message/rfc822' and len(body) > 8:
+        # Parts of an attached email are numbered below its part number
+        nested = BodyData.create(body[8])
+        if nested.is_multipart:
+            yield from _pdf_parts(nested, number)
+        else:
+            yield from _pdf_parts(nested, f'{number}.1')
+        return
+
+    filename = _part_filename(body)
+    if filename and filename.lower().endswith('.pdf'):
+        yield number, filename, (body[5] or b'7bit').lower()
+
+
+def _part_filename(body) -> Optional[str]:
+    """Get the attachment filename of a single BODYSTRUCTURE part"""
+    params: Dict[bytes, bytes] = {}
+    # Extension fields follow the line count that only text parts have
+    disposition_index = 9 if body[0].lower() == b'text' else 8
+    if len(body) > disposition_index and body[disposition_index]:
+        disposition = body[disposition_index]
+        if len(disposition) > 1 and disposition[1]:
+            params.update(_pairs(disposition[1]))
+    content_params = _pairs(body[2]) if body[2] else {}
+
+    for values, key in (
+        (params, b'filename'), (params, b'filename*'),
+        (content_params, b'name'), (content_params, b'name*')
+    ):
+        value = values.get(key)
+        if not value:
+            continue
+        text = value.decode('utf-8', 'replace')
+        if key.endswith(b'*'):
+            return _decode_rfc2231(text)
+        return str(make_header(decode_header(text)))
+    return None
+
+
+def _decode_rfc2231(text: str) -> str:
+    """Decode an extended parameter such as utf-8''re%C3%A7u.pdf"""
+    parts = decode_rfc2231(text)
+    if len(parts) != 3:
+        return unquote(text)
+    charset, _, value = parts
+    return unquote(value, encoding=charset or 'utf-8', errors='replace')
+
+
+def _pairs(values) -> Dict[bytes, bytes]:
+    """Turn a flat (key, value, ...) parameter list into a dict"""
+    return {
+        key.lower(): value
+        for key, value in zip(values[::2], values[1::2])
+        if isinstance(key, bytes)
+    }
+
+
+def _message_id(envelope) -> Optional[str]:
+    """The Message-ID of an ENVELOPE response, if any"""
+    if not envelope or not envelope.message_id:
+        return None
+    return envelope.message_id.decode('utf-8', 'replace')
+
+
+def _sender(envelope) -> Optional[str]:
+    """The From address of an ENVELOPE response, if any"""
+    if not envelope or not envelope.from_:
+        return None
+    address = envelope.from_[0]
+    if not address.mailbox or not address.host:
+        return None
+    return (address.mailbox + b'@' + address.host).decode('utf-8', 'replace')
+
+
+def _decode_part(payload: bytes, encoding: bytes) -> bytes:
+    """Undo the Content-Transfer-Encoding of a downloaded part"""
+    if encoding == b'base64':
+        try:
+            return base64.b64decode(payload)
+        except binascii.Error:
+            return base64.b64decode(payload + b'==')
+    if encoding == b'quoted-printable':
+        return quopri.decodestring(payload)
+    return payload
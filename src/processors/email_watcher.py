@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+
+"""
+Long-running mailbox watcher that ingests new mail pushed through IMAP IDLE
+"""
+
+import socket
+import threading
+from typing import Callable, Iterator, Optional
+from imapclient.exceptions import IMAPClientError
+from src.core.config import EMAIL_IDLE_SECONDS, EMAIL_RECONNECT_MAX_SECONDS
+from src.processors.email_processor import AttachmentBatch, EmailProcessor
+from src.processors.sync_state import SyncStateStore
+
+Batches = Iterator[AttachmentBatch]
+
+# Failures that are retried with a fresh connection
+RECONNECT_ERRORS = (IMAPClientError, OSError, RuntimeError)
+
+
+class EmailWatcher:
+    def __init__(
+        self,
+        ingest: Callable[[Batches], int],
+        folder: str = 'INBOX',
+        state: Optional[SyncStateStore] = None,
+        connect: Callable[[], EmailProcessor] = EmailProcessor,
+        idle_timeout: Optional[float] = None,
+        initial_backoff: float = 1.0,
+        max_backoff: Optional[float] = None
+    ) -> None:
+        """Watch a folder and pass batches of new attachments to ingest
+
+        ingest must call each batch's checkpoint() once the batch is
+        committed; uncheckpointed mail is synced again after a restart.
+        """
+        self.ingest = ingest
+        self.folder = folder
+        self.state = state or SyncStateStore()
+        self.connect = connect
+        # IDLE is re-issued before servers drop it (RFC 2177: 29 minutes)
+        self.idle_timeout = idle_timeout or EMAIL_IDLE_SECONDS
+        self.initial_backoff = initial_backoff
+        self.max_backoff = max_backoff or EMAIL_RECONNECT_MAX_SECONDS
+
+        self._stopped = threading.Event()
+        self._backoff = initial_backoff
+        self._processor = None
+        self._processor_lock = threading.Lock()
+
+    def run(self) -> None:
+        """Watch until stop() is called, reconnecting with backoff"""
+        self._backoff = self.initial_backoff
+        while not self._stopped.is_set():
+            processor = None
+            try:
+                processor = self.connect()
+                with self._processor_lock:
+                    self._processor = processor
+                if self._stopped.is_set():
+                    break
+                self._watch(processor)
+            except RECONNECT_ERRORS as exc:
+                if self._stopped.is_set():
+                    break
+                print(f'Email watch failed: {exc}')
+                print(f'Reconnecting in {self._backoff:g}s...')
+                self._stopped.wait(self._backoff)
+                self._backoff = min(self._backoff * 2, self.max_backoff)
+            finally:
+                with self._processor_lock:
+                    self._processor = None
+                if processor:
+                    self._close(processor)
+
+    def stop(self) -> None:
+        """Stop watching, interrupting a pending IDLE"""
+        self._stopped.set()
+        with self._processor_lock:
+            processor = self._processor
+        if processor and processor.client:
+            try:
+                # Wakes idle_check up with EOF; the session is closed by
+                # the watching thread
+                processor.client.socket().shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+    def _watch(self, processor: EmailProcessor) -> None:
+        """Catch up on missed mail, then sync whenever the server pushes"""
+        processed = self._sync(processor)
+        print(f'Processed {processed} receipts, waiting for new mail...')
+        # Only a connection that got this far resets the backoff
+        self._backoff = self.initial_backoff
+
+        client = processor.client
+        while not self._stopped.is_set():
+            client.idle()
+            try:
+                responses = client.idle_check(timeout=self.idle_timeout)
+            finally:
+                if not self._stopped.is_set():
+                    client.idle_done()
+            if self._stopped.is_set():
+                return
+            if any(b'EXISTS' in response for response in responses):
+                processed = self._sync(processor)
+                print(f'Processed {processed} receipts')
+
+    def _sync(self, processor: EmailProcessor) -> int:
+        return self.ingest(
+            processor.sync_pdf_attachments(
+                self.folder, self.state, defer_checkpoints=True
+            )
+        )
+
+    @staticmethod
+    def _close(processor: EmailProcessor) -> None:
+        try:
+            processor.close()
+        except Exception:
+            pass
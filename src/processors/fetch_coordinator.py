@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+
+"""
+Concurrent fetching from several (account, folder) sources into one stream
+"""
+
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+from typing import (
+    Callable, ContextManager, Iterable, Iterator, List, Optional, Tuple
+)
+from imapclient import IMAPClient
+from src.core.config import EMAIL_MAX_CONCURRENT_FETCHES, EMAIL_POOL_SIZE
+from src.processors.email_accounts import EmailAccount
+from src.processors.email_processor import AttachmentBatch, EmailProcessor
+from src.processors.sync_state import SyncStateStore
+
+Source = Tuple[EmailAccount, str]
+
+_DONE = object()
+
+
+class FetchCoordinator:
+    def __init__(
+        self,
+        sources: Iterable[Source],
+        max_workers: Optional[int] = None,
+        connect: Optional[
+            Callable[[EmailAccount], ContextManager[IMAPClient]]
+        ] = None,
+        max_per_account: Optional[int] = None
+    ) -> None:
+        """Fetch sources concurrently, one connection per source
+
+        connect(account) gives a session as a context manager; by default
+        a new connection that is logged out afterwards. At most
+        max_per_account (default EMAIL_POOL_SIZE, the size of an account's
+        connection pool) sources of one account are fetched at once, so
+        the others wait for a session instead of timing out on the pool.
+        """
+        self.sources = list(sources)
+        self.max_workers = max_workers or EMAIL_MAX_CONCURRENT_FETCHES
+        self.max_per_account = max_per_account or EMAIL_POOL_SIZE
+        self.connect = connect or (lambda account: account.session())
+        self.errors: List[Tuple[Source, Exception]] = []
+
+    def iter_attachments(
+        self,
+        sync: bool = False,
+        start_date: Optional[date] = None,
+        end_date: Optional[date] = None,
+        state: Optional[SyncStateStore] = None,
+        batch_size: Optional[int] = None,
+        defer_checkpoints: bool = False
+    ) -> Iterator[AttachmentBatch]:
+        """Yield attachment batches from all sources as they arrive
+
+        Unread messages in the date window are fetched, or with sync
+        the messages new since each folder's checkpoint. A source only
+        moves on once its previous batch was consumed, so checkpoints
+        never pass unprocessed mail and at most one batch per source is
+        buffered. Failing sources are recorded in errors and do not stop
+        the others. defer_checkpoints is passed on to
+        EmailProcessor.sync_pdf_attachments.
+        """
+        self.errors = []
+        if sync and state is None:
+            state = SyncStateStore()
+        results = queue.Queue()
+        stopped = threading.Event()
+        account_slots = {
+            account.key: threading.Semaphore(self.max_per_account)
+            for account, _ in self.sources
+        }
+
+        def fetch(source: Source) -> None:
+            account, folder = source
+            # Sources of one account take turns for its pooled sessions
+            with account_slots[account.key]:
+                if stopped.is_set():
+                    results.put(_DONE)
+                    return
+                try:
+                    with self.connect(account) as client:
+                        processor = EmailProcessor(client, account.user)
+                        if sync:
+                            batches = processor.sync_pdf_attachments(
+                                folder, state, batch_size, defer_checkpoints
+                            )
+                        else:
+                            batches = processor.iter_pdf_attachments(
+                                folder, start_date, end_date, batch_size
+                            )
+                        for batch in batches:
+                            consumed = threading.Event()
+                            results.put((batch, consumed))
+                            while not consumed.wait(0.1):
+                                if stopped.is_set():
+                                    return
+                except Exception as exc:
+                    results.put((source, exc))
+                finally:
+                    results.put(_DONE)
+
+        with ThreadPoolExecutor(
+            max_workers=self.max_workers, thread_name_prefix='email-fetch'
+        ) as executor:
+            try:
+                for source in self.sources:
+                    executor.submit(fetch, source)
+
+                remaining = len(self.sources)
+                while remaining:
+                    item = results.get()
+                    if item is _DONE:
+                        remaining -= 1
+                    elif isinstance(item[1], Exception):
+                        source, exc = item
+                        print(f'Failed to fetch {_describe(source)}: {exc}')
+                        self.errors.append(item)
+                    else:
+                        batch, consumed = item
+                        yield batch
+                        consumed.set()
+            finally:
+                # Abandoned sources stop without checkpointing
+                stopped.set()
+
+
+def _describe(source: Source) -> str:
+    account, folder = source
+    return f'{account.user}/{folder}'
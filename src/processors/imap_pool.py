@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+
+"""
+Pool of logged-in IMAP sessions kept alive between jobs
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Tuple
+from imapclient import IMAPClient
+from imapclient.exceptions import IMAPClientError
+from src.core.config import (
+    EMAIL_POOL_SIZE, EMAIL_KEEPALIVE_SECONDS, EMAIL_POOL_TIMEOUT_SECONDS
+)
+from src.processors.email_accounts import EmailAccount
+
+# Errors of a NOOP showing a session is dead
+CONNECTION_ERRORS = (IMAPClientError, OSError)
+
+
+class IMAPConnectionPool:
+    def __init__(
+        self,
+        account: Optional[EmailAccount] = None,
+        max_connections: Optional[int] = None,
+        keepalive_interval: Optional[float] = None,
+        validate_after: float = 5.0
+    ) -> None:
+        self.account = account or EmailAccount.from_config()
+        self.max_connections = max_connections or EMAIL_POOL_SIZE
+        self.keepalive_interval = (
+            keepalive_interval or EMAIL_KEEPALIVE_SECONDS
+        )
+        # Sessions idle for longer are checked with NOOP before reuse
+        self.validate_after = validate_after
+
+        self._slots = threading.BoundedSemaphore(self.max_connections)
+        self._lock = threading.Lock()
+        self._idle: List[Tuple[IMAPClient, float]] = []
+        self._stopped = threading.Event()
+        self._keepalive_thread = None
+
+    @contextmanager
+    def connection(
+        self,
+        timeout: Optional[float] = EMAIL_POOL_TIMEOUT_SECONDS
+    ) -> Iterator[IMAPClient]:
+        """Check out a logged-in session for the duration of a job
+
+        Waits up to timeout seconds, or indefinitely for None, when
+        max_connections sessions are in use. A session whose job raises is
+        discarded rather than returned to the pool, as callers such as
+        EmailProcessor wrap connection errors in their own exceptions.
+        """
+        if not self._slots.acquire(timeout=timeout):
+            raise RuntimeError(
+                f'No IMAP connection available for {self.account.user} '
+                f'after {timeout}s'
+            )
+
+        client = None
+        try:
+            client = self._checkout()
+            yield client
+        except Exception:
+            self._discard(client)
+            client = None
+            raise
+        finally:
+            if client is not None:
+                self._return(client)
+            self._slots.release()
+            self._start_keepalive()
+
+    def close(self) -> None:
+        """Log out every idle session and stop the keepalive thread"""
+        self._stopped.set()
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for client, _ in idle:
+            self._discard(client)
+
+    def _checkout(self) -> IMAPClient:
+        """Reuse the most recent idle session if it is alive"""
+        while True:
+            with self._lock:
+                if not self._idle:
+                    break
+                client, last_used = self._idle.pop()
+            if time.monotonic() - last_used < self.validate_after:
+                return client
+            if self._is_alive(client):
+                return client
+            print('Discarding dead IMAP connection')
+            self._discard(client)
+        return self._open()
+
+    def _return(self, client: IMAPClient) -> None:
+        """Make a session idle, logging out the oldest beyond the cap"""
+        with self._lock:
+            self._idle.append((client, time.monotonic()))
+            excess = self._idle[:-self.max_connections]
+            del self._idle[:-self.max_connections]
+        for stale, _ in excess:
+            self._discard(stale)
+
+    def _open(self) -> IMAPClient:
+        """Connect and log in a new session"""
+        return self.account.connect()
+
+    @staticmethod
+    def _is_alive(client: IMAPClient) -> bool:
+        try:
+            client.noop()
+            return True
+        except CONNECTION_ERRORS:
+            return False
+
+    @staticmethod
+    def _discard(client: Optional[IMAPClient]) -> None:
+        if client is None:
+            return
+        try:
+            client.logout()
+        except Exception:
+            try:
+                client.shutdown()
+            except Exception:
+                pass
+
+    def _start_keepalive(self) -> None:
+        with self._lock:
+            if self._keepalive_thread or self._stopped.is_set():
+                return
+            self._keepalive_thread = threading.Thread(
+                target=self._keepalive, name='imap-keepalive', daemon=True
+            )
+            self._keepalive_thread.start()
+
+    def _keepalive(self) -> None:
+        """NOOP idle sessions so the server does not time them out"""
+        while not self._stopped.wait(self.keepalive_interval / 2):
+            now = time.monotonic()
+            due = []
+            with self._lock:
+                for entry in list(self._idle):
+                    if now - entry[1] < self.keepalive_interval:
+                        continue
+                    # A ping holds a slot like a job, so checkouts wait for
+                    # the session instead of opening one past the cap
+                    if not self._slots.acquire(blocking=False):
+                        break
+                    self._idle.remove(entry)
+                    due.append(entry)
+            for client, _ in due:
+                try:
+                    if self._is_alive(client):
+                        self._return(client)
+                    else:
+                        self._discard(client)
+                finally:
+                    self._slots.release()
+
+
+_pools: Dict[Tuple[str, int, str], IMAPConnectionPool] = {}
+_pools_lock = threading.Lock()
+
+
+def get_connection_pool(
+    account: Optional[EmailAccount] = None
+) -> IMAPConnectionPool:
+    """Get the process-wide pool of an account (default: configured one)"""
+    account = account or EmailAccount.from_config()
+    with _pools_lock:
+        if account.key not in _pools:
+            _pools[account.key] = IMAPConnectionPool(account)
+        return _pools[account.key]
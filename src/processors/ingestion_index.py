@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+
+"""
+Lookup table of ingested (Message-ID, attachment) pairs, mirroring the
+ledger's transaction metadata
+"""
+
+import time
+from pathlib import Path
+from typing import Dict, Iterable, Optional, Set, Tuple
+from src.core.config import INGESTION_INDEX_FILE
+from src.processors.sqlite_store import ProcessRegistry, SQLiteDatabase
+
+INDEX_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS ingested (
+    message_id TEXT NOT NULL,
+    attachment TEXT NOT NULL,
+    filename TEXT NOT NULL,
+    entry_date TEXT,
+    payee TEXT,
+    amount TEXT,
+    ingested_at REAL NOT NULL,
+    PRIMARY KEY (message_id, attachment)
+);
+CREATE INDEX IF NOT EXISTS ingested_message_id ON ingested (message_id);
+'''
+
+# message_id, attachment, filename, and the ledger entry's date, payee and
+# amount (None when the receipt produced no transaction)
+Row = Tuple[
+    str, str, str, Optional[str], Optional[str], Optional[str]
+]
+
+
+class IngestionIndex:
+    def __init__(self, path: Optional[Path] = None) -> None:
+        """Record which attachments of which messages were ingested
+
+        The ledger's message_id and attachment metadata stay
+        authoritative; this table lets the email processor skip messages
+        before downloading them.
+        """
+        self.path = Path(path or INGESTION_INDEX_FILE)
+        self._db = SQLiteDatabase(self.path, INDEX_SCHEMA)
+
+    def record(self, rows: Iterable[Row]) -> None:
+        """Record ingested attachments, after their ledger commit"""
+        now = time.time()
+        rows = [row + (now,) for row in rows if row[0]]
+        if not rows:
+            return
+        with self._db.connect() as db:
+            db.executemany(
+                'INSERT OR IGNORE INTO ingested VALUES (?, ?, ?, ?, ?, ?, ?)',
+                rows
+            )
+            db.commit()
+
+    def ingested_filenames(
+        self,
+        message_ids: Iterable[str]
+    ) -> Dict[str, Set[str]]:
+        """The attachment filenames already ingested per Message-ID"""
+        message_ids = list({mid for mid in message_ids if mid})
+        if not message_ids or not self._db.exists():
+            return {}
+
+        found = {}
+        with self._db.connect() as db:
+            # Stays under SQLite's default limit of 999 variables
+            for offset in range(0, len(message_ids), 500):
+                chunk = message_ids[offset:offset + 500]
+                placeholders = ', '.join('?' * len(chunk))
+                for message_id, filename in db.execute(
+                    'SELECT message_id, filename FROM ingested '
+                    f'WHERE message_id IN ({placeholders})',
+                    chunk
+                ):
+                    found.setdefault(message_id, set()).add(filename)
+        return found
+
+
+_indexes: ProcessRegistry[IngestionIndex] = ProcessRegistry()
+
+
+def get_ingestion_index(path: Optional[Path] = None) -> IngestionIndex:
+    """Get the process-wide index of a file (default INGESTION_INDEX_FILE)"""
+    path = Path(path or INGESTION_INDEX_FILE)
+    return _indexes.get(path, lambda: IngestionIndex(path))
@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+
+"""
+Staged receipt ingestion: fetching, parsing and ledger commits overlap
+"""
+
+import queue
+import threading
+from concurrent.futures import Executor
+from typing import Iterable, Iterator, List, Optional, Tuple
+from src.core.config import INGEST_QUEUE_BATCHES
+from src.processors.attachment_store import content_hash
+from src.processors.ingestion_index import IngestionIndex, get_ingestion_index
+from src.processors.ledger_manager import LedgerManager
+from src.processors.pdf_parser import (
+    ParseResult, PDFSource, Receipt, ReceiptParser
+)
+
+_DONE = object()
+
+
+class IngestionPipeline:
+    def __init__(
+        self,
+        receipt_parser: ReceiptParser,
+        ledger_manager: LedgerManager,
+        parse_workers: Optional[int] = None,
+        queue_batches: Optional[int] = None,
+        executor: Optional[Executor] = None,
+        index: Optional[IngestionIndex] = None
+    ) -> None:
+        """Ingest attachment batches in three concurrent stages
+
+        A fetch thread pulls batches and submits their PDFs to
+        ReceiptParser.parse_many, on the shared pool of parse_workers
+        processes (or executor), while the calling thread commits
+        finished batches to the ledger in fetch order. At most
+        queue_batches batches wait between the stages, so the slowest
+        stage sets the pace and memory stays bounded. Committed email
+        attachments are recorded in index (default INGESTION_INDEX_FILE).
+        """
+        self.receipt_parser = receipt_parser
+        self.ledger_manager = ledger_manager
+        self.parse_workers = parse_workers
+        self.queue_batches = queue_batches or INGEST_QUEUE_BATCHES
+        self.executor = executor
+        self.index = index or get_ingestion_index()
+
+    def run(
+        self,
+        batches: Iterable[List[Tuple[str, PDFSource]]]
+    ) -> List[Tuple[str, Receipt]]:
+        """Ingest every batch and return the (filename, receipt) added
+
+        Each batch is committed in one ledger write, then its
+        checkpoint(), if any, is called. Email attachments the ledger
+        already has a transaction for are skipped, as is a receipt that
+        fails to parse; a failure to fetch is raised once the batches
+        fetched before it are committed.
+        """
+        parsed = queue.Queue(maxsize=self.queue_batches)
+        stopped = threading.Event()
+        errors = []
+
+        def fetch() -> None:
+            iterator = iter(batches)
+            try:
+                for batch in iterator:
+                    senders = getattr(batch, 'senders', None) or \
+                        [None] * len(batch)
+                    results = self.receipt_parser.parse_many(
+                        [
+                            (filename, payload, sender)
+                            for (filename, payload), sender
+                            in zip(batch, senders)
+                        ],
+                        self.parse_workers, executor=self.executor
+                    )
+                    if not _put(parsed, (batch, results), stopped):
+                        results.close()
+                        break
+            except Exception as exc:
+                errors.append(exc)
+            finally:
+                # Abandoned batch generators stop without checkpointing
+                close = getattr(iterator, 'close', None)
+                if close:
+                    close()
+                _put(parsed, _DONE, stopped)
+
+        fetcher = threading.Thread(
+            target=fetch, name='ingest-fetch', daemon=True
+        )
+        fetcher.start()
+        added = []
+        try:
+            while True:
+                item = parsed.get()
+                if item is _DONE:
+                    break
+                batch, results = item
+                added.extend(self._commit(batch, results))
+                checkpoint = getattr(batch, 'checkpoint', None)
+                if checkpoint:
+                    checkpoint()
+        finally:
+            stopped.set()
+            fetcher.join()
+            # Cancel the parsing of batches that will not be committed
+            while not parsed.empty():
+                item = parsed.get()
+                if item is not _DONE:
+                    item[1].close()
+
+        if errors:
+            raise errors[0]
+        return added
+
+    def _commit(
+        self,
+        batch: List[Tuple[str, PDFSource]],
+        results: Iterator[ParseResult]
+    ) -> List[Tuple[str, Receipt]]:
+        """Write the parsed receipts of one batch in a single commit"""
+        message_ids = getattr(batch, 'message_ids', None) or \
+            [None] * len(batch)
+        added = []
+        ingested = []
+        keys = set()
+        with self.ledger_manager.batch():
+            for result in results:
+                filename, payload = batch[result.index]
+                if result.error:
+                    print(f'Failed to parse {filename}: {result.error}')
+                    continue
+
+                receipt_data = _link(
+                    result.receipt, payload, message_ids[result.index]
+                )
+                key = (
+                    receipt_data.get('message_id'),
+                    receipt_data.get('attachment')
+                )
+                if all(key):
+                    if key in keys or self.ledger_manager.is_ingested(*key):
+                        print(f'Skipping {filename}, already ingested')
+                        ingested.append(key + (filename, None, None, None))
+                        continue
+                    keys.add(key)
+
+                if receipt_data.get('amount'):
+                    self.ledger_manager.add_transaction(receipt_data)
+                    added.append((filename, receipt_data))
+                    merchant = receipt_data.get('merchant')
+                    amount = receipt_data['amount']
+                    print(f'Added transaction: {merchant} - ${amount}')
+                    entry = (receipt_data.get('date'), merchant, amount)
+                else:
+                    print(f'Could not extract data from {filename}')
+                    entry = (None, None, None)
+                if all(key):
+                    ingested.append(key + (filename,) + entry)
+
+        # Only once the ledger has them, so the index never runs ahead
+        self.index.record(ingested)
+        return added
+
+
+def _link(
+    receipt_data: Receipt,
+    payload: PDFSource,
+    message_id: Optional[str]
+) -> Receipt:
+    """Link a receipt to its stored PDF and the email it came from"""
+    if isinstance(payload, (bytes, bytearray, memoryview)):
+        receipt_data['attachment'] = content_hash(payload)
+    if message_id:
+        receipt_data['message_id'] = message_id
+    return receipt_data
+
+
+def _put(
+    target: queue.Queue,
+    item: object,
+    stopped: threading.Event
+) -> bool:
+    """Put with backpressure, giving up once the consumer has stopped"""
+    while not stopped.is_set():
+        try:
+            target.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            pass
+    return False
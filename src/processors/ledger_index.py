@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+
+"""
+In-memory indexes for querying ledger transactions
+"""
+
+from bisect import bisect_left, bisect_right
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Dict, List, Optional, Tuple
+
+# Sorts after any character that can appear in a payee
+_PREFIX_END = '\U0010ffff'
+
+
+class LedgerIndex:
+    def __init__(self, transactions: List[Dict]) -> None:
+        # Date-sorted rows, ties kept in ledger order
+        order = sorted(
+            range(len(transactions)),
+            key=lambda i: (transactions[i]['date'], i)
+        )
+        self.rows = [transactions[i] for i in order]
+        self.keys = [(transactions[i]['date'], i) for i in order]
+        self.dates = [key[0] for key in self.keys]
+
+        amounts = [Decimal(row['amount']) for row in self.rows]
+        self.amount_totals = [Decimal(0)]
+        for amount in amounts:
+            self.amount_totals.append(self.amount_totals[-1] + amount)
+
+        # Secondary indexes map sorted keys to positions in self.rows
+        payee_index = sorted(
+            ((row['payee'] or '').lower(), pos)
+            for pos, row in enumerate(self.rows)
+        )
+        self.payee_keys = [key for key, _ in payee_index]
+        self.payee_positions = [pos for _, pos in payee_index]
+
+        amount_index = sorted(
+            (amount, pos) for pos, amount in enumerate(amounts)
+        )
+        self.amounts = amounts
+        self.amount_keys = [key for key, _ in amount_index]
+        self.amount_positions = [pos for _, pos in amount_index]
+
+    def query(
+        self,
+        start_date: Optional[date] = None,
+        end_date: Optional[date] = None,
+        payee_prefix: Optional[str] = None,
+        min_amount: Optional[Decimal] = None,
+        max_amount: Optional[Decimal] = None,
+        descending: bool = False,
+        limit: Optional[int] = None,
+        offset: int = 0,
+        cursor: Optional[str] = None
+    ) -> Dict:
+        """Query transactions, returning one page and the match summary"""
+        lo = bisect_left(self.dates, start_date) if start_date else 0
+        hi = (
+            bisect_right(self.dates, end_date) if end_date
+            else len(self.rows)
+        )
+        hi = max(lo, hi)
+
+        if payee_prefix is None and min_amount is None and max_amount is None:
+            # Date filters alone select a contiguous run of rows
+            positions = range(lo, hi)
+            total_amount = self.amount_totals[hi] - self.amount_totals[lo]
+        else:
+            positions = self._filter(
+                lo, hi, payee_prefix, min_amount, max_amount
+            )
+            total_amount = sum(
+                (self.amounts[pos] for pos in positions), Decimal(0)
+            )
+
+        total = len(positions)
+        if cursor:
+            # Positions follow key order, so the cursor maps to a position
+            key = self._decode_cursor(cursor)
+            if descending:
+                boundary = bisect_left(self.keys, key)
+                positions = positions[:bisect_left(positions, boundary)]
+            else:
+                boundary = bisect_right(self.keys, key)
+                positions = positions[bisect_left(positions, boundary):]
+
+        if descending:
+            positions = positions[::-1]
+        if offset:
+            positions = positions[offset:]
+
+        has_more = False
+        if limit is not None:
+            has_more = len(positions) > limit
+            positions = positions[:limit]
+
+        page = [self.rows[pos] for pos in positions]
+        next_cursor = None
+        if has_more and page:
+            next_cursor = self._encode_cursor(self.keys[positions[-1]])
+
+        return {
+            'transactions': page,
+            'total': total,
+            'total_amount': str(total_amount),
+            'next_cursor': next_cursor
+        }
+
+    def _filter(
+        self,
+        lo: int,
+        hi: int,
+        payee_prefix: Optional[str],
+        min_amount: Optional[Decimal],
+        max_amount: Optional[Decimal]
+    ) -> List[int]:
+        """Select matching positions starting from the narrowest index"""
+        candidates = [(hi - lo, None)]
+
+        payee_key = None
+        if payee_prefix is not None:
+            payee_key = payee_prefix.lower()
+            p_lo = bisect_left(self.payee_keys, payee_key)
+            p_hi = bisect_left(self.payee_keys, payee_key + _PREFIX_END)
+            candidates.append((p_hi - p_lo, self.payee_positions[p_lo:p_hi]))
+
+        if min_amount is not None or max_amount is not None:
+            a_lo = (
+                bisect_left(self.amount_keys, min_amount)
+                if min_amount is not None else 0
+            )
+            a_hi = (
+                bisect_right(self.amount_keys, max_amount)
+                if max_amount is not None else len(self.amount_keys)
+            )
+            candidates.append(
+                (max(0, a_hi - a_lo), self.amount_positions[a_lo:a_hi])
+            )
+
+        _, narrowest = min(candidates, key=lambda candidate: candidate[0])
+        if narrowest is None:
+            narrowest = range(lo, hi)
+        else:
+            narrowest = sorted(narrowest)
+
+        positions = []
+        for pos in narrowest:
+            if not lo <= pos < hi:
+                continue
+            payee = (self.rows[pos]['payee'] or '').lower()
+            if payee_key is not None and not payee.startswith(payee_key):
+                continue
+            amount = self.amounts[pos]
+            if min_amount is not None and amount < min_amount:
+                continue
+            if max_amount is not None and amount > max_amount:
+                continue
+            positions.append(pos)
+        return positions
+
+    def _encode_cursor(self, key: Tuple[date, int]) -> str:
+        """Encode a row key as an opaque cursor"""
+        return f'{key[0].isoformat()}:{key[1]}'
+
+    def _decode_cursor(self, cursor: str) -> Tuple[date, int]:
+        """Decode a cursor produced by _encode_cursor"""
+        try:
+            date_str, seq = cursor.split(':')
+            return (datetime.strptime(date_str, '%Y-%m-%d').date(), int(seq))
+        except ValueError as exc:
+            raise ValueError(f'Invalid cursor: {cursor}') from exc
+
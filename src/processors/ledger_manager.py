@@ -4,21 +4,69 @@
 Beancount ledger manager for storing and retrieving transactions
 """
 
-from datetime import datetime
-from typing import Dict, List, Optional
+import os
+import re
+import threading
+from contextlib import contextmanager
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
 from beancount.core import data
 from beancount.core.amount import Amount
 from beancount.core.number import D
 from beancount.parser import printer
-from src.core.config import BEANCOUNT_FILE
+from src.core.config import BEANCOUNT_FILE, LEDGER_SNAPSHOT_ENABLED
+from src.processors.ledger_index import LedgerIndex
+from src.processors.ledger_snapshot import (
+    hash_file, load_snapshot, save_snapshot
+)
+
+# Header lines that are not entries, kept at the top when rewriting
+HEADER_PATTERN = re.compile(r'^(option|plugin|include)\s')
 
 
 class LedgerManager:
     def __init__(self) -> None:
         self.entries = []
+        self._lock = threading.RLock()
+        self._local = threading.local()
+        self._signature = None
+        self._index = None
+        self._ingested = None
+        # Errors of the last parse; the file is not rewritten while any
+        self.parse_errors = []
         self._ensure_accounts_exist()
         self._load_ledger()
 
+    @property
+    def _pending(self) -> Optional[List[data.Transaction]]:
+        """Transactions collected by the current thread's batch"""
+        return getattr(self._local, 'pending', None)
+
+    @_pending.setter
+    def _pending(self, value: Optional[List[data.Transaction]]) -> None:
+        self._local.pending = value
+
+    def refresh(self) -> bool:
+        """Reload the ledger if the file changed since it was last read"""
+        with self._lock:
+            if self._file_signature() == self._signature:
+                return False
+            self.entries = []
+            self._index = None
+            self._ingested = None
+            self._ensure_accounts_exist()
+            self._load_ledger()
+            return True
+
+    def _file_signature(self) -> Optional[Tuple[int, int, int]]:
+        """Identify the current state of the ledger file"""
+        try:
+            stat = BEANCOUNT_FILE.stat()
+        except FileNotFoundError:
+            return None
+        return (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+
     def _ensure_accounts_exist(self) -> None:
         """Ensure required accounts exist in the ledger"""
         # Define the accounts we need
@@ -47,30 +95,114 @@ class LedgerManager:
 
     def _load_ledger(self) -> None:
         """Load existing ledger entries"""
+        self._signature = self._file_signature()
+        self.parse_errors = []
         if BEANCOUNT_FILE.exists():
             try:
+                source_hash = None
+                if LEDGER_SNAPSHOT_ENABLED:
+                    source_hash = hash_file(BEANCOUNT_FILE)
+                    entries = load_snapshot(BEANCOUNT_FILE, source_hash)
+                    if entries is not None:
+                        self.entries = entries
+                        return
+
                 from beancount.parser import parser
                 entries, errors, options = parser.parse_file(
                     str(BEANCOUNT_FILE)
                 )
+                self.parse_errors = errors
                 if not errors:
                     self.entries = entries
-            except Exception:
+                    if source_hash:
+                        save_snapshot(BEANCOUNT_FILE, source_hash, entries)
+            except Exception as e:
                 # If parsing fails, start with empty entries
                 self.entries = []
+                self.parse_errors = [e]
 
     def add_transaction(self, receipt_data: Dict[str, Optional[str]]) -> None:
         """Add a transaction from receipt data"""
-        if not receipt_data.get('amount'):
+        transaction = self._build_transaction(receipt_data)
+        if transaction is None:
+            return
+
+        if self._pending is not None:
+            self._pending.append(transaction)
+            return
+
+        self._commit([transaction])
+
+    def add_transactions(
+        self,
+        receipts: Iterable[Dict[str, Optional[str]]]
+    ) -> int:
+        """Add transactions from many receipts with a single write"""
+        transactions = []
+        for receipt_data in receipts:
+            transaction = self._build_transaction(receipt_data)
+            if transaction is not None:
+                transactions.append(transaction)
+
+        if self._pending is not None:
+            self._pending.extend(transactions)
+        else:
+            self._commit(transactions)
+        return len(transactions)
+
+    @contextmanager
+    def batch(self) -> Iterator['LedgerManager']:
+        """Collect transactions and persist them together on exit"""
+        if self._pending is not None:
+            # Already inside a batch, the outer one commits
+            yield self
+            return
+
+        self._pending = []
+        try:
+            yield self
+            pending = self._pending
+        finally:
+            self._pending = None
+        self._commit(pending)
+
+    def _commit(self, transactions: List[data.Transaction]) -> None:
+        """Add transactions to the ledger and persist them"""
+        if not transactions:
             return
 
+        with self._lock:
+            # Pick up writes made by other processes before appending
+            self.refresh()
+            self.entries.extend(transactions)
+            self._index = None
+            self._ingested = None
+            self._append_entries(transactions)
+            self._signature = self._file_signature()
+
+    def _build_transaction(
+        self,
+        receipt_data: Dict[str, Optional[str]]
+    ) -> Optional[data.Transaction]:
+        """Build a Beancount transaction from receipt data"""
+        if not receipt_data.get('amount'):
+            return None
+
         amount = D(receipt_data['amount'].replace('$', ''))
         date = self._parse_date(receipt_data.get('date'))
         merchant = receipt_data.get('merchant', 'Unknown')
 
+        # Links the receipt PDF in the attachment store and the email it
+        # came from, which makes ingestion idempotent
+        meta = {
+            key: receipt_data[key]
+            for key in ('message_id', 'attachment')
+            if receipt_data.get(key)
+        }
+
         # Create Beancount transaction
         transaction = data.Transaction(
-            meta=data.new_metadata(BEANCOUNT_FILE, 0),
+            meta=data.new_metadata(BEANCOUNT_FILE, 0, meta),
             date=date,
             flag='*',
             payee=merchant,
@@ -97,8 +229,7 @@ class LedgerManager:
             ]
         )
 
-        self.entries.append(transaction)
-        self._save_ledger()
+        return transaction
 
     def _parse_date(self, date_str: Optional[str]) -> datetime:
         """Parse date string to datetime"""
@@ -113,23 +244,71 @@ class LedgerManager:
             except ValueError:
                 return datetime.now().date()
 
+    def _append_entries(self, entries: List[data.Directive]) -> None:
+        """Append entries to the end of the ledger file"""
+        if not BEANCOUNT_FILE.exists() or BEANCOUNT_FILE.stat().st_size == 0:
+            # Nothing to append to yet, write the full ledger once so the
+            # account opening entries land at the top of the file
+            self._save_ledger()
+            return
+
+        with open(BEANCOUNT_FILE, 'rb') as f:
+            f.seek(-1, os.SEEK_END)
+            needs_newline = f.read(1) != b'\n'
+
+        chunks = [printer.format_entry(entry) for entry in entries]
+        if needs_newline:
+            chunks.insert(0, '\n')
+
+        with open(BEANCOUNT_FILE, 'a') as f:
+            f.write(''.join(chunks))
+            f.flush()
+            os.fsync(f.fileno())
+
+    def compact(self) -> None:
+        """Rewrite the ledger file in canonical order"""
+        with self._lock:
+            self.refresh()
+            if self.parse_errors:
+                # self.entries is not the file's content, rewriting loses it
+                raise ValueError(
+                    f'{BEANCOUNT_FILE} has {len(self.parse_errors)} parse '
+                    'errors, fix them before compacting'
+                )
+            self.entries.sort(key=data.entry_sortkey)
+            self._index = None
+            self._ingested = None
+            self._save_ledger()
+            self._signature = self._file_signature()
+            if LEDGER_SNAPSHOT_ENABLED:
+                save_snapshot(
+                    BEANCOUNT_FILE, hash_file(BEANCOUNT_FILE), self.entries
+                )
+
     def _save_ledger(self) -> None:
-        """Save ledger to file"""
-        with open(BEANCOUNT_FILE, 'w') as f:
-            # Write account opening entries first
-            for entry in self.entries:
-                if isinstance(entry, data.Open):
-                    f.write(printer.format_entry(entry))
-
-            # Then write transactions
-            for entry in self.entries:
-                if isinstance(entry, data.Transaction):
-                    f.write(printer.format_entry(entry))
+        """Save ledger to file, every directive in canonical order"""
+        header = _header_lines()
+        tmp_file = BEANCOUNT_FILE.with_suffix('.beancount.tmp')
+        with open(tmp_file, 'w') as f:
+            # Options and plugins are not entries, keep them as written
+            if header:
+                f.write(''.join(header) + '\n')
+
+            for entry in sorted(self.entries, key=data.entry_sortkey):
+                f.write(printer.format_entry(entry))
+
+            f.flush()
+            os.fsync(f.fileno())
+
+        os.replace(tmp_file, BEANCOUNT_FILE)
 
     def get_transactions(self) -> List[Dict]:
         """Get all transactions as dictionaries"""
+        with self._lock:
+            entries = list(self.entries)
+
         transactions = []
-        for entry in self.entries:
+        for entry in entries:
             if isinstance(entry, data.Transaction):
                 transactions.append({
                     'date': entry.date,
@@ -138,3 +317,85 @@ class LedgerManager:
                     'currency': str(entry.postings[0].units.currency)
                 })
         return transactions
+
+    def referenced_attachments(self) -> Set[str]:
+        """Hashes of the stored attachments transactions link to"""
+        with self._lock:
+            entries = list(self.entries)
+
+        return {
+            entry.meta['attachment']
+            for entry in entries
+            if isinstance(entry, data.Transaction)
+            and entry.meta and entry.meta.get('attachment')
+        }
+
+    def is_ingested(self, message_id: str, attachment: str) -> bool:
+        """Check if an email attachment already has a transaction"""
+        with self._lock:
+            if self._ingested is None:
+                self._ingested = {
+                    (entry.meta['message_id'], entry.meta['attachment'])
+                    for entry in self.entries
+                    if isinstance(entry, data.Transaction)
+                    and entry.meta and entry.meta.get('message_id')
+                    and entry.meta.get('attachment')
+                }
+            return (message_id, attachment) in self._ingested
+
+    def query_transactions(
+        self,
+        start_date: Optional[date] = None,
+        end_date: Optional[date] = None,
+        payee_prefix: Optional[str] = None,
+        min_amount: Optional[Decimal] = None,
+        max_amount: Optional[Decimal] = None,
+        descending: bool = False,
+        limit: Optional[int] = None,
+        offset: int = 0,
+        cursor: Optional[str] = None
+    ) -> Dict:
+        """Query transactions through the date, payee and amount indexes"""
+        with self._lock:
+            if self._index is None:
+                self._index = LedgerIndex(self.get_transactions())
+            index = self._index
+
+        return index.query(
+            start_date=start_date,
+            end_date=end_date,
+            payee_prefix=payee_prefix,
+            min_amount=min_amount,
+            max_amount=max_amount,
+            descending=descending,
+            limit=limit,
+            offset=offset,
+            cursor=cursor
+        )
+
+
+def _header_lines() -> List[str]:
+    """The option, plugin and include lines of the ledger file"""
+    if not BEANCOUNT_FILE.exists():
+        return []
+    with open(BEANCOUNT_FILE) as f:
+        return [
+            line if line.endswith('\n') else line + '\n'
+            for line in f if HEADER_PATTERN.match(line)
+        ]
+
+
+_shared_manager = None
+_shared_lock = threading.Lock()
+
+
+def get_ledger_manager() -> LedgerManager:
+    """Get the process-wide ledger manager, reloading it if the file changed"""
+    global _shared_manager
+    with _shared_lock:
+        if _shared_manager is None:
+            _shared_manager = LedgerManager()
+        ledger_manager = _shared_manager
+
+    ledger_manager.refresh()
+    return ledger_manager
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+
+"""
+Binary snapshots of parsed ledger entries for fast loading
+"""
+
+import gc
+import hashlib
+import os
+import pickle
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator, List, Optional
+from beancount import __version__ as beancount_version
+from beancount.core import data
+
+# Bump when the snapshot layout changes so old snapshots are ignored
+SNAPSHOT_VERSION = 1
+
+
+@contextmanager
+def _gc_paused() -> Iterator[None]:
+    """Pause the cyclic GC, which otherwise dominates unpickling time"""
+    was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if was_enabled:
+            gc.enable()
+
+
+def snapshot_path(ledger_file: Path) -> Path:
+    """Get the snapshot file stored next to a ledger file"""
+    return ledger_file.with_name(f'.{ledger_file.name}.snapshot')
+
+
+def hash_file(path: Path) -> str:
+    """Compute the SHA-256 of a file's contents"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def load_snapshot(
+    ledger_file: Path,
+    source_hash: str
+) -> Optional[List[data.Directive]]:
+    """Load entries from the snapshot if it matches the ledger contents"""
+    path = snapshot_path(ledger_file)
+    try:
+        with open(path, 'rb') as f, _gc_paused():
+            snapshot = pickle.load(f)
+    except FileNotFoundError:
+        return None
+    except Exception as exc:
+        print(f'Ignoring unreadable ledger snapshot {path.name}: {exc}')
+        return None
+
+    if (
+        not isinstance(snapshot, dict)
+        or snapshot.get('version') != SNAPSHOT_VERSION
+        or snapshot.get('beancount') != beancount_version
+        or snapshot.get('source_hash') != source_hash
+    ):
+        return None
+    return snapshot['entries']
+
+
+def save_snapshot(
+    ledger_file: Path,
+    source_hash: str,
+    entries: List[data.Directive]
+) -> None:
+    """Write a snapshot of the parsed entries for a ledger file"""
+    path = snapshot_path(ledger_file)
+    tmp_path = path.with_name(f'{path.name}.tmp')
+    snapshot = {
+        'version': SNAPSHOT_VERSION,
+        'beancount': beancount_version,
+        'source_hash': source_hash,
+        'entries': entries
+    }
+    try:
+        with open(tmp_path, 'wb') as f, _gc_paused():
+            pickle.dump(snapshot, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+    except Exception as exc:
+        # A missing snapshot only costs a full parse on the next load
+        print(f'Could not write ledger snapshot {path.name}: {exc}')
+        tmp_path.unlink(missing_ok=True)
@@ -0,0 +1,410 @@
+#!/usr/bin/env python3
+
+"""
+Candidate lookup and scoring for matching bank and ledger transactions
+"""
+
+from bisect import bisect_left, bisect_right
+from collections import deque
+from typing import Dict, List, Optional, Tuple
+
+
+def to_cents(amount: float) -> int:
+    """Convert a normalized amount to integer cents"""
+    return round(amount * 100)
+
+
+class MatchTolerance:
+    def __init__(
+        self,
+        days: int = 0,
+        amount: float = 0.0,
+        percent: float = 0.0
+    ) -> None:
+        if days < 0 or amount < 0 or percent < 0:
+            raise ValueError('Match tolerances must not be negative')
+        self.days = int(days)
+        self.amount_cents = to_cents(amount)
+        self.percent = percent
+
+    @property
+    def is_exact(self) -> bool:
+        """Whether only identical dates and amounts can match"""
+        return (
+            self.days == 0 and self.amount_cents == 0 and self.percent == 0
+        )
+
+    def slack_cents(self, cents: int) -> int:
+        """Get the allowed amount difference for an amount in cents"""
+        percent_cents = int(abs(cents) * self.percent / 100)
+        return max(self.amount_cents, percent_cents)
+
+    def score(self, day_diff: int, cents_diff: int, slack: int) -> float:
+        """Score a candidate from 1.0 (identical) down towards 0.0"""
+        date_penalty = day_diff / (self.days + 1)
+        amount_penalty = cents_diff / (slack + 1)
+        return round(1.0 - (date_penalty + amount_penalty) / 2, 4)
+
+
+class LedgerCandidateIndex:
+    def __init__(self, ledger: List[Dict], tolerance: MatchTolerance) -> None:
+        self.tolerance = tolerance
+        self.ordinals = [tx['date'].toordinal() for tx in ledger]
+        self.cents = [to_cents(tx['amount']) for tx in ledger]
+
+        if tolerance.is_exact:
+            self.exact = {}
+            for position, key in enumerate(zip(self.ordinals, self.cents)):
+                self.exact.setdefault(key, []).append(position)
+            return
+
+        # Sorted views used to sweep a window on either dimension
+        by_date = sorted(range(len(ledger)), key=self.ordinals.__getitem__)
+        self.date_keys = [self.ordinals[pos] for pos in by_date]
+        self.date_positions = by_date
+
+        by_amount = sorted(range(len(ledger)), key=self.cents.__getitem__)
+        self.amount_keys = [self.cents[pos] for pos in by_amount]
+        self.amount_positions = by_amount
+
+    def best(self, tx: Dict) -> Optional[Tuple[float, int]]:
+        """Get the closest ledger candidate, or None"""
+        if self.tolerance.is_exact:
+            key = (tx['date'].toordinal(), to_cents(tx['amount']))
+            positions = self.exact.get(key)
+            return (1.0, positions[0]) if positions else None
+
+        candidates = self.candidates(tx)
+        return candidates[0] if candidates else None
+
+    def candidates(self, tx: Dict) -> List[Tuple[float, int]]:
+        """Find ledger positions within tolerance, closest first"""
+        ordinal = tx['date'].toordinal()
+        cents = to_cents(tx['amount'])
+
+        if self.tolerance.is_exact:
+            return [
+                (1.0, position)
+                for position in self.exact.get((ordinal, cents), [])
+            ]
+
+        days = self.tolerance.days
+        slack = self.tolerance.slack_cents(cents)
+
+        # Sweep whichever window holds fewer rows and check the other
+        d_lo = bisect_left(self.date_keys, ordinal - days)
+        d_hi = bisect_right(self.date_keys, ordinal + days)
+        a_lo = bisect_left(self.amount_keys, cents - slack)
+        a_hi = bisect_right(self.amount_keys, cents + slack)
+
+        if d_hi - d_lo <= a_hi - a_lo:
+            window = self.date_positions[d_lo:d_hi]
+        else:
+            window = self.amount_positions[a_lo:a_hi]
+
+        ranked = []
+        for position in window:
+            day_diff = abs(self.ordinals[position] - ordinal)
+            cents_diff = abs(self.cents[position] - cents)
+            if day_diff <= days and cents_diff <= slack:
+                score = self.tolerance.score(day_diff, cents_diff, slack)
+                ranked.append((score, position))
+
+        # Best score first, ties go to the earlier ledger transaction
+        ranked.sort(key=lambda candidate: (-candidate[0], candidate[1]))
+        return ranked
+
+
+# Components with more rows than this on both sides get a maximum
+# matching with near-optimal scores, as the exact assignment is cubic in
+# the component size
+ASSIGNMENT_COMPONENT_LIMIT = 300
+
+
+def assign_one_to_one(
+    candidates: List[List[Tuple[float, int]]]
+) -> Dict[int, Tuple[int, float]]:
+    """Match each bank row to at most one ledger row and vice versa
+
+    candidates[i] lists (score, ledger position) pairs for bank row i.
+    Returns {bank row: (ledger position, score)}, maximizing the number
+    of matches first and the total score second.
+    """
+    components = _connected_components(candidates)
+
+    assignment = {}
+    for bank_rows, ledger_positions in components:
+        smaller_side = min(len(bank_rows), len(ledger_positions))
+        if smaller_side == 1:
+            # With a single row on one side greedy is already optimal
+            assignment.update(_assign_greedy(candidates, bank_rows))
+        elif smaller_side > ASSIGNMENT_COMPONENT_LIMIT:
+            print(
+                f'Matching {len(bank_rows)} bank and '
+                f'{len(ledger_positions)} ledger rows by maximum matching, '
+                'scores may not be optimal'
+            )
+            assignment.update(_assign_maximum(candidates, bank_rows))
+        else:
+            assignment.update(
+                _assign_optimal(candidates, bank_rows, ledger_positions)
+            )
+    return assignment
+
+
+def _connected_components(
+    candidates: List[List[Tuple[float, int]]]
+) -> List[Tuple[List[int], List[int]]]:
+    """Split the candidate graph into independent bank/ledger groups"""
+    parent = {}
+
+    def find(node):
+        root = node
+        while parent[root] != root:
+            root = parent[root]
+        while parent[node] != root:
+            parent[node], node = root, parent[node]
+        return root
+
+    for bank_row, row_candidates in enumerate(candidates):
+        if not row_candidates:
+            continue
+        bank_node = ('bank', bank_row)
+        parent.setdefault(bank_node, bank_node)
+        for _, position in row_candidates:
+            ledger_node = ('ledger', position)
+            parent.setdefault(ledger_node, ledger_node)
+            bank_root, ledger_root = find(bank_node), find(ledger_node)
+            if bank_root != ledger_root:
+                parent[ledger_root] = bank_root
+
+    groups = {}
+    for node in parent:
+        groups.setdefault(find(node), ([], []))
+        side, index = node
+        groups[find(node)][0 if side == 'bank' else 1].append(index)
+
+    # Sorted members and component order keep the result deterministic
+    components = [
+        (sorted(bank_rows), sorted(ledger_positions))
+        for bank_rows, ledger_positions in groups.values()
+    ]
+    components.sort(key=lambda component: component[0][0])
+    return components
+
+
+def _assign_greedy(
+    candidates: List[List[Tuple[float, int]]],
+    bank_rows: List[int]
+) -> Dict[int, Tuple[int, float]]:
+    """Take the highest scoring unused pairs first"""
+    edges = sorted(
+        (-score, bank_row, position)
+        for bank_row in bank_rows
+        for score, position in candidates[bank_row]
+    )
+    assignment = {}
+    used = set()
+    for negative_score, bank_row, position in edges:
+        if bank_row in assignment or position in used:
+            continue
+        assignment[bank_row] = (position, -negative_score)
+        used.add(position)
+    return assignment
+
+
+def _assign_maximum(
+    candidates: List[List[Tuple[float, int]]],
+    bank_rows: List[int]
+) -> Dict[int, Tuple[int, float]]:
+    """Match as many rows as possible, preferring higher scores
+
+    Hopcroft-Karp, in O(E sqrt(V)) on the candidate edges, grows the
+    greedy pairs into a maximum matching; then rows move to a better
+    scoring free candidate where there is one.
+    """
+    ranked = {
+        bank_row: sorted(
+            candidates[bank_row],
+            key=lambda candidate: (-candidate[0], candidate[1])
+        )
+        for bank_row in bank_rows
+    }
+    adjacency = {
+        bank_row: [position for _, position in ranked[bank_row]]
+        for bank_row in bank_rows
+    }
+    position_of = {
+        bank_row: position
+        for bank_row, (position, _) in _assign_greedy(
+            candidates, bank_rows
+        ).items()
+    }
+    row_of = {position: row for row, position in position_of.items()}
+
+    while True:
+        # Layer rows by their distance from an unmatched bank row
+        distance = {}
+        queue = deque()
+        for bank_row in bank_rows:
+            if bank_row not in position_of:
+                distance[bank_row] = 0
+                queue.append(bank_row)
+        found = False
+        while queue:
+            bank_row = queue.popleft()
+            for position in adjacency[bank_row]:
+                next_row = row_of.get(position)
+                if next_row is None:
+                    found = True
+                elif next_row not in distance:
+                    distance[next_row] = distance[bank_row] + 1
+                    queue.append(next_row)
+        if not found:
+            break
+        for bank_row in bank_rows:
+            if bank_row not in position_of:
+                _augment(bank_row, adjacency, distance, position_of, row_of)
+
+    for bank_row in bank_rows:
+        if bank_row not in position_of:
+            continue
+        for _, position in ranked[bank_row]:
+            if position == position_of[bank_row]:
+                break
+            if position not in row_of:
+                del row_of[position_of[bank_row]]
+                position_of[bank_row] = position
+                row_of[position] = bank_row
+                break
+
+    return {
+        bank_row: (position, max(
+            score for score, candidate in ranked[bank_row]
+            if candidate == position
+        ))
+        for bank_row, position in position_of.items()
+    }
+
+
+def _augment(
+    root: int,
+    adjacency: Dict[int, List[int]],
+    distance: Dict[int, Optional[int]],
+    position_of: Dict[int, int],
+    row_of: Dict[int, int]
+) -> bool:
+    """Flip a shortest alternating path from an unmatched bank row"""
+    stack = [(root, iter(adjacency[root]))]
+    path = []  # path[i] is the ledger position taken by stack[i]'s row
+    while stack:
+        bank_row, positions = stack[-1]
+        for position in positions:
+            next_row = row_of.get(position)
+            if next_row is None:
+                path.append(position)
+                for (row, _), taken in zip(stack, path):
+                    position_of[row] = taken
+                    row_of[taken] = row
+                return True
+            if distance.get(next_row) == distance[bank_row] + 1:
+                path.append(position)
+                stack.append((next_row, iter(adjacency[next_row])))
+                break
+        else:
+            # A dead end, not explored again in this phase
+            distance[bank_row] = None
+            stack.pop()
+            if path:
+                path.pop()
+    return False
+
+
+def _assign_optimal(
+    candidates: List[List[Tuple[float, int]]],
+    bank_rows: List[int],
+    ledger_positions: List[int]
+) -> Dict[int, Tuple[int, float]]:
+    """Solve the assignment problem for one component"""
+    column_of = {
+        position: col for col, position in enumerate(ledger_positions)
+    }
+    # A match is always worth more than any total of scores, so the
+    # solver maximizes the number of matches before their quality
+    match_value = len(bank_rows) + len(ledger_positions) + 1
+
+    weights = [[0.0] * len(ledger_positions) for _ in bank_rows]
+    for row, bank_row in enumerate(bank_rows):
+        for score, position in candidates[bank_row]:
+            weights[row][column_of[position]] = match_value + score
+
+    transpose = len(bank_rows) > len(ledger_positions)
+    if transpose:
+        weights = [list(column) for column in zip(*weights)]
+    pairs = _hungarian([[-weight for weight in row] for row in weights])
+
+    assignment = {}
+    for row, col in pairs:
+        if transpose:
+            row, col = col, row
+        weight = weights[col][row] if transpose else weights[row][col]
+        if weight:
+            assignment[bank_rows[row]] = (
+                ledger_positions[col], round(weight - match_value, 4)
+            )
+    return assignment
+
+
+def _hungarian(cost: List[List[float]]) -> List[Tuple[int, int]]:
+    """Minimum cost assignment of every row to a distinct column
+
+    Requires no more rows than columns. Returns (row, column) pairs.
+    """
+    rows, cols = len(cost), len(cost[0])
+    infinity = float('inf')
+    u = [0.0] * (rows + 1)
+    v = [0.0] * (cols + 1)
+    match = [0] * (cols + 1)  # match[col] = row, both 1-based
+    way = [0] * (cols + 1)
+
+    for row in range(1, rows + 1):
+        match[0] = row
+        col0 = 0
+        min_value = [infinity] * (cols + 1)
+        used = [False] * (cols + 1)
+        while True:
+            used[col0] = True
+            row0 = match[col0]
+            delta = infinity
+            col1 = 0
+            cost_row = cost[row0 - 1]
+            for col in range(1, cols + 1):
+                if used[col]:
+                    continue
+                current = cost_row[col - 1] - u[row0] - v[col]
+                if current < min_value[col]:
+                    min_value[col] = current
+                    way[col] = col0
+                if min_value[col] < delta:
+                    delta = min_value[col]
+                    col1 = col
+            for col in range(cols + 1):
+                if used[col]:
+                    u[match[col]] += delta
+                    v[col] -= delta
+                else:
+                    min_value[col] -= delta
+            col0 = col1
+            if match[col0] == 0:
+                break
+        while True:
+            col1 = way[col0]
+            match[col0] = match[col1]
+            col0 = col1
+            if col0 == 0:
+                break
+
+    return [
+        (match[col] - 1, col - 1)
+        for col in range(1, cols + 1) if match[col]
+    ]
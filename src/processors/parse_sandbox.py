@@ -0,0 +1,254 @@
+#!/usr/bin/env python3
+
+"""
+Pool of parse worker processes with per-document time and memory limits
+"""
+
+import multiprocessing
+import queue
+import threading
+from concurrent.futures import Executor, Future
+from typing import Any, Callable, Optional
+from src.core.config import (
+    PARSE_MEMORY_LIMIT_MB, PARSE_RETRIES, PARSE_TIMEOUT_SECONDS
+)
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+_STOP = object()
+
+# Seconds a worker may take to start and load a task, not counted against
+# the document's timeout
+START_TIMEOUT = 30
+
+
+class SandboxError(Exception):
+    """A document exceeded a worker's limits; the worker was replaced"""
+
+
+class ParseTimeout(SandboxError):
+    pass
+
+
+class ParseMemoryError(SandboxError):
+    pass
+
+
+class WorkerCrashed(SandboxError):
+    pass
+
+
+class WorkerUnavailable(Exception):
+    """No worker took the task, so the document is not to blame"""
+
+
+class SandboxPool(Executor):
+    def __init__(
+        self,
+        max_workers: int,
+        timeout: Optional[float] = None,
+        memory_limit_mb: Optional[int] = None,
+        mp_context: Optional[Any] = None,
+        retries: Optional[int] = None
+    ) -> None:
+        """Run tasks in max_workers processes, one task at a time each
+
+        A task running longer than timeout seconds (default
+        PARSE_TIMEOUT_SECONDS) has its worker killed and fails with
+        ParseTimeout. Workers cannot allocate more than memory_limit_mb
+        (default PARSE_MEMORY_LIMIT_MB, 0 for no limit) where the
+        platform supports it; a task that does fails with
+        ParseMemoryError, and one whose worker dies while running it with
+        WorkerCrashed. A worker that fails to start or to take a task
+        fails it with WorkerUnavailable instead. Either way the worker is
+        replaced, the task is tried again on a fresh one up to retries
+        times (default PARSE_RETRIES) and the next task goes on.
+        """
+        self.max_workers = max_workers
+        self.timeout = timeout or PARSE_TIMEOUT_SECONDS
+        self.memory_limit_mb = (
+            PARSE_MEMORY_LIMIT_MB if memory_limit_mb is None
+            else memory_limit_mb
+        )
+        self.retries = PARSE_RETRIES if retries is None else retries
+        self.mp_context = mp_context or multiprocessing.get_context()
+        self._tasks = queue.Queue()
+        self._shutdown = False
+        self._shutdown_lock = threading.Lock()
+        self._slots = [
+            threading.Thread(
+                target=self._run_slot, name=f'parse-sandbox-{n}', daemon=True
+            )
+            for n in range(max_workers)
+        ]
+        for slot in self._slots:
+            slot.start()
+
+    def submit(self, fn: Callable, /, *args, **kwargs) -> Future:
+        with self._shutdown_lock:
+            if self._shutdown:
+                raise RuntimeError('cannot submit after shutdown')
+            future = Future()
+            self._tasks.put((future, fn, args, kwargs))
+            return future
+
+    def shutdown(self, wait: bool = True, *, cancel_futures: bool = False):
+        with self._shutdown_lock:
+            self._shutdown = True
+            if cancel_futures:
+                while True:
+                    try:
+                        task = self._tasks.get_nowait()
+                    except queue.Empty:
+                        break
+                    if task is not _STOP:
+                        task[0].cancel()
+            for _ in self._slots:
+                self._tasks.put(_STOP)
+        if wait:
+            for slot in self._slots:
+                slot.join()
+
+    def _run_slot(self) -> None:
+        """Feed tasks to one worker process, replacing it when it fails"""
+        worker = None
+        try:
+            while True:
+                task = self._tasks.get()
+                if task is _STOP:
+                    return
+                future, fn, args, kwargs = task
+                if not future.set_running_or_notify_cancel():
+                    continue
+                for _ in range(self.retries + 1):
+                    try:
+                        if worker is None:
+                            worker = self._start_worker()
+                        ok, result = self._run_task(
+                            worker, fn, args, kwargs
+                        )
+                    except Exception as exc:
+                        # The future must fail, or its caller waits forever
+                        ok, result = False, WorkerUnavailable(
+                            f'parse worker failed: {exc!r}'
+                        )
+                    if ok or not isinstance(
+                        result, (SandboxError, WorkerUnavailable)
+                    ):
+                        break
+                    if worker is not None:
+                        _stop_worker(worker, kill=True)
+                        worker = None
+                if ok:
+                    future.set_result(result)
+                else:
+                    future.set_exception(result)
+        finally:
+            if worker is not None:
+                _stop_worker(worker)
+
+    def _start_worker(self):
+        parent, child = self.mp_context.Pipe()
+        process = self.mp_context.Process(
+            target=_worker_main, args=(child, self.memory_limit_mb),
+            daemon=True
+        )
+        process.start()
+        child.close()
+        return process, parent
+
+    def _run_task(self, worker, fn, args, kwargs):
+        """(True, result) or (False, the exception the task failed with)"""
+        process, conn = worker
+        try:
+            conn.send((fn, args, kwargs))
+        except (OSError, ValueError):
+            return False, WorkerUnavailable(
+                f'parse worker exited with code {process.exitcode}'
+            )
+        except Exception as exc:
+            # The task itself could not be pickled
+            return False, exc
+
+        # Workers confirm they took the task before running it, so only
+        # what happens from then on is blamed on the document
+        if not conn.poll(START_TIMEOUT):
+            return False, WorkerUnavailable('parse worker did not start')
+        try:
+            status, value = conn.recv()
+        except (EOFError, OSError):
+            process.join(1)
+            return False, WorkerUnavailable(
+                f'parse worker exited with code {process.exitcode}'
+            )
+
+        if status == 'started':
+            if not conn.poll(self.timeout):
+                return False, ParseTimeout(
+                    f'parsing took longer than {self.timeout:g}s'
+                )
+            try:
+                status, value = conn.recv()
+            except (EOFError, OSError):
+                process.join(1)
+                return False, WorkerCrashed(
+                    f'parse worker exited with code {process.exitcode}'
+                )
+            except Exception as exc:
+                # e.g. an exception whose __init__ takes other arguments
+                return False, RuntimeError(
+                    f'parse result does not unpickle: {exc!r}'
+                )
+        if status == 'memory':
+            return False, ParseMemoryError(
+                f'parsing needed more than {self.memory_limit_mb} MB'
+            )
+        return status == 'ok', value
+
+
+def _worker_main(conn, memory_limit_mb: int) -> None:
+    """Run tasks sent over conn until it closes"""
+    if memory_limit_mb and resource is not None:
+        limit = memory_limit_mb * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+    while True:
+        try:
+            fn, args, kwargs = conn.recv()
+        except EOFError:
+            return
+        except MemoryError:
+            conn.send(('memory', None))
+            return
+        except Exception as exc:
+            # e.g. the task's module does not import in the worker
+            conn.send(('error', RuntimeError(
+                f'parse task does not unpickle: {exc!r}'
+            )))
+            continue
+        conn.send(('started', None))
+        try:
+            conn.send(('ok', fn(*args, **kwargs)))
+        except MemoryError:
+            # Exits, so the next document gets a fresh heap
+            conn.send(('memory', None))
+            return
+        except Exception as exc:
+            try:
+                conn.send(('error', exc))
+            except Exception:
+                # Exceptions that do not pickle are sent as their text
+                conn.send(('error', RuntimeError(repr(exc))))
+
+
+def _stop_worker(worker, kill: bool = False) -> None:
+    """Stop a worker, killing it unless it exits once its pipe closes"""
+    process, conn = worker
+    conn.close()
+    if not kill:
+        process.join(1)
+    if process.is_alive():
+        process.kill()
+        process.join()
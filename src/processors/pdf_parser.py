@@ -4,57 +4,300 @@
 PDF parser for extracting receipt data from PDF files
 """
 
+import io
+import multiprocessing
 import re
+import threading
+from concurrent.futures import Executor, Future, as_completed
 from pathlib import Path
-from typing import Dict, Optional
+from typing import (
+    BinaryIO, Callable, Dict, Iterable, Iterator, List, NamedTuple, Optional,
+    Tuple, Union
+)
 import pdfplumber
+from src.core.config import (
+    PARSE_WORKERS, RECEIPT_CACHE_MAX_MB, RECEIPT_PAGE_BUDGET
+)
+from src.processors.attachment_store import content_hash
+from src.processors.parse_sandbox import SandboxError, SandboxPool
+from src.processors.quarantine import Quarantine, Quarantined, get_quarantine
+from src.processors.receipt_cache import ReceiptCache, get_receipt_cache
+from src.processors.receipt_templates import (
+    TemplateRegistry, get_template_registry
+)
+
+# A file path, the PDF's bytes or a binary buffer positioned at its start
+PDFSource = Union[Path, str, bytes, bytearray, memoryview, BinaryIO]
+
+Receipt = Dict[str, Optional[str]]
+
+# Bump when extract_text changes, so cached text is extracted again
+EXTRACTOR_VERSION = 2
+# Bump when parse_text's rules change, so cached text is parsed again
+PARSER_VERSION = 2
+
+
+class ParseResult(NamedTuple):
+    """Outcome of one file of parse_many: a receipt or the error raised"""
+    index: int
+    filename: Optional[str]
+    receipt: Optional[Receipt]
+    error: Optional[Exception]
 
 
 class ReceiptParser:
-    def __init__(self) -> None:
+    def __init__(
+        self,
+        cache: Optional[ReceiptCache] = None,
+        templates: Optional[TemplateRegistry] = None,
+        quarantine: Optional[Quarantine] = None
+    ) -> None:
+        """Parse receipts, through cache (default: the receipt cache file
+        unless RECEIPT_CACHE_MAX_MB is 0), with the merchant templates
+        of templates (default: the built-in ones), keeping PDFs that
+        exceed the parse limits in quarantine (default QUARANTINE_DIR)"""
+        self.cache = cache or (
+            get_receipt_cache() if RECEIPT_CACHE_MAX_MB else None
+        )
+        self.templates = templates or get_template_registry()
+        self.quarantine = quarantine or get_quarantine()
         self.amount_pattern = r'\$?\d+\.\d{2}'
         self.date_pattern = r'\d{1,2}[/-]\d{1,2}[/-]\d{2,4}'
 
-    def extract_text(self, pdf_path: Path) -> str:
-        """Extract text from PDF using pdfplumber"""
-        text = ''
+    def extract_text(
+        self,
+        source: PDFSource,
+        filename: Optional[str] = None,
+        lazy: bool = False,
+        max_pages: Optional[int] = None
+    ) -> str:
+        """Extract text from PDF using pdfplumber
+
+        With lazy, pages are extracted on demand, first the first and last
+        pages, only until the date, amount and merchant are found, and at
+        most max_pages (default RECEIPT_PAGE_BUDGET) of them; the text of
+        the pages extracted is returned in page order.
+        """
         try:
-            with pdfplumber.open(pdf_path) as pdf:
-                for page in pdf.pages:
-                    text += page.extract_text() or ''
+            with pdfplumber.open(_open_source(source)) as pdf:
+                if lazy:
+                    texts = self._extract_lazy(
+                        pdf.pages, max_pages or RECEIPT_PAGE_BUDGET
+                    )
+                else:
+                    texts = {
+                        index: _page_text(page)
+                        for index, page in enumerate(pdf.pages)
+                    }
+            return ''.join(texts[index] for index in sorted(texts))
+        except MemoryError:
+            # A PDF over the worker's memory limit is not an OCR candidate
+            raise
         except Exception:
             # Fallback to OCR if text extraction fails
-            text = self._ocr_extract(pdf_path)
-        return text
+            return self._ocr_extract(filename or _source_name(source))
 
-    def _ocr_extract(self, pdf_path: Path) -> str:
+    def _extract_lazy(self, pages: List, max_pages: int) -> Dict[int, str]:
+        """Extract pages from both ends until every field is resolved
+
+        The date and merchant come from the leading pages and the amount
+        from the trailing ones, so each side only grows while its fields
+        are missing.
+        """
+        texts = {}
+        count = len(pages)
+        head, tail = 0, count
+        while head < tail and len(texts) < max_pages:
+            leading = ''.join(texts[index] for index in range(head))
+            trailing = ''.join(texts[index] for index in range(tail, count))
+            if head == 0:
+                # The merchant is on the first page
+                index = head
+            elif tail == count:
+                # and the total on the last one
+                index = tail - 1
+            elif not self._head_resolved(leading):
+                index = head
+            elif not re.search(self.amount_pattern, trailing):
+                index = tail - 1
+            else:
+                break
+            if index == head:
+                head += 1
+            else:
+                tail -= 1
+            texts[index] = _page_text(pages[index])
+        return texts
+
+    def _head_resolved(self, leading: str) -> bool:
+        """Whether more pages cannot change the date or merchant"""
+        if not re.search(self.date_pattern, leading):
+            return False
+        # The merchant is looked for in the first 10 lines
+        return bool(self._extract_merchant(leading)) or \
+            leading.count('\n') > 10
+
+    def _ocr_extract(self, filename: Optional[str]) -> str:
         """Extract text using OCR - simplified version without opencv/pytesseract"""
         # Return empty string if OCR dependencies not available
         # In production, you would install opencv-python and pytesseract
-        print(f"OCR not available for {pdf_path.name}")
+        print(f"OCR not available for {filename}")
         return ''
 
-    def parse_receipt(self, pdf_path: Path) -> Dict[str, Optional[str]]:
-        """Parse receipt and extract key information"""
-        text = self.extract_text(pdf_path)
-        
+    def parse_receipt(
+        self,
+        source: PDFSource,
+        filename: Optional[str] = None,
+        sender: Optional[str] = None
+    ) -> Receipt:
+        """Parse receipt and extract key information
+
+        source is a path or, to skip the disk, the PDF in memory; filename
+        names in-memory PDFs and sender is the address they were mailed
+        from, if known. PDFs in the cache are not opened again, and their
+        cached text is parsed again after a PARSER_VERSION bump or when
+        the sender may pick another template.
+        """
+        filename = filename or _source_name(source)
+        try:
+            payload = _read_bytes(source) if self.cache else None
+        except OSError:
+            payload = None
+        if payload is None:
+            text = self.extract_text(source, filename, lazy=True)
+            return self.parse_text(text, filename, sender)
+
+        key = content_hash(payload)
+        cached = self.cache.get(key, EXTRACTOR_VERSION)
+        fresh = cached and cached.parser_version == PARSER_VERSION
+        if fresh and not sender:
+            return dict(cached.fields, filename=filename)
+
+        text = cached.text if cached else self.extract_text(
+            payload, filename, lazy=True
+        )
+        receipt_data = self.parse_text(text, filename, sender)
+        if not fresh:
+            # Cached fields are served to calls without a sender, so they
+            # must not come from the template the sender picked
+            fields = self.parse_text(text, filename) if sender \
+                else receipt_data
+            self.cache.put(
+                key, EXTRACTOR_VERSION, text, PARSER_VERSION, fields
+            )
+        return receipt_data
+
+    def parse_text(
+        self,
+        text: str,
+        filename: Optional[str] = None,
+        sender: Optional[str] = None
+    ) -> Receipt:
+        """Extract the amount, date and merchant from a receipt's text
+
+        The template of a known merchant is used if the sender or header
+        matches one; fields it does not find fall back to the generic
+        rules: the last amount, the first date and the first line
+        without digits.
+        """
+        template = self.templates.match(text, sender)
+        receipt_data = template.parse(text) if template else {}
+
         # Extract amount
-        amounts = re.findall(self.amount_pattern, text)
-        amount = amounts[-1] if amounts else None
-        
+        if not receipt_data.get('amount'):
+            amounts = re.findall(self.amount_pattern, text)
+            receipt_data['amount'] = amounts[-1] if amounts else None
+
         # Extract date
-        dates = re.findall(self.date_pattern, text)
-        date = dates[0] if dates else None
-        
+        if not receipt_data.get('date'):
+            dates = re.findall(self.date_pattern, text)
+            receipt_data['date'] = dates[0] if dates else None
+
         # Extract merchant
-        merchant = self._extract_merchant(text)
-        
-        return {
-            'amount': amount,
-            'date': date,
-            'merchant': merchant,
-            'filename': pdf_path.name
-        }
+        if not receipt_data.get('merchant'):
+            receipt_data['merchant'] = self._extract_merchant(text)
+
+        receipt_data['filename'] = filename
+        return receipt_data
+
+    def parse_many(
+        self,
+        sources: Iterable[Union[
+            PDFSource, Tuple[str, PDFSource],
+            Tuple[str, PDFSource, Optional[str]]
+        ]],
+        workers: Optional[int] = None,
+        ordered: bool = True,
+        executor: Optional[Executor] = None
+    ) -> Iterator[ParseResult]:
+        """Parse many receipts in parallel on a pool of warm processes
+
+        sources are PDFs, (filename, PDF) pairs or (filename, PDF,
+        sender) triples. Every file is submitted
+        before this returns; results come in input order, or as they
+        finish when ordered is false. A file that fails yields its error
+        without affecting the others. The sandboxed pool of workers
+        (default PARSE_WORKERS) is shared and kept between calls, unless
+        another executor is given. A PDF that exceeds a worker's time or
+        memory limit is quarantined, and quarantined PDFs fail with
+        Quarantined without being parsed again.
+        """
+        items = []
+        for item in sources:
+            if isinstance(item, tuple):
+                filename, source, sender = (item + (None,))[:3]
+            else:
+                filename, source, sender = _source_name(item), item, None
+            items.append((filename, _picklable(source), sender))
+
+        futures = self._submit(executor or get_parse_pool(workers), items)
+        return _collect(futures, ordered, self._on_failure(items))
+
+    def _submit(
+        self,
+        executor: Executor,
+        items: List[Tuple[Optional[str], PDFSource, Optional[str]]]
+    ) -> List[Tuple[int, Optional[str], Future]]:
+        futures = []
+        for index, (filename, source, sender) in enumerate(items):
+            reason = self._quarantine_reason(source)
+            if reason:
+                future = Future()
+                future.set_exception(Quarantined(reason))
+            else:
+                future = executor.submit(
+                    _parse_one, self, source, filename, sender
+                )
+            futures.append((index, filename, future))
+        return futures
+
+    def _quarantine_reason(self, source: PDFSource) -> Optional[str]:
+        """Why a PDF was quarantined, reading files to hash them"""
+        try:
+            return self.quarantine.reason(content_hash(_read_bytes(source)))
+        except OSError:
+            # The worker reports a missing file as the parse error
+            return None
+
+    def _on_failure(
+        self,
+        items: List[Tuple[Optional[str], PDFSource, Optional[str]]]
+    ) -> Callable[[int, Exception], None]:
+        """Quarantine the PDFs that exceed the sandbox's limits
+
+        A worker that failed to start or to take the PDF fails it with
+        WorkerUnavailable instead, which is not the PDF's fault, so it is
+        parsed again next time.
+        """
+        def on_failure(index: int, exc: Exception) -> None:
+            if not isinstance(exc, SandboxError):
+                return
+            filename, source, _ = items[index]
+            try:
+                self.quarantine.add(_read_bytes(source), filename, str(exc))
+            except OSError as e:
+                print(f'Failed to quarantine {filename}: {e}')
+        return on_failure
 
     def _extract_merchant(self, text: str) -> Optional[str]:
         """Extract merchant name from text"""
@@ -64,4 +307,110 @@ class ReceiptParser:
             line = line.strip()
             if line and len(line) > 3 and not re.search(r'\d', line):
                 return line
-        return None 
\ No newline at end of file
+        return None
+
+
+def _page_text(page) -> str:
+    """A page's text, releasing the objects pdfplumber parsed for it"""
+    try:
+        return page.extract_text() or ''
+    finally:
+        page.flush_cache()
+
+
+def _open_source(source: PDFSource) -> Union[Path, BinaryIO]:
+    """A path or buffer pdfplumber can open, without copying bytes"""
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return io.BytesIO(source)
+    if isinstance(source, str):
+        return Path(source)
+    return source
+
+
+def _source_name(source: PDFSource) -> Optional[str]:
+    if isinstance(source, (str, Path)):
+        return Path(source).name
+    name = getattr(source, 'name', None)
+    return Path(name).name if isinstance(name, str) else None
+
+
+def _read_bytes(source: PDFSource) -> bytes:
+    """The PDF's bytes, to hash them"""
+    if isinstance(source, (str, Path)):
+        return Path(source).read_bytes()
+    if hasattr(source, 'read'):
+        return source.read()
+    return source if isinstance(source, bytes) else bytes(source)
+
+
+def _picklable(source: PDFSource) -> Union[Path, str, bytes]:
+    """Read buffers so a source can be sent to another process"""
+    if isinstance(source, (bytearray, memoryview)):
+        return bytes(source)
+    if hasattr(source, 'read'):
+        return source.read()
+    return source
+
+
+def _parse_one(
+    parser: ReceiptParser,
+    source: PDFSource,
+    filename: Optional[str],
+    sender: Optional[str]
+) -> Receipt:
+    return parser.parse_receipt(source, filename, sender)
+
+
+def _collect(
+    futures: List[Tuple[int, Optional[str], Future]],
+    ordered: bool,
+    on_failure: Callable[[int, Exception], None]
+) -> Iterator[ParseResult]:
+    """Yield the results of submitted files, cancelling any left over"""
+    try:
+        if ordered:
+            pending = iter(futures)
+        else:
+            by_future = {
+                future: (index, filename)
+                for index, filename, future in futures
+            }
+            pending = (
+                by_future[future] + (future,)
+                for future in as_completed(by_future)
+            )
+        for index, filename, future in pending:
+            try:
+                yield ParseResult(index, filename, future.result(), None)
+            except Exception as exc:
+                on_failure(index, exc)
+                yield ParseResult(index, filename, None, exc)
+    finally:
+        for _, _, future in futures:
+            future.cancel()
+
+
+_pools: Dict[int, SandboxPool] = {}
+_pools_lock = threading.Lock()
+
+
+def get_parse_pool(workers: Optional[int] = None) -> SandboxPool:
+    """Get the process-wide pool of parse workers, kept warm between calls
+
+    There is one pool per number of workers, so asking for another size
+    never cancels what other callers queued. Workers start from a fork
+    server rather than the caller, which may be running threads, where
+    available. A worker that exceeds its limits is replaced by the pool
+    itself.
+    """
+    workers = workers or PARSE_WORKERS
+    with _pools_lock:
+        if workers not in _pools:
+            methods = multiprocessing.get_all_start_methods()
+            _pools[workers] = SandboxPool(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context(
+                    'forkserver' if 'forkserver' in methods else 'spawn'
+                )
+            )
+        return _pools[workers]
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+
+"""
+Quarantine of PDFs that exceeded the parse workers' limits
+"""
+
+import os
+import time
+from pathlib import Path
+from typing import List, Optional, Tuple
+from src.core.config import QUARANTINE_DIR
+from src.processors.attachment_store import content_hash
+from src.processors.sqlite_store import ProcessRegistry, SQLiteDatabase
+
+INDEX_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS quarantined (
+    sha256 TEXT PRIMARY KEY,
+    filename TEXT,
+    reason TEXT NOT NULL,
+    quarantined_at REAL NOT NULL
+);
+'''
+
+# sha256, filename, reason, quarantined_at
+Entry = Tuple[str, Optional[str], str, float]
+
+
+class Quarantined(Exception):
+    """A PDF was quarantined before and is not parsed again"""
+
+
+class Quarantine:
+    def __init__(self, root: Optional[Path] = None) -> None:
+        """Keep quarantined PDFs in root (default QUARANTINE_DIR)
+
+        Each PDF is saved as root/<sha256>.pdf and recorded with its
+        filename and the reason in root/index.sqlite3, so it is not
+        parsed again until released.
+        """
+        self.root = Path(root or QUARANTINE_DIR)
+        self._db = SQLiteDatabase(self.root / 'index.sqlite3', INDEX_SCHEMA)
+
+    def __reduce__(self) -> Tuple:
+        return get_quarantine, (self.root,)
+
+    def add(
+        self,
+        payload: bytes,
+        filename: Optional[str],
+        reason: str
+    ) -> str:
+        """Quarantine a PDF and return its hash"""
+        sha256 = content_hash(payload)
+        path = self.path(sha256)
+        if not path.exists():
+            self.root.mkdir(parents=True, exist_ok=True)
+            tmp_path = path.with_name(path.name + '.tmp')
+            tmp_path.write_bytes(payload)
+            os.replace(tmp_path, path)
+        with self._db.connect() as db:
+            db.execute(
+                'INSERT OR REPLACE INTO quarantined VALUES (?, ?, ?, ?)',
+                (sha256, filename, reason, time.time())
+            )
+            db.commit()
+        print(f'Quarantined {filename or sha256}: {reason}')
+        return sha256
+
+    def reason(self, sha256: str) -> Optional[str]:
+        """Why a PDF was quarantined, or None if it was not"""
+        if not self._db.exists():
+            return None
+        with self._db.connect() as db:
+            row = db.execute(
+                'SELECT reason FROM quarantined WHERE sha256 = ?', (sha256,)
+            ).fetchone()
+        return row[0] if row else None
+
+    def path(self, sha256: str) -> Path:
+        return self.root / f'{sha256}.pdf'
+
+    def entries(self) -> List[Entry]:
+        """Quarantined PDFs, the most recent first"""
+        if not self._db.exists():
+            return []
+        with self._db.connect() as db:
+            return db.execute(
+                'SELECT sha256, filename, reason, quarantined_at '
+                'FROM quarantined ORDER BY quarantined_at DESC'
+            ).fetchall()
+
+    def release(self, sha256: str) -> bool:
+        """Let a PDF be parsed again, e.g. after raising the limits"""
+        if not self._db.exists():
+            return False
+        with self._db.connect() as db:
+            released = db.execute(
+                'DELETE FROM quarantined WHERE sha256 = ?', (sha256,)
+            ).rowcount
+            db.commit()
+        self.path(sha256).unlink(missing_ok=True)
+        return bool(released)
+
+
+_quarantines: ProcessRegistry[Quarantine] = ProcessRegistry()
+
+
+def get_quarantine(root: Optional[Path] = None) -> Quarantine:
+    """Get the process-wide quarantine of root (default QUARANTINE_DIR)"""
+    root = Path(root or QUARANTINE_DIR)
+    return _quarantines.get(root, lambda: Quarantine(root))
@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+
+"""
+Persistent cache of receipt text and fields by PDF content hash
+"""
+
+import time
+from pathlib import Path
+from typing import Dict, NamedTuple, Optional, Tuple
+from src.core.config import RECEIPT_CACHE_FILE, RECEIPT_CACHE_MAX_MB
+from src.processors.sqlite_store import ProcessRegistry, SQLiteDatabase
+
+CACHE_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS receipts (
+    sha256 TEXT NOT NULL,
+    extractor_version INTEGER NOT NULL,
+    text TEXT NOT NULL,
+    parser_version INTEGER NOT NULL,
+    amount TEXT,
+    receipt_date TEXT,
+    merchant TEXT,
+    size INTEGER NOT NULL,
+    last_used REAL NOT NULL,
+    PRIMARY KEY (sha256, extractor_version)
+);
+CREATE INDEX IF NOT EXISTS receipts_last_used ON receipts (last_used);
+'''
+
+# Keeps the most recently used rows whose sizes add up to at most ?
+EVICT_SQL = '''
+DELETE FROM receipts WHERE rowid IN (
+    SELECT rowid FROM (
+        SELECT rowid, SUM(size) OVER (
+            ORDER BY last_used DESC, rowid DESC
+        ) AS total
+        FROM receipts
+    )
+    WHERE total > ?
+)
+'''
+
+Fields = Dict[str, Optional[str]]
+
+
+class CachedReceipt(NamedTuple):
+    """Text extracted from a PDF and the fields parsed from it"""
+    text: str
+    parser_version: int
+    fields: Fields
+
+
+class ReceiptCache:
+    def __init__(
+        self,
+        path: Optional[Path] = None,
+        max_bytes: Optional[int] = None
+    ) -> None:
+        """Cache receipts in path (default RECEIPT_CACHE_FILE)
+
+        Entries are keyed by the PDF's SHA-256 and the version of the text
+        extraction, and carry the version of the rules that parsed their
+        fields, so a rule change re-parses the cached text. The least
+        recently used entries are evicted beyond max_bytes of text
+        (default RECEIPT_CACHE_MAX_MB).
+        """
+        self.path = Path(path or RECEIPT_CACHE_FILE)
+        self.max_bytes = max_bytes or int(RECEIPT_CACHE_MAX_MB * 1024 * 1024)
+        # Parse workers in other processes read while one writes
+        self._db = SQLiteDatabase(self.path, CACHE_SCHEMA, wal=True)
+
+    def __reduce__(self) -> Tuple:
+        # A parse worker gets its own process's cache of the file
+        return get_receipt_cache, (self.path, self.max_bytes)
+
+    def get(
+        self,
+        sha256: str,
+        extractor_version: int
+    ) -> Optional[CachedReceipt]:
+        """The cached receipt of a PDF, marking it recently used"""
+        if not self._db.exists():
+            return None
+        with self._db.connect() as db:
+            row = db.execute(
+                'SELECT text, parser_version, amount, receipt_date, merchant '
+                'FROM receipts WHERE sha256 = ? AND extractor_version = ?',
+                (sha256, extractor_version)
+            ).fetchone()
+            if row is None:
+                return None
+            db.execute(
+                'UPDATE receipts SET last_used = ? '
+                'WHERE sha256 = ? AND extractor_version = ?',
+                (time.time(), sha256, extractor_version)
+            )
+            db.commit()
+        text, parser_version, amount, receipt_date, merchant = row
+        return CachedReceipt(text, parser_version, {
+            'amount': amount, 'date': receipt_date, 'merchant': merchant
+        })
+
+    def put(
+        self,
+        sha256: str,
+        extractor_version: int,
+        text: str,
+        parser_version: int,
+        fields: Fields
+    ) -> None:
+        """Cache the text and fields of a PDF, evicting if over budget"""
+        size = len(text.encode('utf-8'))
+        with self._db.connect() as db:
+            db.execute(
+                'INSERT OR REPLACE INTO receipts '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                (
+                    sha256, extractor_version, text, parser_version,
+                    fields.get('amount'), fields.get('date'),
+                    fields.get('merchant'), size, time.time()
+                )
+            )
+            db.execute(EVICT_SQL, (self.max_bytes,))
+            db.commit()
+
+    def stats(self) -> Dict[str, int]:
+        """Number of cached receipts and bytes of text"""
+        if not self._db.exists():
+            return {'receipts': 0, 'bytes': 0}
+        with self._db.connect() as db:
+            count, total = db.execute(
+                'SELECT COUNT(*), COALESCE(SUM(size), 0) FROM receipts'
+            ).fetchone()
+        return {'receipts': count, 'bytes': total}
+
+
+_caches: ProcessRegistry[ReceiptCache] = ProcessRegistry()
+
+
+def get_receipt_cache(
+    path: Optional[Path] = None,
+    max_bytes: Optional[int] = None
+) -> ReceiptCache:
+    """Get the process-wide cache of a file (default RECEIPT_CACHE_FILE)"""
+    path = Path(path or RECEIPT_CACHE_FILE)
+    cache = _caches.get(path, lambda: ReceiptCache(path, max_bytes))
+    if max_bytes:
+        cache.max_bytes = max_bytes
+    return cache
@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+
+"""
+Receipt templates of known merchants, dispatched by sender domain or header
+"""
+
+import re
+from datetime import datetime
+from email.utils import parseaddr
+from typing import Dict, Iterable, List, Optional
+
+# Lines at the top of a receipt searched for a template's keywords
+HEADER_LINES = 5
+# Keywords are the first words of a header line, up to this many
+MAX_KEYWORD_WORDS = 4
+
+# A total on its own line, not a subtotal: "Order Total: $1,234.56"
+TOTAL = r'^\s*(?:grand |order )?total:?\s*(\$?[\d,]+\.\d{2})'
+DATE = r'(\d{1,2}/\d{1,2}/\d{2,4}|[A-Z][a-z]{2,8}\.? \d{1,2}, \d{4})'
+# Formats of dates matched by templates, normalized to the ledger's
+DATE_FORMATS = (
+    '%m/%d/%Y', '%m/%d/%y', '%B %d, %Y', '%b %d, %Y', '%b. %d, %Y'
+)
+
+Fields = Dict[str, Optional[str]]
+
+
+class ReceiptTemplate:
+    def __init__(
+        self,
+        merchant: str,
+        domains: Iterable[str] = (),
+        keywords: Iterable[str] = (),
+        amount: str = TOTAL,
+        date: str = DATE
+    ) -> None:
+        """A merchant's receipt layout
+
+        Receipts mailed from one of domains (or their subdomains), or with
+        a header line starting with one of keywords, are booked to
+        merchant. amount and date are patterns whose first group is the
+        value; the last amount and the first date found are used.
+        """
+        self.merchant = merchant
+        self.domains = [domain.lower() for domain in domains]
+        self.keywords = [_normalize(keyword) for keyword in keywords]
+        self.amount = re.compile(amount, re.IGNORECASE | re.MULTILINE)
+        self.date = re.compile(date, re.MULTILINE)
+
+    def parse(self, text: str) -> Fields:
+        """The merchant, and the amount and date if found"""
+        amounts = self.amount.findall(text)
+        dates = self.date.findall(text)
+        return {
+            'amount': amounts[-1].replace(',', '') if amounts else None,
+            'date': _normalize_date(dates[0]) if dates else None,
+            'merchant': self.merchant
+        }
+
+
+class TemplateRegistry:
+    def __init__(self, templates: Iterable[ReceiptTemplate] = ()) -> None:
+        """Index templates by sender domain and header keyword
+
+        Finding the template of a receipt takes a few dictionary lookups
+        whatever the number of templates.
+        """
+        self._by_domain: Dict[str, ReceiptTemplate] = {}
+        self._by_keyword: Dict[str, ReceiptTemplate] = {}
+        for template in templates:
+            self.register(template)
+
+    def register(self, template: ReceiptTemplate) -> None:
+        """Add a template; later ones win on a shared domain or keyword"""
+        for domain in template.domains:
+            self._by_domain[domain] = template
+        for keyword in template.keywords:
+            self._by_keyword[keyword] = template
+
+    def match(
+        self,
+        text: str,
+        sender: Optional[str] = None
+    ) -> Optional[ReceiptTemplate]:
+        """The template of a receipt, by its sender first, then its header"""
+        domain = _domain(sender)
+        while '.' in domain:
+            if domain in self._by_domain:
+                return self._by_domain[domain]
+            domain = domain.partition('.')[2]
+
+        for line in text.splitlines()[:HEADER_LINES]:
+            words = _normalize(line).split(' ')[:MAX_KEYWORD_WORDS]
+            # The longest keyword wins: UBER EATS before UBER
+            for end in range(len(words), 0, -1):
+                template = self._by_keyword.get(' '.join(words[:end]))
+                if template:
+                    return template
+        return None
+
+
+def _normalize(line: str) -> str:
+    return ' '.join(line.upper().split())
+
+
+def _domain(sender: Optional[str]) -> str:
+    """The lowercase domain of an address such as 'Shop <a@b.com>'"""
+    address = parseaddr(sender or '')[1]
+    return address.rpartition('@')[2].lower() if '@' in address else ''
+
+
+def _normalize_date(value: str) -> str:
+    """A date as MM/DD/YYYY, or as found if in no known format"""
+    for date_format in DATE_FORMATS:
+        try:
+            return datetime.strptime(value, date_format).strftime('%m/%d/%Y')
+        except ValueError:
+            pass
+    return value
+
+
+TEMPLATES: List[ReceiptTemplate] = [
+    ReceiptTemplate(
+        'Amazon', ['amazon.com'], ['AMAZON.COM', 'AMAZON'],
+        date=r'(?:Order Placed|Date):?\s*' + DATE
+    ),
+    ReceiptTemplate('Uber', ['uber.com'], ['UBER']),
+    ReceiptTemplate('Uber Eats', ['ubereats.com'], ['UBER EATS']),
+    ReceiptTemplate(
+        'Costco', ['costco.com'], ['COSTCO WHOLESALE', 'COSTCO'],
+        # Printed after a row of asterisks, without the dollar sign
+        amount=r'^[\s*]*total:?\s*(\$?[\d,]+\.\d{2})'
+    ),
+    ReceiptTemplate('DoorDash', ['doordash.com'], ['DOORDASH']),
+    ReceiptTemplate('Apple', ['apple.com'], ['APPLE STORE', 'APPLE']),
+    ReceiptTemplate('Netflix', ['netflix.com'], ['NETFLIX']),
+    ReceiptTemplate(
+        'Spotify', ['spotify.com'], ['SPOTIFY PREMIUM', 'SPOTIFY']
+    ),
+    ReceiptTemplate(
+        'Starbucks', ['starbucks.com'], ['STARBUCKS COFFEE', 'STARBUCKS']
+    ),
+    ReceiptTemplate('Target', ['target.com'], ['TARGET STORE', 'TARGET']),
+    ReceiptTemplate(
+        'Whole Foods Market', ['wholefoodsmarket.com'],
+        ['WHOLE FOODS MARKET', 'WHOLE FOODS']
+    )
+]
+
+_registry = None
+
+
+def get_template_registry() -> TemplateRegistry:
+    """The registry of the built-in TEMPLATES"""
+    global _registry
+    if _registry is None:
+        _registry = TemplateRegistry(TEMPLATES)
+    return _registry
@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+
+"""
+SQLite connections shared by threads, and process-wide store registries
+"""
+
+import sqlite3
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Dict, Generic, Hashable, Iterator, TypeVar
+
+T = TypeVar('T')
+
+
+class SQLiteDatabase:
+    def __init__(self, path: Path, schema: str, wal: bool = False) -> None:
+        """A database file, opened on first use and created with schema
+
+        One connection is shared by the threads of a process, one at a
+        time. With wal, readers in other processes do not wait for a
+        writer.
+        """
+        self.path = Path(path)
+        self.schema = schema
+        self.wal = wal
+        self._lock = threading.Lock()
+        self._db = None
+
+    def exists(self) -> bool:
+        """Whether the file was created yet, so reads can skip opening it"""
+        return self.path.exists()
+
+    @contextmanager
+    def connect(self) -> Iterator[sqlite3.Connection]:
+        """The connection, held by the calling thread in the with block"""
+        with self._lock:
+            if self._db is None:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                self._db = sqlite3.connect(
+                    self.path, timeout=30, check_same_thread=False
+                )
+                if self.wal:
+                    self._db.execute('PRAGMA journal_mode=WAL')
+                self._db.executescript(self.schema)
+            yield self._db
+
+
+class ProcessRegistry(Generic[T]):
+    """One instance per key, e.g. per file, shared by a process"""
+
+    def __init__(self) -> None:
+        self._instances: Dict[Hashable, T] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, create: Callable[[], T]) -> T:
+        """The instance of key, created on first use"""
+        with self._lock:
+            if key not in self._instances:
+                self._instances[key] = create()
+            return self._instances[key]
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+
+"""
+Persisted IMAP sync checkpoints: UIDVALIDITY and last processed UID
+"""
+
+import json
+import os
+import threading
+from pathlib import Path
+from typing import Dict, Optional
+from src.core.config import EMAIL_SYNC_STATE_FILE
+
+
+class SyncStateStore:
+    def __init__(self, path: Optional[Path] = None) -> None:
+        self.path = Path(path or EMAIL_SYNC_STATE_FILE)
+        self._lock = threading.Lock()
+
+    def get(self, account: str, folder: str) -> Optional[Dict[str, int]]:
+        """Get the checkpoint of a folder, or None if never synced"""
+        with self._lock:
+            return self._read().get(self._key(account, folder))
+
+    def save(
+        self,
+        account: str,
+        folder: str,
+        uidvalidity: int,
+        last_uid: int
+    ) -> None:
+        """Record the highest processed UID of a folder"""
+        with self._lock:
+            state = self._read()
+            state[self._key(account, folder)] = {
+                'uidvalidity': uidvalidity,
+                'last_uid': last_uid
+            }
+            self._write(state)
+
+    def reset(self, account: str, folder: str) -> None:
+        """Forget a folder so the next sync starts from scratch"""
+        with self._lock:
+            state = self._read()
+            if state.pop(self._key(account, folder), None) is not None:
+                self._write(state)
+
+    @staticmethod
+    def _key(account: str, folder: str) -> str:
+        return f'{account}/{folder}'
+
+    def _read(self) -> Dict[str, Dict[str, int]]:
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            print(f'Ignoring unreadable sync state {self.path}: {e}')
+            return {}
+
+    def _write(self, state: Dict[str, Dict[str, int]]) -> None:
+        """Write the state file atomically so a crash keeps the old one"""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_name(self.path.name + '.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(state, f, indent=2, sort_keys=True)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
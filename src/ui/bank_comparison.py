@@ -4,22 +4,31 @@
 Bank statement comparison tool
 """
 
+import argparse
 import sys
 from pathlib import Path
-from typing import Dict
+from typing import Dict, Optional
 
 # Add project root to path
 project_root = Path(__file__).parent.parent.parent
 sys.path.insert(0, str(project_root))
 
 from src.processors.ledger_manager import LedgerManager  # noqa: E402
-from src.processors.bank_processor import BankProcessor  # noqa: E402
-
-
-def compare_bank_statement(csv_path: str) -> Dict:
+from src.processors.bank_processor import (  # noqa: E402
+    BankProcessor, MATCH_BACKENDS, MATCH_MODES
+)
+from src.processors.matching import MatchTolerance  # noqa: E402
+
+
+def compare_bank_statement(
+    csv_path: str,
+    tolerance: Optional[MatchTolerance] = None,
+    mode: Optional[str] = None,
+    backend: Optional[str] = None
+) -> Dict:
     """Compare bank statement with ledger"""
     ledger_manager = LedgerManager()
-    bank_processor = BankProcessor(ledger_manager)
+    bank_processor = BankProcessor(ledger_manager, tolerance)
 
     print(f'Parsing bank statement: {csv_path}')
     bank_transactions = bank_processor.parse_csv(csv_path)
@@ -28,7 +37,9 @@ def compare_bank_statement(csv_path: str) -> Dict:
     ledger_count = len(ledger_manager.get_transactions())
     print(f'Found {ledger_count} ledger transactions')
 
-    comparison = bank_processor.compare_transactions(bank_transactions)
+    comparison = bank_processor.compare_transactions(
+        bank_transactions, mode=mode, backend=backend
+    )
 
     return comparison
 
@@ -43,7 +54,10 @@ def print_comparison(comparison: Dict) -> None:
     print('-' * 40)
     for match in comparison['matches']:
         bank = match['bank']
-        print(f'{bank["date"]} | {bank["description"]} | ${bank["amount"]}')
+        print(
+            f'{bank["date"]} | {bank["description"]} | ${bank["amount"]} '
+            f'| score {match["score"]:.2f}'
+        )
 
     print(f'\nLedger Only ({len(comparison["ledger_only"])}):')
     print('-' * 40)
@@ -56,16 +70,54 @@ def print_comparison(comparison: Dict) -> None:
         print(f'{tx["date"]} | {tx["description"]} | ${tx["amount"]}')
 
 
+def parse_args(argv: list) -> argparse.Namespace:
+    """Parse command line arguments"""
+    parser = argparse.ArgumentParser(
+        prog='bank_comparison.py',
+        description='Compare a bank statement CSV with the ledger'
+    )
+    parser.add_argument('csv_file', help='Bank statement CSV file')
+    parser.add_argument(
+        '--days', type=int, default=None,
+        help='Allowed date drift in days between bank and ledger'
+    )
+    parser.add_argument(
+        '--amount', type=float, default=None,
+        help='Allowed absolute amount difference, e.g. 2.00'
+    )
+    parser.add_argument(
+        '--percent', type=float, default=None,
+        help='Allowed amount difference as a percentage, e.g. 20'
+    )
+    parser.add_argument(
+        '--mode', choices=MATCH_MODES, default=None,
+        help='greedy: best candidate per bank row; '
+             'assignment: optimal one-to-one matching'
+    )
+    parser.add_argument(
+        '--backend', choices=MATCH_BACKENDS, default=None,
+        help='columnar: vectorized exact matching for large statements '
+             '(requires NumPy)'
+    )
+    return parser.parse_args(argv)
+
+
 def main() -> int:
     """Main entry point"""
-    if len(sys.argv) != 2:
-        print('Usage: python bank_comparison.py <csv_file>')
-        return 1
-
-    csv_path = sys.argv[1]
+    args = parse_args(sys.argv[1:])
 
     try:
-        comparison = compare_bank_statement(csv_path)
+        tolerance = None
+        if any(value is not None
+               for value in (args.days, args.amount, args.percent)):
+            tolerance = MatchTolerance(
+                days=args.days or 0,
+                amount=args.amount or 0.0,
+                percent=args.percent or 0.0
+            )
+        comparison = compare_bank_statement(
+            args.csv_file, tolerance, args.mode, args.backend
+        )
         print_comparison(comparison)
         return 0
     except Exception as e:
@@ -7,8 +7,14 @@ Main script for receipt processing system with Fava integration
 import sys
 import subprocess
 from datetime import datetime
-from src.processors.email_processor import EmailProcessor
+from typing import Iterable, List, Tuple
+from src.processors.attachment_store import get_attachment_store
+from src.processors.email_accounts import email_sources
+from src.processors.fetch_coordinator import FetchCoordinator
+from src.processors.email_watcher import EmailWatcher
+from src.processors.ingestion_pipeline import IngestionPipeline
 from src.processors.pdf_parser import ReceiptParser
+from src.processors.quarantine import get_quarantine
 from src.processors.ledger_manager import LedgerManager
 from src.core.config import FAVA_HOST, FAVA_PORT, BEANCOUNT_FILE
 
@@ -16,7 +22,6 @@ from src.core.config import FAVA_HOST, FAVA_PORT, BEANCOUNT_FILE
 def process_emails(start_date: str = None, end_date: str = None) -> int:
     """Process emails and extract receipts with optional time window"""
     try:
-        email_processor = EmailProcessor()
         receipt_parser = ReceiptParser()
         ledger_manager = LedgerManager()
 
@@ -41,26 +46,15 @@ def process_emails(start_date: str = None, end_date: str = None) -> int:
                 return 0
 
         print('Fetching emails with PDF attachments...')
-        attachments = email_processor.fetch_pdf_attachments(
+        coordinator = FetchCoordinator(email_sources())
+        batches = coordinator.iter_attachments(
             start_date=start_dt,
             end_date=end_dt
         )
+        processed_count = ingest_attachments(
+            batches, receipt_parser, ledger_manager
+        )
 
-        processed_count = 0
-        for filename, file_path in attachments:
-            print(f'Processing {filename}...')
-            receipt_data = receipt_parser.parse_receipt(file_path)
-
-            if receipt_data.get('amount'):
-                ledger_manager.add_transaction(receipt_data)
-                processed_count += 1
-                merchant = receipt_data["merchant"]
-                amount = receipt_data["amount"]
-                print(f'Added transaction: {merchant} - ${amount}')
-            else:
-                print(f'Could not extract data from {filename}')
-
-        email_processor.close()
         print(f'Processed {processed_count} receipts')
         return processed_count
 
@@ -69,6 +63,105 @@ def process_emails(start_date: str = None, end_date: str = None) -> int:
         return 0
 
 
+def sync_emails(folder: str = None) -> int:
+    """Process messages received since the last sync of each folder"""
+    try:
+        receipt_parser = ReceiptParser()
+        ledger_manager = LedgerManager()
+
+        print(f'Syncing new emails in {folder or "configured folders"}...')
+        coordinator = FetchCoordinator(email_sources(folder))
+        batches = coordinator.iter_attachments(
+            sync=True, defer_checkpoints=True
+        )
+        processed_count = ingest_attachments(
+            batches, receipt_parser, ledger_manager
+        )
+
+        print(f'Processed {processed_count} receipts')
+        return processed_count
+
+    except Exception as e:
+        print(f'Error syncing emails: {e}')
+        return 0
+
+
+def watch_emails(folder: str = 'INBOX') -> int:
+    """Ingest new mail as it arrives until interrupted"""
+    receipt_parser = ReceiptParser()
+    ledger_manager = LedgerManager()
+    watcher = EmailWatcher(
+        lambda batches: ingest_attachments(
+            batches, receipt_parser, ledger_manager
+        ),
+        folder=folder
+    )
+
+    print(f'Watching {folder} for new emails (Ctrl+C to stop)...')
+    try:
+        watcher.run()
+    except KeyboardInterrupt:
+        print('\nShutting down...')
+        watcher.stop()
+    except Exception as e:
+        print(f'Error watching emails: {e}')
+        return 1
+    return 0
+
+
+def ingest_attachments(
+    batches: Iterable[List[Tuple[str, bytes]]],
+    receipt_parser: ReceiptParser,
+    ledger_manager: LedgerManager
+) -> int:
+    """Parse receipts while fetching and write each batch in one commit"""
+    pipeline = IngestionPipeline(receipt_parser, ledger_manager)
+    return len(pipeline.run(batches))
+
+
+def compact_ledger() -> int:
+    """Rewrite the ledger file in canonical order"""
+    try:
+        ledger_manager = LedgerManager()
+        ledger_manager.compact()
+        print(f'Compacted ledger: {BEANCOUNT_FILE}')
+        return 0
+    except Exception as e:
+        print(f'Error compacting ledger: {e}')
+        return 1
+
+
+def gc_attachments() -> int:
+    """Remove stored attachments the ledger no longer references"""
+    try:
+        ledger_manager = LedgerManager()
+        store = get_attachment_store()
+        removed, freed = store.gc(ledger_manager.referenced_attachments())
+        print(f'Removed {removed} attachments ({freed / 1e6:.1f} MB)')
+        return 0
+    except Exception as e:
+        print(f'Error collecting attachments: {e}')
+        return 1
+
+
+def list_quarantine(release: str = None) -> int:
+    """List the PDFs that exceeded the parse limits, or release one"""
+    quarantine = get_quarantine()
+    if release:
+        if not quarantine.release(release):
+            print(f'{release} is not quarantined')
+            return 1
+        print(f'Released {release}; it is parsed again on the next run')
+        return 0
+
+    entries = quarantine.entries()
+    for sha256, filename, reason, quarantined_at in entries:
+        when = datetime.fromtimestamp(quarantined_at)
+        print(f'{sha256}  {when:%Y-%m-%d %H:%M}  {filename}: {reason}')
+    print(f'{len(entries)} quarantined PDFs in {quarantine.root}')
+    return 0
+
+
 def launch_fava() -> None:
     """Launch Fava web interface"""
     if not BEANCOUNT_FILE.exists():
@@ -122,15 +215,39 @@ def main() -> int:
             if len(sys.argv) > 3:
                 end_date = sys.argv[3]
             return process_emails(start_date=start_date, end_date=end_date)
+        elif command == 'sync-emails':
+            folder = sys.argv[2] if len(sys.argv) > 2 else None
+            return sync_emails(folder)
+        elif command == 'watch-emails':
+            folder = sys.argv[2] if len(sys.argv) > 2 else 'INBOX'
+            return watch_emails(folder)
         elif command == 'launch-fava':
             launch_fava()
             return 0
+        elif command == 'compact-ledger':
+            return compact_ledger()
+        elif command == 'gc-attachments':
+            return gc_attachments()
+        elif command == 'quarantine':
+            release = sys.argv[3] if len(sys.argv) > 3 and \
+                sys.argv[2] == 'release' else None
+            return list_quarantine(release)
         elif command == 'help':
             print('Usage:')
             print('  python main.py process-emails [YYYY-MM-DD] [YYYY-MM-DD]')
             print('    # Process emails with optional date range')
+            print('  python main.py sync-emails [FOLDER]')
+            print('    # Process emails received since the last sync')
+            print('  python main.py watch-emails [FOLDER]')
+            print('    # Process new emails as they arrive (IMAP IDLE)')
             print('  python main.py launch-fava')
             print('    # Launch Fava')
+            print('  python main.py compact-ledger')
+            print('    # Rewrite the ledger file in canonical order')
+            print('  python main.py gc-attachments')
+            print('    # Remove stored PDFs the ledger no longer references')
+            print('  python main.py quarantine [release SHA256]')
+            print('    # List PDFs over the parse limits, or retry one')
             print('  python main.py')
             print('    # Process emails then launch Fava')
             return 0
@@ -15,7 +15,11 @@ from werkzeug.utils import secure_filename
 project_root = Path(__file__).parent.parent.parent
 sys.path.insert(0, str(project_root))
 
-from src.processors.email_processor import EmailProcessor  # noqa: E402
+from src.processors.email_accounts import email_sources  # noqa: E402
+from src.processors.fetch_coordinator import FetchCoordinator  # noqa: E402
+from src.processors.ingestion_pipeline import (  # noqa: E402
+    IngestionPipeline
+)
 from src.processors.pdf_parser import ReceiptParser  # noqa: E402
 from src.processors.ledger_manager import LedgerManager  # noqa: E402
 from src.processors.bank_processor import BankProcessor  # noqa: E402
@@ -71,36 +75,39 @@ def process_emails():
                     'error': 'Invalid end_date format. Use YYYY-MM-DD'
                 }), 400
 
-        email_processor = EmailProcessor()
         receipt_parser = ReceiptParser()
         ledger_manager = LedgerManager()
+        processed_count = 0
+        results = []
 
-        attachments = email_processor.fetch_pdf_attachments(
+        coordinator = FetchCoordinator(email_sources())
+        batches = coordinator.iter_attachments(
             start_date=start_date,
             end_date=end_date
         )
-        processed_count = 0
-        results = []
 
-        for filename, file_path in attachments:
-            receipt_data = receipt_parser.parse_receipt(file_path)
-            if receipt_data.get('amount'):
-                ledger_manager.add_transaction(receipt_data)
-                processed_count += 1
-                amount = receipt_data.get('amount', 'Unknown').replace('$', '')
-                results.append({
-                    'filename': filename,
-                    'merchant': receipt_data.get('merchant', 'Unknown'),
-                    'amount': amount,
-                    'date': receipt_data.get('date', 'Unknown')
-                })
-
-        email_processor.close()
+        # The same ingestion as the API: transactions link their email
+        # and stored PDF, so mail already in the ledger is skipped and
+        # gc-attachments keeps the PDFs
+        pipeline = IngestionPipeline(receipt_parser, ledger_manager)
+        for filename, receipt_data in pipeline.run(batches):
+            processed_count += 1
+            amount = receipt_data.get('amount', 'Unknown').replace('$', '')
+            results.append({
+                'filename': filename,
+                'merchant': receipt_data.get('merchant', 'Unknown'),
+                'amount': amount,
+                'date': receipt_data.get('date', 'Unknown')
+            })
 
         return jsonify({
             'success': True,
             'processed_count': processed_count,
             'results': results,
+            'errors': [
+                f'{account.user}/{folder}: {error}'
+                for (account, folder), error in coordinator.errors
+            ],
             'time_window': {
                 'start_date': start_date_str,
                 'end_date': end_date_str
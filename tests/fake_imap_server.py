@@ -0,0 +1,583 @@
+#!/usr/bin/env python3
+
+"""
+Minimal in-process IMAP server for tests and benchmarks
+
+Speaks enough IMAP4rev1 over plain TCP for IMAPClient: LOGIN, SELECT,
+SEARCH, FETCH (including BODYSTRUCTURE, ENVELOPE and body sections),
+STORE, IDLE, NOOP and LOGOUT, with UID variants. Connections can be dropped
+to simulate server timeouts. Every command can be delayed
+to simulate network latency, and the commands and bytes sent are
+recorded so tests can count round trips and transfer size.
+EmailServerTestCase points EmailProcessor at a fresh server per test.
+"""
+
+import re
+import select
+import socket
+import socketserver
+import tempfile
+import threading
+import time
+import unittest
+from email import message_from_bytes
+from email.message import EmailMessage, Message
+from email.utils import (
+    format_datetime, make_msgid, parseaddr, parsedate_to_datetime
+)
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+from unittest.mock import patch
+from urllib.parse import quote
+from src.processors.attachment_store import get_attachment_store
+from src.processors.email_processor import EmailProcessor
+
+USER = 'test@example.com'
+PASSWORD = 'password'
+
+_TOKEN = re.compile(rb'"((?:[^"\\]|\\.)*)"|(\()|(\))|([^\s()]+)')
+
+
+def build_message(
+    subject: str,
+    sent: datetime,
+    attachments: List[Tuple[str, bytes]] = (),
+    body: str = 'See attached.',
+    sender: str = 'store@example.com'
+) -> bytes:
+    """Build a raw email with the given (filename, payload) attachments"""
+    msg = EmailMessage()
+    msg['From'] = sender
+    msg['To'] = USER
+    msg['Subject'] = subject
+    msg['Date'] = format_datetime(sent.replace(tzinfo=timezone.utc))
+    msg['Message-ID'] = make_msgid(domain='example.com')
+    msg.set_content(body)
+    for filename, payload in attachments:
+        maintype, subtype = (
+            ('application', 'pdf') if filename.lower().endswith('.pdf')
+            else ('image', 'png') if filename.lower().endswith('.png')
+            else ('application', 'octet-stream')
+        )
+        msg.add_attachment(
+            payload, maintype=maintype, subtype=subtype, filename=filename
+        )
+    return msg.as_bytes().replace(b'\r\n', b'\n').replace(b'\n', b'\r\n')
+
+
+def _tokenize(data: bytes) -> list:
+    """Split a command line into atoms, strings and nested lists"""
+    stack = [[]]
+    for quoted, opening, closing, atom in _TOKEN.findall(data):
+        if opening:
+            stack.append([])
+        elif closing:
+            group = stack.pop()
+            stack[-1].append(group)
+        elif atom:
+            stack[-1].append(atom.decode())
+        else:
+            stack[-1].append(re.sub(rb'\\(.)', rb'\1', quoted).decode())
+    return stack[0]
+
+
+def _flatten(tokens: list) -> list:
+    """Flatten nested search groups into a flat criteria list"""
+    flat = []
+    for token in tokens:
+        if isinstance(token, list):
+            flat.extend(_flatten(token))
+        else:
+            flat.append(token)
+    return flat
+
+
+def _selector(message_set: str, largest: int):
+    """Build a membership test for a sequence set such as '2,5:*'"""
+    ranges = []
+    for part in message_set.split(','):
+        low, _, high = part.partition(':')
+        low = largest if low == '*' else int(low)
+        high = low if not high else largest if high == '*' else int(high)
+        ranges.append((min(low, high), max(low, high)))
+    return lambda value: any(low <= value <= high for low, high in ranges)
+
+
+class FakeMessage:
+    def __init__(self, uid: int, raw: bytes) -> None:
+        self.uid = uid
+        self.raw = raw
+        self.flags = set()
+        self._parsed = None
+
+    def parsed(self) -> Message:
+        if self._parsed is None:
+            self._parsed = message_from_bytes(self.raw)
+        return self._parsed
+
+
+class FakeIMAPServer:
+    """Threaded fake IMAP server holding messages in memory"""
+
+    def __init__(self, latency: float = 0.0, uidvalidity: int = 1) -> None:
+        self.latency = latency
+        self.uidvalidity = uidvalidity
+        self.folders: Dict[str, List[FakeMessage]] = {'INBOX': []}
+        self.commands: List[str] = []
+        self.bytes_sent = 0
+        self.sessions = set()
+        self.lock = threading.Lock()
+        self._next_uid = 1
+        self._server = None
+        self._thread = None
+
+    @property
+    def port(self) -> int:
+        return self._server.server_address[1]
+
+    def add_message(self, raw: bytes, folder: str = 'INBOX') -> int:
+        """Append a message and return its UID"""
+        with self.lock:
+            uid = self._next_uid
+            self._next_uid += 1
+            self.folders.setdefault(folder, []).append(FakeMessage(uid, raw))
+            return uid
+
+    def drop_connections(self) -> None:
+        """Close every client connection, as a server timeout would"""
+        with self.lock:
+            sessions, self.sessions = self.sessions, set()
+        for session in sessions:
+            try:
+                session.request.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+    def command_count(self, name: str) -> int:
+        """Count received commands, e.g. 'FETCH' or 'SEARCH'"""
+        with self.lock:
+            return sum(1 for command in self.commands if command == name)
+
+    def start(self) -> 'FakeIMAPServer':
+        """Listen on an ephemeral localhost port in a background thread"""
+        fake = self
+
+        class Handler(_Session):
+            server_state = fake
+
+        self._server = socketserver.ThreadingTCPServer(
+            ('127.0.0.1', 0), Handler
+        )
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(
+            target=self._server.serve_forever, args=(0.05,), daemon=True
+        )
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        """Stop serving and close the listening socket"""
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def __enter__(self) -> 'FakeIMAPServer':
+        return self.start()
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
+
+
+class _Session(socketserver.StreamRequestHandler):
+    server_state: FakeIMAPServer = None
+    disable_nagle_algorithm = True
+
+    def handle(self) -> None:
+        self.folder: Optional[str] = None
+        with self.server_state.lock:
+            self.server_state.sessions.add(self)
+        self.send(b'* OK [CAPABILITY IMAP4rev1 IDLE] Fake IMAP ready')
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            tag, _, rest = line.rstrip(b'\r\n').partition(b' ')
+            tokens = _tokenize(rest)
+            if not tokens:
+                self.send(tag + b' BAD Empty command')
+                continue
+
+            command = tokens[0].upper()
+            use_uid = command == 'UID'
+            if use_uid:
+                command = tokens[1].upper()
+                tokens = tokens[1:]
+
+            state = self.server_state
+            with state.lock:
+                state.commands.append(command)
+            if state.latency:
+                time.sleep(state.latency)
+
+            handler = getattr(self, f'do_{command.lower()}', None)
+            if handler is None:
+                self.send(tag + b' BAD Unknown command')
+                continue
+            if handler(tag, tokens[1:], use_uid) is False:
+                return
+
+    def finish(self) -> None:
+        with self.server_state.lock:
+            self.server_state.sessions.discard(self)
+        super().finish()
+
+    def send(self, data: bytes) -> None:
+        self.write(data + b'\r\n')
+
+    def write(self, data: bytes) -> None:
+        with self.server_state.lock:
+            self.server_state.bytes_sent += len(data)
+        self.wfile.write(data)
+
+    def messages(self) -> List[FakeMessage]:
+        return self.server_state.folders.get(self.folder, [])
+
+    def do_capability(self, tag, args, use_uid):
+        self.send(b'* CAPABILITY IMAP4rev1 IDLE')
+        self.send(tag + b' OK CAPABILITY completed')
+
+    def do_login(self, tag, args, use_uid):
+        if args[:2] != [USER, PASSWORD]:
+            self.send(tag + b' NO [AUTHENTICATIONFAILED] Invalid credentials')
+            return
+        self.send(tag + b' OK LOGIN completed')
+
+    def do_select(self, tag, args, use_uid):
+        folder = args[0]
+        if folder not in self.server_state.folders:
+            self.send(tag + b' NO Mailbox does not exist')
+            return
+        self.folder = folder
+        messages = self.messages()
+        next_uid = messages[-1].uid + 1 if messages else 1
+        self.send(b'* %d EXISTS' % len(messages))
+        self.send(b'* 0 RECENT')
+        self.send(b'* FLAGS (\\Seen)')
+        self.send(
+            b'* OK [UIDVALIDITY %d] UIDs valid' % self.server_state.uidvalidity
+        )
+        self.send(b'* OK [UIDNEXT %d] Predicted next UID' % next_uid)
+        self.send(tag + b' OK [READ-WRITE] SELECT completed')
+
+    do_examine = do_select
+
+    def do_noop(self, tag, args, use_uid):
+        self.send(tag + b' OK NOOP completed')
+
+    def do_idle(self, tag, args, use_uid):
+        """Push EXISTS updates until the client sends DONE"""
+        self.send(b'+ idling')
+        known = len(self.messages())
+        while True:
+            readable, _, _ = select.select([self.connection], [], [], 0.02)
+            if readable:
+                line = self.rfile.readline()
+                if not line:
+                    return False
+                self.send(tag + b' OK IDLE terminated')
+                return
+            count = len(self.messages())
+            if count != known:
+                known = count
+                self.send(b'* %d EXISTS' % count)
+
+    def do_logout(self, tag, args, use_uid):
+        self.send(b'* BYE Logging out')
+        self.send(tag + b' OK LOGOUT completed')
+        return False
+
+    def do_search(self, tag, args, use_uid):
+        criteria = _flatten(args)
+        hits = []
+        for seq, msg in enumerate(self.messages(), 1):
+            if self._matches(seq, msg, criteria):
+                hits.append(msg.uid if use_uid else seq)
+        self.send(b'* SEARCH' + b''.join(b' %d' % hit for hit in hits))
+        self.send(tag + b' OK SEARCH completed')
+
+    def _matches(self, seq: int, msg: FakeMessage, criteria: list) -> bool:
+        index = 0
+        while index < len(criteria):
+            key = criteria[index].upper()
+            index += 1
+            if key == 'ALL':
+                continue
+            if key == 'UNSEEN':
+                if '\\Seen' in msg.flags:
+                    return False
+            elif key == 'SEEN':
+                if '\\Seen' not in msg.flags:
+                    return False
+            elif key in ('SINCE', 'BEFORE'):
+                bound = datetime.strptime(criteria[index], '%d-%b-%Y').date()
+                index += 1
+                sent = self._message_date(msg)
+                if sent is None:
+                    continue
+                if key == 'SINCE' and sent < bound:
+                    return False
+                if key == 'BEFORE' and sent >= bound:
+                    return False
+            elif key == 'UID':
+                messages = self.messages()
+                selected = _selector(criteria[index], messages[-1].uid)
+                index += 1
+                if not selected(msg.uid):
+                    return False
+            elif key == 'NOT':
+                if self._matches(seq, msg, [criteria[index]]):
+                    return False
+                index += 1
+        return True
+
+    @staticmethod
+    def _message_date(msg: FakeMessage):
+        match = re.search(rb'^Date: (.+?)\r?$', msg.raw, re.M)
+        if not match:
+            return None
+        try:
+            return parsedate_to_datetime(match.group(1).decode()).date()
+        except (TypeError, ValueError):
+            return None
+
+    def _resolve(self, message_set: str, use_uid: bool) -> list:
+        """Resolve a sequence set to (sequence number, message) pairs"""
+        messages = self.messages()
+        if not messages:
+            return []
+        largest = messages[-1].uid if use_uid else len(messages)
+        selected = _selector(message_set, largest)
+        return [
+            (seq, msg) for seq, msg in enumerate(messages, 1)
+            if selected(msg.uid if use_uid else seq)
+        ]
+
+    def do_fetch(self, tag, args, use_uid):
+        items = args[1] if isinstance(args[1], list) else args[1:]
+        items = [item.upper() for item in items]
+        for seq, msg in self._resolve(args[0], use_uid):
+            parts = []
+            if use_uid and 'UID' not in items:
+                parts.append(b'UID %d' % msg.uid)
+            for item in items:
+                parts.append(self._fetch_item(msg, item))
+            self.write(b'* %d FETCH (' % seq + b' '.join(parts) + b')\r\n')
+        self.send(tag + b' OK FETCH completed')
+
+    def _fetch_item(self, msg: FakeMessage, item: str) -> bytes:
+        if item == 'UID':
+            return b'UID %d' % msg.uid
+        if item == 'FLAGS':
+            return b'FLAGS (' + ' '.join(sorted(msg.flags)).encode() + b')'
+        if item in ('RFC822', 'BODY[]', 'BODY.PEEK[]'):
+            if item != 'BODY.PEEK[]':
+                msg.flags.add('\\Seen')
+            name = b'RFC822' if item == 'RFC822' else b'BODY[]'
+            return name + _literal(msg.raw)
+        if item == 'BODYSTRUCTURE':
+            return b'BODYSTRUCTURE ' + _bodystructure(msg.parsed())
+        if item == 'ENVELOPE':
+            return b'ENVELOPE ' + _envelope(msg.parsed())
+        section = re.fullmatch(r'BODY(\.PEEK)?\[([\d.]+)\]', item)
+        if section:
+            if not section.group(1):
+                msg.flags.add('\\Seen')
+            payload = _section(msg.parsed(), section.group(2))
+            return b'BODY[%s] ' % section.group(2).encode() + (
+                b'NIL' if payload is None else _literal(payload)
+            )
+        raise ValueError(f'Unsupported FETCH item: {item}')
+
+    def do_store(self, tag, args, use_uid):
+        action = args[1].upper()
+        flags = set(_flatten(args[2:]))
+        for seq, msg in self._resolve(args[0], use_uid):
+            if action.startswith('+FLAGS'):
+                msg.flags |= flags
+            elif action.startswith('-FLAGS'):
+                msg.flags -= flags
+            else:
+                msg.flags = set(flags)
+            if not action.endswith('.SILENT'):
+                self.send(
+                    b'* %d FETCH (FLAGS (%s) UID %d)'
+                    % (seq, ' '.join(sorted(msg.flags)).encode(), msg.uid)
+                )
+        self.send(tag + b' OK STORE completed')
+
+
+def _literal(data: bytes) -> bytes:
+    return b' {%d}\r\n' % len(data) + data
+
+
+def _string(value: Optional[str]) -> bytes:
+    """Render an IMAP string, NIL or a literal for unsafe values"""
+    if value is None:
+        return b'NIL'
+    data = str(value).encode()
+    if b'\r' in data or b'\n' in data or not data.isascii():
+        return _literal(data)[1:]
+    return b'"' + data.replace(b'\\', b'\\\\').replace(b'"', b'\\"') + b'"'
+
+
+def _params(params: list) -> bytes:
+    if not params:
+        return b'NIL'
+    rendered = []
+    for key, value in params:
+        if isinstance(value, tuple):
+            # RFC 2231 values are passed through encoded, as servers do.
+            # The email package unquotes them byte for byte as latin-1
+            charset, language, text = value
+            key = key + '*'
+            value = f"{charset}'{language or ''}'" + quote(
+                text, encoding='latin-1'
+            )
+        rendered.append(_string(key) + b' ' + _string(value))
+    return b'(' + b' '.join(rendered) + b')'
+
+
+def _bodystructure(part: Message) -> bytes:
+    """Render the BODYSTRUCTURE of a parsed message"""
+    if part.get_content_maintype() == 'multipart':
+        children = b''.join(
+            _bodystructure(child) for child in part.get_payload()
+        )
+        boundary = [('boundary', part.get_boundary())]
+        return b'(' + children + b' ' + _string(part.get_content_subtype()) \
+            + b' ' + _params(boundary) + b' NIL NIL NIL)'
+
+    maintype = part.get_content_maintype()
+    params = part.get_params()[1:] if part.get_params() else []
+    payload = _encoded_payload(part)
+    fields = [
+        _string(maintype), _string(part.get_content_subtype()),
+        _params(params), _string(part.get('Content-ID')),
+        _string(part.get('Content-Description')),
+        _string(part.get('Content-Transfer-Encoding', '7bit')),
+        b'%d' % len(payload)
+    ]
+    if part.get_content_type() == 'message/rfc822':
+        nested = part.get_payload(0)
+        fields.extend([_envelope(nested), _bodystructure(nested)])
+    if maintype == 'text' or part.get_content_type() == 'message/rfc822':
+        fields.append(b'%d' % payload.count(b'\n'))
+    fields.append(b'NIL')  # MD5
+
+    disposition = part.get_content_disposition()
+    if disposition:
+        disposition_params = part.get_params(
+            header='content-disposition'
+        )[1:]
+        fields.append(
+            b'(' + _string(disposition) + b' '
+            + _params(disposition_params) + b')'
+        )
+    else:
+        fields.append(b'NIL')
+    fields.extend([b'NIL', b'NIL'])  # Language and location
+    return b'(' + b' '.join(fields) + b')'
+
+
+def _envelope(msg: Message) -> bytes:
+    """Render an ENVELOPE with the date, subject, sender and message id"""
+    sender = b'NIL'
+    mailbox, _, host = parseaddr(msg.get('From', ''))[1].partition('@')
+    if host:
+        sender = b'((NIL NIL ' + _string(mailbox) + b' ' + \
+            _string(host) + b'))'
+    return b'(' + b' '.join([
+        _string(msg.get('Date')), _string(msg.get('Subject')),
+        sender, b'NIL', b'NIL', b'NIL', b'NIL', b'NIL',
+        _string(msg.get('In-Reply-To')), _string(msg.get('Message-ID'))
+    ]) + b')'
+
+
+def _section(msg: Message, number: str) -> Optional[bytes]:
+    """Get the encoded body of a part such as '2' or '1.3'"""
+    part = msg
+    for index in number.split('.'):
+        index = int(index)
+        if part.get_content_type() == 'message/rfc822':
+            # Parts of an attached email are numbered within it
+            part = part.get_payload(0)
+        if part.get_content_maintype() == 'multipart':
+            children = part.get_payload()
+            if index > len(children):
+                return None
+            part = children[index - 1]
+        elif index != 1:
+            return None
+    if part.get_content_maintype() == 'multipart':
+        return None
+    return _encoded_payload(part)
+
+
+def _encoded_payload(part: Message) -> bytes:
+    if part.get_content_type() == 'message/rfc822':
+        return part.get_payload(0).as_bytes()
+    payload = part.get_payload()
+    if isinstance(payload, str):
+        payload = payload.encode('utf-8', 'surrogateescape')
+    return payload.replace(b'\r\n', b'\n').replace(b'\n', b'\r\n')
+
+
+class EmailServerTestCase(unittest.TestCase):
+    """Run an EmailProcessor against a fake IMAP server"""
+
+    def setUp(self):
+        """Start the server and point the email settings at it"""
+        self.server = FakeIMAPServer().start()
+        self.addCleanup(self.server.stop)
+
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        self.attachments_dir = Path(tmp_dir.name)
+
+        settings = patch.multiple(
+            'src.processors.email_processor',
+            EMAIL_HOST='127.0.0.1',
+            EMAIL_PORT=self.server.port,
+            EMAIL_SSL=False,
+            EMAIL_USER=USER,
+            EMAIL_PASSWORD=PASSWORD,
+            ATTACHMENTS_DIR=self.attachments_dir,
+            INGESTION_INDEX_FILE=self.attachments_dir / 'ingested.sqlite3'
+        )
+        settings.start()
+        self.addCleanup(settings.stop)
+        cache = patch(
+            'src.processors.receipt_cache.RECEIPT_CACHE_FILE',
+            self.attachments_dir / 'receipt_cache.sqlite3'
+        )
+        cache.start()
+        self.addCleanup(cache.stop)
+        # Stored before the temporary directory is removed
+        self.store = get_attachment_store(self.attachments_dir)
+        self.addCleanup(self.store.wait)
+
+    def add_receipt(self, day: int, filename: str, extra=()) -> int:
+        """Add a message with one PDF and optional other attachments"""
+        attachments = [(filename, b'%PDF-1.4 ' + filename.encode())]
+        return self.server.add_message(build_message(
+            f'Receipt {filename}', datetime(2024, 1, day),
+            attachments + list(extra)
+        ))
+
+    def connect(self) -> EmailProcessor:
+        """Create a processor closed at the end of the test"""
+        processor = EmailProcessor()
+        self.addCleanup(processor.close)
+        return processor
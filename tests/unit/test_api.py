@@ -0,0 +1,31 @@
+#!/usr/bin/env python3
+
+"""
+Unit tests for API request parameter parsing
+"""
+
+import unittest
+from decimal import Decimal
+from api import parse_ledger_query
+
+
+class TestParseLedgerQuery(unittest.TestCase):
+    """Test /api/ledger parameters are validated before querying"""
+
+    def test_amounts(self):
+        """Test amount bounds are parsed as decimals"""
+        query = parse_ledger_query({'min_amount': '5', 'max_amount': '9.99'})
+
+        self.assertEqual(query['min_amount'], Decimal('5'))
+        self.assertEqual(query['max_amount'], Decimal('9.99'))
+
+    def test_non_finite_amounts_are_rejected(self):
+        """Test NaN and Infinity fail like other invalid amounts"""
+        for value in ('NaN', 'sNaN', 'Infinity', '-inf', 'abc'):
+            with self.subTest(value=value):
+                with self.assertRaises(ValueError):
+                    parse_ledger_query({'min_amount': value})
+
+
+if __name__ == '__main__':
+    unittest.main()
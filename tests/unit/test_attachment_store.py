@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+
+"""
+Unit tests for the content-addressed attachment store
+"""
+
+import os
+import tempfile
+import time
+import unittest
+from pathlib import Path
+from src.processors.attachment_store import AttachmentStore, content_hash
+
+
+class TestAttachmentStore(unittest.TestCase):
+    """Test deduplicated storage, the message index and GC"""
+
+    def setUp(self):
+        """Create a store in a temporary directory"""
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        self.store = AttachmentStore(Path(tmp_dir.name))
+        self.addCleanup(self.store.wait)
+
+    def put(self, payload: bytes, filename: str, message_id: str) -> str:
+        """Store an attachment and wait for it to be written"""
+        sha256 = self.store.put(payload, filename, message_id)
+        self.store.wait()
+        return sha256
+
+    def age(self, sha256: str, hours: float) -> None:
+        """Pretend a blob was stored hours ago"""
+        stored_at = time.time() - hours * 3600
+        os.utime(self.store.path(sha256), (stored_at, stored_at))
+
+    def test_identical_payloads_stored_once(self):
+        """Test duplicates share one sharded blob"""
+        first = self.put(b'%PDF-1.4 a', 'a.pdf', '<1@example.com>')
+        second = self.put(b'%PDF-1.4 a', 'copy.pdf', '<2@example.com>')
+
+        self.assertEqual(first, second)
+        self.assertEqual(first, content_hash(b'%PDF-1.4 a'))
+        self.assertEqual(
+            self.store.path(first).relative_to(self.store.root).parts,
+            ('sha256', first[:2], first[2:4], first)
+        )
+        self.assertEqual(self.store.stats()['blobs'], 1)
+        self.assertEqual(self.store.get(first), b'%PDF-1.4 a')
+
+    def test_same_name_does_not_overwrite(self):
+        """Test different PDFs with the same name are both kept"""
+        first = self.put(b'%PDF-1.4 a', 'receipt.pdf', '<1@example.com>')
+        second = self.put(b'%PDF-1.4 b', 'receipt.pdf', '<2@example.com>')
+
+        self.assertEqual(self.store.get(first), b'%PDF-1.4 a')
+        self.assertEqual(self.store.get(second), b'%PDF-1.4 b')
+
+    def test_index_maps_messages_to_hashes(self):
+        """Test lookups by message id and filename"""
+        sha256 = self.put(b'%PDF-1.4 a', 'a.pdf', '<1@example.com>')
+
+        self.assertEqual(
+            self.store.lookup('<1@example.com>', 'a.pdf'), sha256
+        )
+        self.assertIsNone(self.store.lookup('<1@example.com>', 'b.pdf'))
+
+    def test_gc_removes_unreferenced_blobs(self):
+        """Test GC keeps referenced and recent blobs only"""
+        kept = self.put(b'%PDF-1.4 kept', 'kept.pdf', '<1@example.com>')
+        old = self.put(b'%PDF-1.4 old', 'old.pdf', '<2@example.com>')
+        recent = self.put(b'%PDF-1.4 new', 'new.pdf', '<3@example.com>')
+        self.age(kept, 48)
+        self.age(old, 48)
+
+        removed, freed = self.store.gc({kept}, grace_hours=24)
+
+        self.assertEqual((removed, freed), (1, len(b'%PDF-1.4 old')))
+        self.assertIsNone(self.store.get(old))
+        self.assertIsNone(self.store.lookup('<2@example.com>', 'old.pdf'))
+        self.assertFalse(self.store.path(old).parent.exists())
+        self.assertIsNotNone(self.store.get(kept))
+        self.assertIsNotNone(self.store.get(recent))
+
+    def test_duplicate_restarts_grace_period(self):
+        """Test a re-fetched blob is not collected before it is ingested"""
+        sha256 = self.put(b'%PDF-1.4 a', 'a.pdf', '<1@example.com>')
+        self.age(sha256, 48)
+        self.put(b'%PDF-1.4 a', 'a.pdf', '<1@example.com>')
+
+        self.assertEqual(self.store.gc(set(), grace_hours=24), (0, 0))
+
+
+if __name__ == '__main__':
+    unittest.main()
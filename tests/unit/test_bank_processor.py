@@ -0,0 +1,474 @@
+#!/usr/bin/env python3
+
+"""
+Unit tests for bank statement reconciliation
+"""
+
+import contextlib
+import io
+import random
+import tempfile
+import types
+import unittest
+from datetime import date
+from pathlib import Path
+from unittest.mock import Mock, patch
+from src.processors.bank_processor import BankProcessor
+from src.processors.columnar import columnar_available
+from src.processors.matching import (
+    LedgerCandidateIndex, MatchTolerance, assign_one_to_one
+)
+
+SAMPLE_CSV = (
+    Path(__file__).parent.parent.parent
+    / 'data' / 'sample_data' / 'sample_bank_statement.csv'
+)
+
+
+def make_ledger(transactions: list) -> Mock:
+    """Build a ledger manager stand-in returning the given transactions"""
+    ledger_manager = Mock()
+    ledger_manager.get_transactions.return_value = transactions
+    return ledger_manager
+
+
+def ledger_tx(day: int, payee: str, amount: str) -> dict:
+    """Build a ledger transaction as returned by get_transactions"""
+    return {
+        'date': date(2024, 1, day),
+        'payee': payee,
+        'amount': amount,
+        'currency': 'USD'
+    }
+
+
+def bank_tx(day: int, description: str, amount: str) -> dict:
+    """Build a bank transaction as returned by parse_csv"""
+    return {
+        'date': date(2024, 1, day),
+        'description': description,
+        'amount': amount,
+        'type': 'DEBIT'
+    }
+
+
+class TestStreamingCsv(unittest.TestCase):
+    """Test the streaming bank statement parser"""
+
+    def setUp(self):
+        """Create a scratch directory for statements"""
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.bank_processor = BankProcessor(make_ledger([]))
+
+    def tearDown(self):
+        """Remove the scratch directory"""
+        self.tmp_dir.cleanup()
+
+    def write_csv(self, content: str, encoding: str = 'utf-8') -> str:
+        """Write a statement and return its path"""
+        path = Path(self.tmp_dir.name) / 'statement.csv'
+        path.write_text(content, encoding=encoding)
+        return str(path)
+
+    def test_iter_csv_is_lazy(self):
+        """Test rows are yielded from a generator"""
+        path = self.write_csv(
+            'Date,Description,Amount,Type\n'
+            '2024-01-15,WALMART,45.67,DEBIT\n'
+        )
+
+        rows = self.bank_processor.iter_csv(path)
+
+        self.assertIsInstance(rows, types.GeneratorType)
+        self.assertEqual(list(rows), [{
+            'date': date(2024, 1, 15),
+            'description': 'WALMART',
+            'amount': '45.67',
+            'type': 'DEBIT'
+        }])
+
+    def test_day_first_format_detected_from_sample(self):
+        """Test an ambiguous first date follows the file's format"""
+        path = self.write_csv(
+            'Date,Description,Amount,Type\n'
+            '01/02/2024,COFFEE,4.50,DEBIT\n'
+            '25/01/2024,GROCERIES,45.67,DEBIT\n'
+        )
+
+        dates = [row['date'] for row in self.bank_processor.iter_csv(path)]
+
+        self.assertEqual(dates, [date(2024, 2, 1), date(2024, 1, 25)])
+
+    def test_alternate_headers_and_bom(self):
+        """Test header aliases, column order and a UTF-8 BOM"""
+        path = self.write_csv(
+            'Amount,Memo,Transaction Date\n'
+            '12.75,UBER RIDE,2024/01/20\n',
+            encoding='utf-8-sig'
+        )
+
+        rows = list(self.bank_processor.iter_csv(path))
+
+        self.assertEqual(rows, [{
+            'date': date(2024, 1, 20),
+            'description': 'UBER RIDE',
+            'amount': '12.75',
+            'type': ''
+        }])
+
+    def test_sample_statement_formats(self):
+        """Test both sample statement date formats are detected"""
+        for name in ('sample_bank_statement.csv',
+                     'alternative_bank_statement.csv'):
+            path = SAMPLE_CSV.with_name(name)
+            first = next(self.bank_processor.iter_csv(str(path)))
+            self.assertEqual(first['date'], date(2024, 1, 15))
+            self.assertEqual(first['amount'], '45.67')
+
+
+class TestCompareTransactions(unittest.TestCase):
+    """Test matching bank transactions against the ledger"""
+
+    def test_sample_statement(self):
+        """Test the sample statement against the integration test ledger"""
+        bank_processor = BankProcessor(make_ledger([
+            ledger_tx(15, 'Walmart Supercenter', '45.67'),
+            ledger_tx(16, 'Starbucks Coffee', '4.50'),
+            ledger_tx(17, 'Amazon.com', '23.99'),
+            ledger_tx(18, 'Local Coffee Shop', '15.99'),
+            ledger_tx(19, 'Hardware Store', '89.15')
+        ]))
+        bank_transactions = bank_processor.parse_csv(str(SAMPLE_CSV))
+
+        comparison = bank_processor.compare_transactions(bank_transactions)
+
+        matched = [m['ledger']['description'] for m in comparison['matches']]
+        self.assertEqual(
+            matched, ['Walmart Supercenter', 'Starbucks Coffee', 'Amazon.com']
+        )
+        self.assertEqual(
+            [tx['description'] for tx in comparison['ledger_only']],
+            ['Local Coffee Shop', 'Hardware Store']
+        )
+        self.assertEqual(
+            len(comparison['bank_only']), len(bank_transactions) - 3
+        )
+
+    def test_amounts_compared_in_cents(self):
+        """Test formatted and float amounts match on their cent value"""
+        bank_processor = BankProcessor(make_ledger([
+            ledger_tx(15, 'Costco', '1234.10')
+        ]))
+
+        comparison = bank_processor.compare_transactions([
+            bank_tx(15, 'COSTCO', '$1,234.1')
+        ])
+
+        self.assertEqual(len(comparison['matches']), 1)
+        self.assertEqual(comparison['bank_only'], [])
+
+    def test_first_ledger_candidate_wins(self):
+        """Test a bank row matches the first equal ledger transaction"""
+        bank_processor = BankProcessor(make_ledger([
+            ledger_tx(16, 'Starbucks Coffee', '4.50'),
+            ledger_tx(16, 'Starbucks Reserve', '4.50')
+        ]))
+
+        comparison = bank_processor.compare_transactions([
+            bank_tx(16, 'STARBUCKS', '4.50')
+        ])
+
+        self.assertEqual(
+            comparison['matches'][0]['ledger']['description'],
+            'Starbucks Coffee'
+        )
+        self.assertEqual(
+            [tx['description'] for tx in comparison['ledger_only']],
+            ['Starbucks Reserve']
+        )
+
+    def test_ledger_only_tracked_by_identity(self):
+        """Test identical ledger rows are not all hidden by one match"""
+        bank_processor = BankProcessor(make_ledger([
+            ledger_tx(16, 'Starbucks Coffee', '4.50'),
+            ledger_tx(16, 'Starbucks Coffee', '4.50')
+        ]))
+
+        comparison = bank_processor.compare_transactions([
+            bank_tx(16, 'STARBUCKS', '4.50')
+        ])
+
+        self.assertEqual(len(comparison['matches']), 1)
+        self.assertEqual(len(comparison['ledger_only']), 1)
+
+
+class TestToleranceMatching(unittest.TestCase):
+    """Test matching with date drift and amount slack"""
+
+    def setUp(self):
+        """Build a ledger with receipts that settle late or with tips"""
+        self.bank_processor = BankProcessor(make_ledger([
+            ledger_tx(10, 'Chipotle', '11.50'),
+            ledger_tx(12, 'Uber', '32.75'),
+            ledger_tx(14, 'Uber', '32.75')
+        ]))
+        self.bank_transactions = [
+            bank_tx(13, 'CHIPOTLE MEXICAN GRILL', '13.60'),
+            bank_tx(15, 'UBER RIDE', '32.75')
+        ]
+
+    def test_exact_tolerance_by_default(self):
+        """Test the default tolerance keeps exact matching"""
+        comparison = self.bank_processor.compare_transactions(
+            self.bank_transactions
+        )
+
+        self.assertEqual(comparison['matches'], [])
+        self.assertEqual(len(comparison['bank_only']), 2)
+
+    def test_date_window_and_percentage(self):
+        """Test late settlement and a tip both match within tolerance"""
+        comparison = self.bank_processor.compare_transactions(
+            self.bank_transactions,
+            tolerance=MatchTolerance(days=3, percent=20)
+        )
+
+        self.assertEqual(comparison['bank_only'], [])
+        self.assertEqual(
+            [match['ledger']['date'] for match in comparison['matches']],
+            [date(2024, 1, 10), date(2024, 1, 14)]
+        )
+        self.assertEqual(
+            [tx['date'] for tx in comparison['ledger_only']],
+            [date(2024, 1, 12)]
+        )
+
+    def test_absolute_amount_tolerance(self):
+        """Test absolute amount slack without percentage"""
+        comparison = self.bank_processor.compare_transactions(
+            self.bank_transactions,
+            tolerance=MatchTolerance(days=3, amount=2.00)
+        )
+
+        self.assertEqual(
+            [tx['description'] for tx in comparison['bank_only']],
+            ['CHIPOTLE MEXICAN GRILL']
+        )
+
+    def test_negative_tolerance_rejected(self):
+        """Test negative tolerances raise"""
+        with self.assertRaises(ValueError):
+            MatchTolerance(days=-1)
+
+    def test_candidates_match_brute_force(self):
+        """Test the windowed index finds the same candidates as a scan"""
+        ledger = [
+            {'date': date(2024, 1, 1 + (i * 7) % 28),
+             'amount': round(5 + (i * 37) % 200 / 4, 2)}
+            for i in range(300)
+        ]
+        tolerance = MatchTolerance(days=2, amount=0.5, percent=5)
+        index = LedgerCandidateIndex(ledger, tolerance)
+
+        for day in range(1, 29):
+            for amount in (5.0, 12.25, 30.5, 55.0):
+                tx = {'date': date(2024, 1, day), 'amount': amount}
+                slack = tolerance.slack_cents(round(amount * 100))
+                expected = sorted(
+                    pos for pos, ledger_tx in enumerate(ledger)
+                    if abs((ledger_tx['date'] - tx['date']).days) <= 2
+                    and abs(round(ledger_tx['amount'] * 100)
+                            - round(amount * 100)) <= slack
+                )
+                found = sorted(pos for _, pos in index.candidates(tx))
+                self.assertEqual(found, expected)
+
+
+class TestAssignmentMatching(unittest.TestCase):
+    """Test one-to-one assignment of bank rows to ledger rows"""
+
+    def test_identical_bank_rows_match_distinct_ledger_rows(self):
+        """Test two equal coffees no longer share one ledger entry"""
+        bank_processor = BankProcessor(make_ledger([
+            ledger_tx(16, 'Starbucks Coffee', '4.50'),
+            ledger_tx(16, 'Starbucks Coffee', '4.50')
+        ]))
+        bank_transactions = [
+            bank_tx(16, 'STARBUCKS', '4.50'),
+            bank_tx(16, 'STARBUCKS', '4.50')
+        ]
+
+        greedy = bank_processor.compare_transactions(bank_transactions)
+        assignment = bank_processor.compare_transactions(
+            bank_transactions, mode='assignment'
+        )
+
+        self.assertEqual(len(greedy['ledger_only']), 1)
+        self.assertEqual(len(assignment['matches']), 2)
+        self.assertEqual(assignment['ledger_only'], [])
+        self.assertEqual(
+            [match['score'] for match in assignment['matches']], [1.0, 1.0]
+        )
+
+    def test_assignment_avoids_greedy_theft(self):
+        """Test a close match is not taken by an earlier bank row"""
+        bank_processor = BankProcessor(
+            make_ledger([
+                ledger_tx(10, 'Uber', '20.00'),
+                ledger_tx(13, 'Uber', '20.00')
+            ]),
+            MatchTolerance(days=3)
+        )
+        bank_transactions = [
+            bank_tx(11, 'UBER RIDE', '20.00'),
+            bank_tx(9, 'UBER RIDE', '20.00')
+        ]
+
+        greedy = bank_processor.compare_transactions(bank_transactions)
+        assignment = bank_processor.compare_transactions(
+            bank_transactions, mode='assignment'
+        )
+
+        self.assertEqual(len(greedy['bank_only']), 0)
+        self.assertEqual(len(greedy['ledger_only']), 1)
+        self.assertEqual(
+            [match['ledger']['date'] for match in assignment['matches']],
+            [date(2024, 1, 13), date(2024, 1, 10)]
+        )
+        self.assertEqual(assignment['ledger_only'], [])
+
+    def test_unknown_mode_rejected(self):
+        """Test unsupported match modes raise"""
+        bank_processor = BankProcessor(make_ledger([]))
+
+        with self.assertRaises(ValueError):
+            bank_processor.compare_transactions([], mode='fuzzy')
+
+    def test_assignment_maximizes_matches_then_score(self):
+        """Test more matches are preferred over one perfect match"""
+        candidates = [
+            [(1.0, 0), (0.5, 1)],
+            [(0.6, 0)]
+        ]
+
+        assignment = assign_one_to_one(candidates)
+
+        self.assertEqual(assignment, {0: (1, 0.5), 1: (0, 0.6)})
+
+    def test_assignment_is_deterministic_across_components(self):
+        """Test components are solved independently and reproducibly"""
+        candidates = [
+            [(0.9, 2), (0.8, 3)],
+            [(0.9, 2)],
+            [],
+            [(1.0, 0), (1.0, 1)],
+            [(1.0, 0), (1.0, 1)]
+        ]
+
+        first = assign_one_to_one(candidates)
+
+        self.assertEqual(first, assign_one_to_one(candidates))
+        self.assertEqual(first[0], (3, 0.8))
+        self.assertEqual(first[1], (2, 0.9))
+        self.assertNotIn(2, first)
+        self.assertEqual({first[3][0], first[4][0]}, {0, 1})
+
+    def test_large_component_keeps_every_match(self):
+        """Test a component past the limit still matches every row"""
+        # Bank row i+1 scores best with ledger row i, which greedy takes,
+        # leaving bank row 0 without a match
+        rows = 302
+        candidates = [
+            [(0.5, row)] + ([(0.9, row - 1)] if row else [])
+            for row in range(rows)
+        ]
+
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            assignment = assign_one_to_one(candidates)
+
+        self.assertEqual(len(assignment), rows)
+        self.assertEqual(
+            len({position for position, _ in assignment.values()}), rows
+        )
+        self.assertIn('maximum matching', output.getvalue())
+
+    def test_maximum_matching_agrees_with_optimal_count(self):
+        """Test the large component path finds as many matches"""
+        generator = random.Random(7)
+        for _ in range(50):
+            candidates = [
+                [
+                    (round(generator.random(), 4), position)
+                    for position in generator.sample(range(12), 3)
+                ]
+                for _ in range(10)
+            ]
+            optimal = assign_one_to_one(candidates)
+            with patch(
+                'src.processors.matching.ASSIGNMENT_COMPONENT_LIMIT', 1
+            ), contextlib.redirect_stdout(io.StringIO()):
+                maximum = assign_one_to_one(candidates)
+
+            self.assertEqual(len(maximum), len(optimal))
+            self.assertEqual(
+                len({position for position, _ in maximum.values()}),
+                len(maximum)
+            )
+            for bank_row, (position, score) in maximum.items():
+                self.assertIn((score, position), candidates[bank_row])
+
+
+@unittest.skipUnless(columnar_available(), 'NumPy is not installed')
+class TestColumnarBackend(unittest.TestCase):
+    """Test the vectorized backend against the Python one"""
+
+    def setUp(self):
+        """Create a processor over a ledger with duplicates"""
+        self.bank_processor = BankProcessor(make_ledger([
+            ledger_tx(15, 'Walmart Supercenter', '45.67'),
+            ledger_tx(16, 'Starbucks Coffee', '4.50'),
+            ledger_tx(16, 'Starbucks Coffee', '4.50'),
+            ledger_tx(20, 'Gas Station', '35.00')
+        ]))
+
+    def test_matches_python_backend(self):
+        """Test both backends return identical results"""
+        bank_transactions = [
+            bank_tx(16, 'STARBUCKS', '4.50'),
+            bank_tx(15, 'WALMART', '$45.67'),
+            bank_tx(16, 'STARBUCKS', '4.50'),
+            bank_tx(18, 'UNKNOWN', '1,200.00')
+        ]
+
+        python = self.bank_processor.compare_transactions(bank_transactions)
+        columnar = self.bank_processor.compare_transactions(
+            bank_transactions, backend='columnar'
+        )
+
+        self.assertEqual(columnar, python)
+        self.assertEqual(columnar['bank_only'][0]['amount'], 1200.0)
+
+    def test_empty_statement(self):
+        """Test an empty statement leaves every ledger row unmatched"""
+        result = self.bank_processor.compare_transactions(
+            [], backend='columnar'
+        )
+
+        self.assertEqual(result['matches'], [])
+        self.assertEqual(len(result['ledger_only']), 4)
+
+    def test_rejects_tolerance_and_assignment(self):
+        """Test unsupported matching options are refused"""
+        with self.assertRaises(ValueError):
+            self.bank_processor.compare_transactions(
+                [], MatchTolerance(days=1), backend='columnar'
+            )
+        with self.assertRaises(ValueError):
+            self.bank_processor.compare_transactions(
+                [], mode='assignment', backend='columnar'
+            )
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,240 @@
+#!/usr/bin/env python3
+
+"""
+Unit tests for fetching email attachments from a local IMAP server
+"""
+
+import unittest
+from datetime import date, datetime
+from email import message_from_bytes
+from email.message import EmailMessage
+from unittest.mock import patch
+from src.processors.attachment_store import content_hash
+from src.processors.email_processor import EmailProcessor
+from src.processors.sync_state import SyncStateStore
+from tests.fake_imap_server import EmailServerTestCase, USER, build_message
+
+
+class TestBatchedFetch(EmailServerTestCase):
+    """Test messages are fetched a batch at a time"""
+
+    def test_round_trips_per_batch(self):
+        """Test each batch costs one structure and one download FETCH"""
+        for day in range(1, 8):
+            self.add_receipt(day, f'receipt{day}.pdf')
+
+        batches = list(self.connect().iter_pdf_attachments(batch_size=3))
+
+        self.assertEqual([len(batch) for batch in batches], [3, 3, 1])
+        self.assertEqual(self.server.command_count('FETCH'), 6)
+        self.assertEqual(
+            batches[0][0], ('receipt1.pdf', b'%PDF-1.4 receipt1.pdf')
+        )
+
+    def test_batches_are_lazy(self):
+        """Test later batches are not fetched before they are consumed"""
+        for day in range(1, 5):
+            self.add_receipt(day, f'receipt{day}.pdf')
+
+        batches = self.connect().iter_pdf_attachments(batch_size=2)
+        next(batches)
+
+        self.assertEqual(self.server.command_count('FETCH'), 2)
+
+    def test_batches_carry_senders(self):
+        """Test each attachment keeps its email's From address"""
+        self.server.add_message(build_message(
+            'Your order', datetime(2024, 1, 1), [('order.pdf', b'%PDF')],
+            sender='Amazon.com <auto-confirm@amazon.com>'
+        ))
+        self.add_receipt(2, 'receipt.pdf')
+
+        batch = next(self.connect().iter_pdf_attachments())
+
+        self.assertEqual(
+            batch.senders, ['auto-confirm@amazon.com', 'store@example.com']
+        )
+
+    def test_fetch_all_skips_seen_and_non_pdf(self):
+        """Test the list API keeps its UNSEEN and PDF-only behaviour"""
+        self.add_receipt(1, 'first.pdf', [('logo.png', b'png')])
+        self.server.add_message(build_message(
+            'Newsletter', datetime(2024, 1, 2), [('banner.png', b'png')]
+        ))
+        processor = self.connect()
+
+        first = processor.fetch_pdf_attachments()
+        second = processor.fetch_pdf_attachments()
+
+        self.assertEqual([name for name, _ in first], ['first.pdf'])
+        self.assertEqual(second, [])
+
+    def test_time_window(self):
+        """Test the date window is applied to fetched messages"""
+        for day in (1, 10, 20):
+            self.add_receipt(day, f'receipt{day}.pdf')
+
+        attachments = self.connect().fetch_pdf_attachments(
+            start_date=date(2024, 1, 5), end_date=date(2024, 1, 15)
+        )
+
+        self.assertEqual([name for name, _ in attachments], ['receipt10.pdf'])
+
+
+class TestAttachmentStore(EmailServerTestCase):
+    """Test attachments are passed in memory and stored on the side"""
+
+    def test_stores_by_content(self):
+        """Test PDFs are stored once per content and indexed per message"""
+        self.add_receipt(1, 'receipt.pdf')
+        self.add_receipt(2, 'receipt.pdf')
+
+        attachments = self.connect().fetch_pdf_attachments()
+        self.store.wait()
+
+        self.assertEqual(len(attachments), 2)
+        self.assertEqual(self.store.stats()['blobs'], 1)
+        sha256 = content_hash(b'%PDF-1.4 receipt.pdf')
+        self.assertEqual(self.store.get(sha256), b'%PDF-1.4 receipt.pdf')
+        message_ids = [
+            msg.parsed()['Message-ID'] for msg in self.server.folders['INBOX']
+        ]
+        for message_id in message_ids:
+            self.assertEqual(
+                self.store.lookup(message_id, 'receipt.pdf'), sha256
+            )
+
+    def test_storing_is_optional(self):
+        """Test nothing is written when archiving is disabled"""
+        self.add_receipt(1, 'receipt.pdf')
+
+        with patch(
+            'src.processors.email_processor.EMAIL_ARCHIVE_ATTACHMENTS', False
+        ):
+            attachments = self.connect().fetch_pdf_attachments()
+        self.store.wait()
+
+        self.assertEqual(len(attachments), 1)
+        self.assertEqual(self.store.stats()['blobs'], 0)
+
+
+class TestSelectiveDownload(EmailServerTestCase):
+    """Test only PDF parts are downloaded"""
+
+    def test_skips_non_pdf_content(self):
+        """Test images and messages without PDFs are never transferred"""
+        image = b'\x89PNG' + b'0' * 200_000
+        self.add_receipt(1, 'receipt.pdf', [('logo.png', image)])
+        self.server.add_message(build_message(
+            'Newsletter', datetime(2024, 1, 2), [('banner.png', image)]
+        ))
+
+        attachments = self.connect().fetch_pdf_attachments()
+
+        self.assertEqual([name for name, _ in attachments], ['receipt.pdf'])
+        self.assertLess(self.server.bytes_sent, len(image))
+        self.assertEqual(self.server.command_count('FETCH'), 2)
+
+    def test_nested_and_encoded_filenames(self):
+        """Test PDFs in forwarded emails and RFC 2231 filenames"""
+        forwarded = message_from_bytes(build_message(
+            'Fwd', datetime(2024, 1, 3), [('inner.pdf', b'%PDF-1.4 inner')]
+        ))
+        outer = EmailMessage()
+        outer['Subject'] = 'Forwarded receipts'
+        outer['Date'] = 'Wed, 03 Jan 2024 10:00:00 +0000'
+        outer.set_content('Two receipts')
+        outer.add_attachment(
+            b'%PDF-1.4 accent', maintype='application', subtype='pdf',
+            filename='reçu.pdf'
+        )
+        outer.add_attachment(forwarded)
+        self.server.add_message(outer.as_bytes())
+
+        attachments = self.connect().fetch_pdf_attachments()
+
+        self.assertEqual(
+            dict(attachments),
+            {'reçu.pdf': b'%PDF-1.4 accent', 'inner.pdf': b'%PDF-1.4 inner'}
+        )
+
+
+class TestUidSync(EmailServerTestCase):
+    """Test incremental sync from persisted UID checkpoints"""
+
+    def setUp(self):
+        """Keep the sync state in the temporary directory"""
+        super().setUp()
+        self.state = SyncStateStore(self.attachments_dir / 'sync.json')
+
+    def sync(self, processor: EmailProcessor = None, **kwargs) -> list:
+        """Run a sync to completion and return the attachment names"""
+        processor = processor or self.connect()
+        return [
+            name
+            for batch in processor.sync_pdf_attachments(
+                state=self.state, **kwargs
+            )
+            for name, _ in batch
+        ]
+
+    def test_only_new_messages_after_checkpoint(self):
+        """Test a second sync searches only UIDs above the checkpoint"""
+        self.add_receipt(1, 'first.pdf')
+        self.add_receipt(2, 'second.pdf')
+        processor = self.connect()
+
+        self.assertEqual(self.sync(processor), ['first.pdf', 'second.pdf'])
+        self.assertEqual(self.sync(processor), [])
+        self.add_receipt(3, 'third.pdf')
+        self.assertEqual(self.sync(processor), ['third.pdf'])
+        self.assertEqual(
+            self.state.get(USER, 'INBOX'), {'uidvalidity': 1, 'last_uid': 3}
+        )
+        # Only the first sync and the new message needed FETCH commands
+        self.assertEqual(self.server.command_count('FETCH'), 4)
+
+    def test_ignores_read_state(self):
+        """Test messages read elsewhere are still synced and stay read"""
+        uid = self.add_receipt(1, 'read.pdf')
+        self.server.folders['INBOX'][0].flags.add('\\Seen')
+        unread = self.add_receipt(2, 'unread.pdf')
+
+        self.assertEqual(self.sync(), ['read.pdf', 'unread.pdf'])
+        flags = {
+            msg.uid: msg.flags for msg in self.server.folders['INBOX']
+        }
+        self.assertEqual(flags[uid], {'\\Seen'})
+        self.assertEqual(flags[unread], set())
+
+    def test_uidvalidity_change_resyncs(self):
+        """Test a new UIDVALIDITY discards the checkpoint"""
+        self.add_receipt(1, 'first.pdf')
+        self.sync()
+
+        self.server.uidvalidity = 2
+        self.assertEqual(self.sync(), ['first.pdf'])
+        self.assertEqual(self.state.get(USER, 'INBOX')['uidvalidity'], 2)
+
+    def test_interrupted_batch_is_fetched_again(self):
+        """Test the checkpoint only covers batches the caller finished"""
+        for day in range(1, 5):
+            self.add_receipt(day, f'receipt{day}.pdf')
+        processor = self.connect()
+
+        batches = processor.sync_pdf_attachments(
+            state=self.state, batch_size=2
+        )
+        next(batches)
+        next(batches)
+        batches.close()
+
+        self.assertEqual(self.state.get(USER, 'INBOX')['last_uid'], 2)
+        self.assertEqual(
+            self.sync(processor, batch_size=2),
+            ['receipt3.pdf', 'receipt4.pdf']
+        )
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+
+"""
+Unit tests for the IMAP IDLE email watcher
+"""
+
+import threading
+import time
+import unittest
+from src.processors.email_watcher import EmailWatcher
+from src.processors.sync_state import SyncStateStore
+from tests.fake_imap_server import EmailServerTestCase
+
+
+class TestEmailWatcher(EmailServerTestCase):
+    """Test new mail is ingested as the server pushes it"""
+
+    def setUp(self):
+        """Create a watcher that records ingested attachment names"""
+        super().setUp()
+        self.ingested = []
+        self.watcher = EmailWatcher(
+            self.ingest,
+            state=SyncStateStore(self.attachments_dir / 'sync.json'),
+            idle_timeout=5,
+            initial_backoff=0.01
+        )
+        self.thread = threading.Thread(target=self.watcher.run)
+
+    def ingest(self, batches) -> int:
+        """Record the attachments of every batch"""
+        count = 0
+        for batch in batches:
+            self.ingested.extend(name for name, _ in batch)
+            batch.checkpoint()
+            count += len(batch)
+        return count
+
+    def start(self):
+        """Run the watcher until the end of the test"""
+        self.thread.start()
+
+        def stop():
+            self.watcher.stop()
+            self.thread.join(5)
+            self.assertFalse(self.thread.is_alive())
+        self.addCleanup(stop)
+
+    def wait_for(self, condition, timeout: float = 5.0) -> None:
+        """Poll until condition() is true"""
+        deadline = time.monotonic() + timeout
+        while not condition():
+            if time.monotonic() > deadline:
+                self.fail('Timed out waiting for the watcher')
+            time.sleep(0.01)
+
+    def test_catches_up_then_ingests_pushed_mail(self):
+        """Test existing mail is synced first, then new mail on push"""
+        self.add_receipt(1, 'existing.pdf')
+        self.start()
+        self.wait_for(lambda: self.ingested == ['existing.pdf'])
+        self.wait_for(lambda: self.server.command_count('IDLE'))
+
+        self.add_receipt(2, 'pushed.pdf')
+
+        self.wait_for(lambda: self.ingested == ['existing.pdf', 'pushed.pdf'])
+        self.assertEqual(self.server.command_count('LOGIN'), 1)
+
+    def test_reconnects_after_connection_loss(self):
+        """Test a dropped connection reconnects and keeps ingesting"""
+        self.start()
+        self.wait_for(lambda: self.server.command_count('IDLE'))
+
+        self.server.drop_connections()
+        self.wait_for(lambda: self.server.command_count('LOGIN') == 2)
+        self.add_receipt(3, 'after-reconnect.pdf')
+
+        self.wait_for(lambda: self.ingested == ['after-reconnect.pdf'])
+
+    def test_stop_interrupts_idle(self):
+        """Test stop() returns promptly while waiting in IDLE"""
+        self.start()
+        self.wait_for(lambda: self.server.command_count('IDLE'))
+
+        started = time.monotonic()
+        self.watcher.stop()
+        self.thread.join(5)
+
+        self.assertFalse(self.thread.is_alive())
+        self.assertLess(time.monotonic() - started, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
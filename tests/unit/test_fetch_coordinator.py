@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+
+"""
+Unit tests for concurrent multi-account, multi-folder fetching
+"""
+
+import tempfile
+import time
+import unittest
+from datetime import datetime
+from pathlib import Path
+from unittest.mock import patch
+from src.processors.attachment_store import get_attachment_store
+from src.processors.email_accounts import EmailAccount
+from src.processors.fetch_coordinator import FetchCoordinator
+from src.processors.imap_pool import IMAPConnectionPool
+from src.processors.sync_state import SyncStateStore
+from tests.fake_imap_server import (
+    FakeIMAPServer, PASSWORD, USER, build_message
+)
+
+LATENCY = 0.05
+
+
+class TestFetchCoordinator(unittest.TestCase):
+    """Test sources are fetched concurrently into one stream"""
+
+    def setUp(self):
+        """Start two servers with latency, one with two folders"""
+        self.servers = []
+        for _ in range(2):
+            server = FakeIMAPServer(latency=LATENCY).start()
+            self.addCleanup(server.stop)
+            self.servers.append(server)
+        self.servers[0].folders['Receipts'] = []
+
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        self.tmp_path = Path(tmp_dir.name)
+        attachments_dir = patch.multiple(
+            'src.processors.email_processor',
+            ATTACHMENTS_DIR=self.tmp_path,
+            INGESTION_INDEX_FILE=self.tmp_path / 'ingested.sqlite3'
+        )
+        attachments_dir.start()
+        self.addCleanup(attachments_dir.stop)
+        self.addCleanup(get_attachment_store(self.tmp_path).wait)
+
+        self.add_receipt(0, 'INBOX', 'first-inbox.pdf')
+        self.add_receipt(0, 'Receipts', 'first-label.pdf')
+        self.add_receipt(1, 'INBOX', 'second-inbox.pdf')
+
+    def add_receipt(self, server: int, folder: str, filename: str) -> None:
+        """Add a message with one PDF to a folder of a server"""
+        self.servers[server].add_message(build_message(
+            filename, datetime(2024, 1, 1), [(filename, b'%PDF-1.4')]
+        ), folder)
+
+    def account(self, server: int, password: str = PASSWORD) -> EmailAccount:
+        """An account on one of the fake servers"""
+        return EmailAccount(
+            USER, password, host='127.0.0.1',
+            port=self.servers[server].port, ssl=False
+        )
+
+    def sources(self) -> list:
+        """Two folders of the first account and the second's inbox"""
+        return [
+            (self.account(0), 'INBOX'),
+            (self.account(0), 'Receipts'),
+            (self.account(1), 'INBOX')
+        ]
+
+    def fetch(self, coordinator: FetchCoordinator, **kwargs) -> list:
+        """Run the coordinator and return the sorted attachment names"""
+        return sorted(
+            name
+            for batch in coordinator.iter_attachments(**kwargs)
+            for name, _ in batch
+        )
+
+    def test_merges_all_sources(self):
+        """Test every source's attachments reach the one stream"""
+        coordinator = FetchCoordinator(self.sources())
+
+        self.assertEqual(
+            self.fetch(coordinator),
+            ['first-inbox.pdf', 'first-label.pdf', 'second-inbox.pdf']
+        )
+        self.assertEqual(coordinator.errors, [])
+        # One connection per source
+        self.assertEqual(self.servers[0].command_count('LOGIN'), 2)
+
+    def test_sources_run_concurrently(self):
+        """Test wall-clock time tracks one source, not the sum"""
+        started = time.monotonic()
+        self.fetch(FetchCoordinator(self.sources(), max_workers=1))
+        sequential = time.monotonic() - started
+
+        for server in self.servers:
+            for folder in server.folders.values():
+                for msg in folder:
+                    msg.flags.clear()
+        started = time.monotonic()
+        self.fetch(FetchCoordinator(self.sources(), max_workers=3))
+        concurrent = time.monotonic() - started
+
+        self.assertLess(concurrent, sequential * 0.6)
+
+    def test_failing_source_does_not_stop_others(self):
+        """Test a login failure is reported while other sources finish"""
+        sources = self.sources()
+        sources[2] = (self.account(1, password='wrong'), 'INBOX')
+        coordinator = FetchCoordinator(sources)
+
+        names = self.fetch(coordinator)
+
+        self.assertEqual(names, ['first-inbox.pdf', 'first-label.pdf'])
+        self.assertEqual(len(coordinator.errors), 1)
+        self.assertIs(coordinator.errors[0][0], sources[2])
+
+    def test_sync_checkpoints_each_source(self):
+        """Test sync keeps one checkpoint per account and folder"""
+        state = SyncStateStore(self.tmp_path / 'sync.json')
+        coordinator = FetchCoordinator(self.sources())
+
+        self.assertEqual(
+            len(self.fetch(coordinator, sync=True, state=state)), 3
+        )
+        self.assertEqual(self.fetch(coordinator, sync=True, state=state), [])
+        self.assertEqual(
+            state.get(USER, 'Receipts'), {'uidvalidity': 1, 'last_uid': 2}
+        )
+
+    def test_sources_of_one_account_share_its_pool(self):
+        """Test folders beyond the pool size wait instead of timing out"""
+        for folder in ('Archive', 'Travel'):
+            self.servers[0].folders[folder] = []
+            self.add_receipt(0, folder, f'{folder.lower()}.pdf')
+        account = self.account(0)
+        pool = IMAPConnectionPool(account, max_connections=2)
+        self.addCleanup(pool.close)
+        coordinator = FetchCoordinator(
+            [(account, folder) for folder in self.servers[0].folders],
+            max_workers=4,
+            connect=lambda account: pool.connection(timeout=0.2),
+            max_per_account=2
+        )
+
+        names = []
+        for batch in coordinator.iter_attachments():
+            # Ingestion slower than the pool timeout
+            time.sleep(0.3)
+            names.extend(name for name, _ in batch)
+
+        self.assertEqual(coordinator.errors, [])
+        self.assertEqual(len(names), 4)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+
+"""
+Unit tests for the pooled IMAP connections
+"""
+
+import threading
+import time
+import unittest
+from src.processors.email_accounts import EmailAccount
+from src.processors.imap_pool import IMAPConnectionPool
+from tests.fake_imap_server import FakeIMAPServer, PASSWORD, USER
+
+
+class TestIMAPConnectionPool(unittest.TestCase):
+    """Test session reuse, reconnects, limits and keepalives"""
+
+    def setUp(self):
+        """Start a fake server"""
+        self.server = FakeIMAPServer().start()
+        self.addCleanup(self.server.stop)
+
+    def make_pool(self, **kwargs) -> IMAPConnectionPool:
+        """Create a pool for the fake server, closed after the test"""
+        account = EmailAccount(
+            USER, PASSWORD, host='127.0.0.1', port=self.server.port,
+            ssl=False
+        )
+        pool = IMAPConnectionPool(account, **kwargs)
+        self.addCleanup(pool.close)
+        return pool
+
+    def test_sessions_are_reused(self):
+        """Test consecutive jobs share one login"""
+        pool = self.make_pool()
+
+        for _ in range(3):
+            with pool.connection() as client:
+                client.select_folder('INBOX')
+
+        self.assertEqual(self.server.command_count('LOGIN'), 1)
+        self.assertEqual(self.server.command_count('SELECT'), 3)
+
+    def test_dead_session_is_replaced(self):
+        """Test a session dropped by the server reconnects on checkout"""
+        pool = self.make_pool(validate_after=0)
+        with pool.connection() as client:
+            client.noop()
+
+        self.server.drop_connections()
+        with pool.connection() as client:
+            client.select_folder('INBOX')
+
+        self.assertEqual(self.server.command_count('LOGIN'), 2)
+
+    def test_session_failing_during_a_job_is_discarded(self):
+        """Test connection errors do not return the session to the pool"""
+        pool = self.make_pool()
+        with self.assertRaises(OSError):
+            with pool.connection():
+                raise ConnectionResetError('connection lost')
+
+        with pool.connection() as client:
+            client.noop()
+
+        self.assertEqual(self.server.command_count('LOGIN'), 2)
+
+    def test_session_failing_with_wrapped_error_is_discarded(self):
+        """Test a connection error wrapped by the caller is not pooled"""
+        pool = self.make_pool()
+        with self.assertRaises(RuntimeError):
+            with pool.connection():
+                try:
+                    raise ConnectionResetError('connection lost')
+                except OSError as exc:
+                    raise RuntimeError('Failed to fetch emails') from exc
+
+        self.assertEqual(pool._idle, [])
+        with pool.connection() as client:
+            client.noop()
+
+        self.assertEqual(self.server.command_count('LOGIN'), 2)
+
+    def test_concurrent_sessions_are_capped(self):
+        """Test a job waits for a free session and can time out"""
+        pool = self.make_pool(max_connections=1)
+        checked_out = threading.Event()
+        release = threading.Event()
+
+        def hold():
+            with pool.connection():
+                checked_out.set()
+                release.wait(5)
+
+        holder = threading.Thread(target=hold)
+        holder.start()
+        checked_out.wait(5)
+        with self.assertRaises(RuntimeError):
+            with pool.connection(timeout=0.05):
+                pass
+        release.set()
+        holder.join()
+
+        with pool.connection(timeout=1) as client:
+            client.noop()
+        self.assertEqual(self.server.command_count('LOGIN'), 1)
+
+    def test_idle_sessions_get_keepalives(self):
+        """Test idle sessions are pinged with NOOP"""
+        pool = self.make_pool(keepalive_interval=0.05)
+        with pool.connection():
+            pass
+
+        deadline = time.monotonic() + 2
+        while not self.server.command_count('NOOP'):
+            self.assertLess(time.monotonic(), deadline)
+            time.sleep(0.01)
+
+    def test_keepalive_holds_a_slot(self):
+        """Test a job waits for a session being pinged instead of logging in"""
+        pinging = threading.Event()
+        release = threading.Event()
+
+        class SlowPingPool(IMAPConnectionPool):
+            def _is_alive(self, client):
+                pinging.set()
+                release.wait(5)
+                return super()._is_alive(client)
+
+        account = EmailAccount(
+            USER, PASSWORD, host='127.0.0.1', port=self.server.port,
+            ssl=False
+        )
+        pool = SlowPingPool(
+            account, max_connections=1, keepalive_interval=0.05,
+            validate_after=60
+        )
+        self.addCleanup(pool.close)
+        self.addCleanup(release.set)
+        with pool.connection():
+            pass
+
+        self.assertTrue(pinging.wait(2))
+        with self.assertRaises(RuntimeError):
+            with pool.connection(timeout=0.05):
+                pass
+        release.set()
+
+        with pool.connection(timeout=1) as client:
+            client.noop()
+        self.assertEqual(self.server.command_count('LOGIN'), 1)
+
+    def test_idle_sessions_are_capped(self):
+        """Test sessions returned beyond max_connections are logged out"""
+        pool = self.make_pool(max_connections=1)
+        first, second = pool._open(), pool._open()
+
+        pool._return(first)
+        pool._return(second)
+
+        self.assertEqual([client for client, _ in pool._idle], [second])
+        self.assertEqual(self.server.command_count('LOGOUT'), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
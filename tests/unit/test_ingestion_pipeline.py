@@ -0,0 +1,291 @@
+#!/usr/bin/env python3
+
+"""
+Unit tests for the staged fetch, parse and ledger ingestion pipeline
+"""
+
+import tempfile
+import threading
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from unittest.mock import patch
+from src.processors.attachment_store import content_hash
+from src.processors.email_processor import AttachmentBatch
+from src.processors.ingestion_index import IngestionIndex
+from src.processors.ingestion_pipeline import IngestionPipeline
+from src.processors.ledger_manager import LedgerManager
+from src.processors.pdf_parser import ReceiptParser
+from tests.fake_imap_server import EmailServerTestCase, build_message
+
+RECEIPT = (
+    Path(__file__).parent.parent.parent / 'data' / 'sample_data' /
+    'receipts' / 'receipt_01_walmart_supercenter.pdf'
+)
+
+DELAY = 0.02
+
+
+class FakeParser(ReceiptParser):
+    """Parser that takes DELAY per receipt and fails on 'bad' files"""
+
+    def __init__(self, delay: float = 0.0) -> None:
+        super().__init__()
+        self.delay = delay
+
+    def parse_receipt(self, payload: bytes, filename: str,
+                      sender: str = None) -> dict:
+        time.sleep(self.delay)
+        if filename.startswith('bad'):
+            raise ValueError('corrupt PDF')
+        amount = None if filename.startswith('blank') else '1.00'
+        return {
+            'amount': amount, 'merchant': sender or 'Shop', 'date': None,
+            'filename': filename
+        }
+
+
+class FakeLedger:
+    """Ledger that records commits and optionally slows them down"""
+
+    def __init__(self, events: list, delay: float = 0.0) -> None:
+        self.events = events
+        self.delay = delay
+        self.pending = None
+        self.keys = set()
+        self.gate = threading.Event()
+        self.gate.set()
+
+    @contextmanager
+    def batch(self):
+        self.gate.wait()
+        self.pending = []
+        yield self
+        time.sleep(self.delay)
+        self.events.append(('commit', [r['filename'] for r in self.pending]))
+        self.keys.update(
+            (r.get('message_id'), r.get('attachment')) for r in self.pending
+        )
+        self.pending = None
+
+    def add_transaction(self, receipt_data: dict) -> None:
+        self.pending.append(receipt_data)
+
+    def is_ingested(self, message_id: str, attachment: str) -> bool:
+        return (message_id, attachment) in self.keys
+
+
+class TestIngestionPipeline(unittest.TestCase):
+    """Test the stages overlap while preserving commit order"""
+
+    def setUp(self):
+        """Record ledger commits and checkpoints in one event list"""
+        self.events = []
+        self.fetched = 0
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        self.index = IngestionIndex(Path(tmp_dir.name) / 'ingested.sqlite3')
+
+    def batches(self, count: int, size: int = 2, delay: float = 0.0,
+                fail_after: int = None):
+        """Yield batches of receipts, checkpointing into events"""
+        for index in range(count):
+            if index == fail_after:
+                raise RuntimeError('connection lost')
+            time.sleep(delay)
+            self.fetched += 1
+            yield AttachmentBatch(
+                [
+                    (f'{index}-{n}.pdf', b'%PDF')
+                    for n in range(size)
+                ],
+                lambda index=index: self.events.append(('checkpoint', index))
+            )
+
+    def pipeline(self, ledger=None, parser=None, parse_workers=2,
+                 **kwargs):
+        """A pipeline over the fake parser and ledger, parsing in threads"""
+        executor = ThreadPoolExecutor(max_workers=parse_workers)
+        self.addCleanup(executor.shutdown)
+        return IngestionPipeline(
+            parser or FakeParser(), ledger or FakeLedger(self.events),
+            executor=executor, index=self.index, **kwargs
+        )
+
+    def test_commits_batches_in_order_before_checkpoints(self):
+        """Test each batch is committed, then checkpointed, in order"""
+        added = self.pipeline().run(self.batches(3))
+
+        self.assertEqual(len(added), 6)
+        self.assertEqual(self.events, [
+            ('commit', ['0-0.pdf', '0-1.pdf']), ('checkpoint', 0),
+            ('commit', ['1-0.pdf', '1-1.pdf']), ('checkpoint', 1),
+            ('commit', ['2-0.pdf', '2-1.pdf']), ('checkpoint', 2)
+        ])
+
+    def test_stages_overlap(self):
+        """Test total time tracks the slowest stage, not the sum"""
+        count, size = 8, 4
+        sequential = count * (DELAY + size * DELAY + DELAY)
+
+        started = time.monotonic()
+        self.pipeline(
+            FakeLedger(self.events, DELAY), FakeParser(DELAY),
+            parse_workers=size
+        ).run(self.batches(count, size, DELAY))
+        elapsed = time.monotonic() - started
+
+        self.assertLess(elapsed, sequential / 2)
+
+    def test_backpressure_bounds_fetching(self):
+        """Test fetching stops a few batches ahead of a stalled ledger"""
+        ledger = FakeLedger(self.events)
+        ledger.gate.clear()
+        pipeline = self.pipeline(ledger, queue_batches=2)
+        thread = threading.Thread(
+            target=pipeline.run, args=(self.batches(50),)
+        )
+        thread.start()
+        time.sleep(0.3)
+
+        # Two queued, one taken by the ledger, one waiting to be queued
+        self.assertLessEqual(self.fetched, 4)
+        ledger.gate.set()
+        thread.join(5)
+        self.assertEqual(self.fetched, 50)
+
+    def test_parse_failure_skips_receipt(self):
+        """Test a receipt that fails to parse does not stop the batch"""
+        batch = AttachmentBatch([
+            ('bad.pdf', b'%PDF'),
+            ('blank.pdf', b'%PDF'),
+            ('good.pdf', b'%PDF')
+        ])
+
+        added = self.pipeline().run([batch])
+
+        self.assertEqual([name for name, _ in added], ['good.pdf'])
+
+    def test_links_stored_attachment(self):
+        """Test receipts parsed from memory carry their content hash"""
+        added = self.pipeline().run([AttachmentBatch([('a.pdf', b'%PDF a')])])
+
+        self.assertEqual(added[0][1]['attachment'], content_hash(b'%PDF a'))
+
+    def test_passes_senders_to_parser(self):
+        """Test receipts are parsed knowing who mailed them"""
+        batch = AttachmentBatch(
+            [('a.pdf', b'%PDF a'), ('b.pdf', b'%PDF b')],
+            senders=['orders@shop.com', None]
+        )
+
+        added = self.pipeline().run([batch])
+
+        self.assertEqual(
+            [receipt['merchant'] for _, receipt in added],
+            ['orders@shop.com', 'Shop']
+        )
+
+    def test_skips_ingested_attachments(self):
+        """Test a re-run adds nothing and duplicates in a batch add once"""
+        ledger = FakeLedger(self.events)
+
+        def batch():
+            return AttachmentBatch(
+                [('a.pdf', b'%PDF a'), ('a.pdf', b'%PDF a'),
+                 ('b.pdf', b'%PDF b')],
+                message_ids=['<1@x>', '<1@x>', '<2@x>']
+            )
+
+        first = self.pipeline(ledger).run([batch()])
+        second = self.pipeline(ledger).run([batch()])
+
+        self.assertEqual([name for name, _ in first], ['a.pdf', 'b.pdf'])
+        self.assertEqual(first[0][1]['message_id'], '<1@x>')
+        self.assertEqual(second, [])
+        self.assertEqual(
+            self.index.ingested_filenames(['<1@x>', '<2@x>', '<3@x>']),
+            {'<1@x>': {'a.pdf'}, '<2@x>': {'b.pdf'}}
+        )
+
+    def test_fetch_failure_raises_after_committing(self):
+        """Test batches fetched before a failure are still committed"""
+        with self.assertRaises(RuntimeError):
+            self.pipeline().run(self.batches(3, fail_after=2))
+
+        self.assertEqual(self.events[-1], ('checkpoint', 1))
+
+    def test_ledger_failure_stops_fetching(self):
+        """Test a failed commit stops the fetch stage without checkpoint"""
+        ledger = FakeLedger(self.events)
+        ledger.add_transaction = lambda receipt_data: 1 / 0
+
+        with self.assertRaises(ZeroDivisionError):
+            self.pipeline(ledger).run(self.batches(50))
+
+        self.assertLess(self.fetched, 50)
+        self.assertNotIn(('checkpoint', 0), self.events)
+
+
+class TestIdempotentIngestion(EmailServerTestCase):
+    """Test re-runs over the same mail neither download nor add again"""
+
+    def setUp(self):
+        """Ingest into a temporary ledger"""
+        super().setUp()
+        ledger_patch = patch(
+            'src.processors.ledger_manager.BEANCOUNT_FILE',
+            self.attachments_dir / 'ledger.beancount'
+        )
+        ledger_patch.start()
+        self.addCleanup(ledger_patch.stop)
+        self.ledger = LedgerManager()
+        self.index = IngestionIndex(self.attachments_dir / 'ingested.sqlite3')
+        for day in (1, 2):
+            self.server.add_message(build_message(
+                f'Receipt {day}', datetime(2024, 1, day),
+                [(f'receipt{day}.pdf', RECEIPT.read_bytes())]
+            ))
+
+    def ingest(self) -> list:
+        """Run unread ingestion over the fake mailbox"""
+        processor = self.connect()
+        processor.ingested = self.index
+        pipeline = IngestionPipeline(
+            ReceiptParser(), self.ledger, index=self.index
+        )
+        return pipeline.run(processor.iter_pdf_attachments())
+
+    def test_rerun_after_marking_unread(self):
+        """Test mail marked unread again is skipped before download"""
+        self.assertEqual(len(self.ingest()), 2)
+        ledger_text = (self.attachments_dir / 'ledger.beancount').read_text()
+        for msg in self.server.folders['INBOX']:
+            msg.flags.clear()
+        fetches = self.server.command_count('FETCH')
+
+        self.assertEqual(self.ingest(), [])
+        # Only the BODYSTRUCTURE and ENVELOPE fetch, no download
+        self.assertEqual(self.server.command_count('FETCH') - fetches, 1)
+        self.assertEqual(
+            (self.attachments_dir / 'ledger.beancount').read_text(),
+            ledger_text
+        )
+        self.assertIn('message_id: "<', ledger_text)
+
+    def test_ledger_guards_against_lost_index(self):
+        """Test the ledger metadata still prevents duplicates"""
+        self.ingest()
+        for msg in self.server.folders['INBOX']:
+            msg.flags.clear()
+        self.index = IngestionIndex(self.attachments_dir / 'other.sqlite3')
+
+        self.assertEqual(self.ingest(), [])
+        self.assertEqual(len(self.ledger.get_transactions()), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+
+"""
+Unit tests for ledger transaction queries
+"""
+
+import unittest
+from datetime import date
+from decimal import Decimal
+from src.processors.ledger_index import LedgerIndex
+
+
+def make_transaction(day: int, payee: str, amount: str) -> dict:
+    """Build a transaction row as returned by get_transactions"""
+    return {
+        'date': date(2024, 1, day),
+        'payee': payee,
+        'amount': amount,
+        'currency': 'USD'
+    }
+
+
+class TestLedgerIndex(unittest.TestCase):
+    """Test filtering and pagination over the ledger index"""
+
+    def setUp(self):
+        """Build an index over rows stored out of date order"""
+        self.index = LedgerIndex([
+            make_transaction(17, 'Amazon.com', '23.99'),
+            make_transaction(15, 'Walmart Supercenter', '45.67'),
+            make_transaction(16, 'Starbucks Coffee', '4.50'),
+            make_transaction(16, 'Starbucks Coffee', '5.25'),
+            make_transaction(19, 'Hardware Store', '89.15'),
+            make_transaction(18, 'Amazon Fresh', '61.20')
+        ])
+
+    def payees(self, result: dict) -> list:
+        """Get the payees of a query result in order"""
+        return [tx['payee'] for tx in result['transactions']]
+
+    def test_no_filters_returns_date_order(self):
+        """Test an unfiltered query returns every row sorted by date"""
+        result = self.index.query()
+
+        self.assertEqual(result['total'], 6)
+        self.assertEqual(result['total_amount'], '229.76')
+        self.assertEqual(
+            [tx['date'].day for tx in result['transactions']],
+            [15, 16, 16, 17, 18, 19]
+        )
+        self.assertIsNone(result['next_cursor'])
+
+    def test_date_range(self):
+        """Test start and end dates are inclusive"""
+        result = self.index.query(
+            start_date=date(2024, 1, 16), end_date=date(2024, 1, 17)
+        )
+
+        self.assertEqual(
+            self.payees(result),
+            ['Starbucks Coffee', 'Starbucks Coffee', 'Amazon.com']
+        )
+        self.assertEqual(result['total_amount'], '33.74')
+
+    def test_payee_prefix_is_case_insensitive(self):
+        """Test payee prefix matching ignores case"""
+        result = self.index.query(payee_prefix='amazon')
+
+        self.assertEqual(self.payees(result), ['Amazon.com', 'Amazon Fresh'])
+
+    def test_amount_range_with_payee(self):
+        """Test amount bounds combine with other filters"""
+        result = self.index.query(
+            payee_prefix='Starbucks', min_amount=Decimal('5.00')
+        )
+
+        self.assertEqual(result['total'], 1)
+        self.assertEqual(result['transactions'][0]['amount'], '5.25')
+
+    def test_descending_with_offset(self):
+        """Test descending order and offset pagination"""
+        result = self.index.query(descending=True, limit=2, offset=1)
+
+        self.assertEqual(self.payees(result), ['Amazon Fresh', 'Amazon.com'])
+        self.assertEqual(result['total'], 6)
+
+    def test_cursor_pagination_visits_every_row_once(self):
+        """Test following cursors pages through all rows in both orders"""
+        for descending in (False, True):
+            seen = []
+            cursor = None
+            while True:
+                result = self.index.query(
+                    descending=descending, limit=4, cursor=cursor
+                )
+                seen.extend(result['transactions'])
+                cursor = result['next_cursor']
+                if cursor is None:
+                    break
+
+            expected = self.index.query(descending=descending)
+            self.assertEqual(seen, expected['transactions'])
+
+    def test_cursor_with_filters(self):
+        """Test cursors continue a filtered query"""
+        first = self.index.query(
+            min_amount=Decimal('20'), max_amount=Decimal('70'), limit=2
+        )
+        second = self.index.query(
+            min_amount=Decimal('20'), max_amount=Decimal('70'), limit=2,
+            cursor=first['next_cursor']
+        )
+
+        self.assertEqual(
+            self.payees(first), ['Walmart Supercenter', 'Amazon.com']
+        )
+        self.assertEqual(self.payees(second), ['Amazon Fresh'])
+        self.assertIsNone(second['next_cursor'])
+
+    def test_invalid_cursor(self):
+        """Test malformed cursors are rejected"""
+        with self.assertRaises(ValueError):
+            self.index.query(cursor='not-a-cursor')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,344 @@
+#!/usr/bin/env python3
+
+"""
+Unit tests for ledger manager persistence
+"""
+
+import tempfile
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+from src.processors import ledger_manager as ledger_module
+from src.processors.ledger_manager import LedgerManager, get_ledger_manager
+from src.processors.ledger_snapshot import snapshot_path
+
+
+class TestLedgerManagerPersistence(unittest.TestCase):
+    """Test append-only writes and compaction"""
+
+    def setUp(self):
+        """Point the ledger manager at a temporary ledger file"""
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.ledger_file = Path(self.tmp_dir.name) / 'ledger.beancount'
+        self.file_patch = patch(
+            'src.processors.ledger_manager.BEANCOUNT_FILE', self.ledger_file
+        )
+        self.file_patch.start()
+
+    def tearDown(self):
+        """Remove the temporary ledger file"""
+        self.file_patch.stop()
+        self.tmp_dir.cleanup()
+
+    def test_first_write_includes_account_openings(self):
+        """Test the first transaction writes the full ledger"""
+        ledger_manager = LedgerManager()
+        ledger_manager.add_transaction({
+            'amount': '4.50',
+            'date': '01/16/2024',
+            'merchant': 'Starbucks Coffee'
+        })
+
+        content = self.ledger_file.read_text()
+        self.assertIn('open Assets:Checking', content)
+        self.assertIn('open Expenses:Receipts', content)
+        self.assertIn('"Starbucks Coffee"', content)
+
+    def test_add_transaction_appends_without_rewriting(self):
+        """Test later transactions are appended to the existing file"""
+        ledger_manager = LedgerManager()
+        ledger_manager.add_transaction({
+            'amount': '45.67',
+            'date': '01/15/2024',
+            'merchant': 'Walmart Supercenter'
+        })
+        before = self.ledger_file.read_text()
+
+        with patch.object(ledger_manager, '_save_ledger') as mock_save:
+            ledger_manager.add_transaction({
+                'amount': '4.50',
+                'date': '01/16/2024',
+                'merchant': 'Starbucks Coffee'
+            })
+            mock_save.assert_not_called()
+
+        after = self.ledger_file.read_text()
+        self.assertTrue(after.startswith(before))
+        self.assertIn('"Starbucks Coffee"', after[len(before):])
+
+    def test_append_after_missing_trailing_newline(self):
+        """Test appending to a file without a trailing newline"""
+        self.ledger_file.write_text(
+            '2024-01-15 * "Walmart Supercenter" "Receipt from email"\n'
+            '  Expenses:Receipts   45.67 USD\n'
+            '  Assets:Checking    -45.67 USD'
+        )
+        ledger_manager = LedgerManager()
+        ledger_manager.add_transaction({
+            'amount': '4.50',
+            'date': '01/16/2024',
+            'merchant': 'Starbucks Coffee'
+        })
+
+        reloaded = LedgerManager()
+        payees = [tx['payee'] for tx in reloaded.get_transactions()]
+        self.assertEqual(payees, ['Walmart Supercenter', 'Starbucks Coffee'])
+
+    def test_compact_rewrites_in_date_order(self):
+        """Test compaction sorts entries canonically"""
+        ledger_manager = LedgerManager()
+        for merchant, date in [('Later', '02/01/2024'),
+                               ('Earlier', '01/01/2024')]:
+            ledger_manager.add_transaction({
+                'amount': '1.00',
+                'date': date,
+                'merchant': merchant
+            })
+
+        ledger_manager.compact()
+
+        reloaded = LedgerManager()
+        payees = [tx['payee'] for tx in reloaded.get_transactions()]
+        self.assertEqual(payees, ['Earlier', 'Later'])
+        self.assertFalse(
+            self.ledger_file.with_suffix('.beancount.tmp').exists()
+        )
+
+    def test_compact_keeps_every_directive(self):
+        """Test options, balances and prices survive compaction"""
+        self.ledger_file.write_text(
+            'option "operating_currency" "USD"\n'
+            '2024-01-01 open Assets:Checking USD\n'
+            '2024-01-01 open Expenses:Receipts USD\n'
+            '2024-02-01 * "Later" "Receipt from email"\n'
+            '  Expenses:Receipts   1.00 USD\n'
+            '  Assets:Checking    -1.00 USD\n'
+            '2024-01-15 price EUR 1.10 USD\n'
+            '2024-01-31 balance Assets:Checking  0.00 USD\n'
+        )
+
+        LedgerManager().compact()
+
+        content = self.ledger_file.read_text()
+        self.assertTrue(content.startswith('option "operating_currency"'))
+        self.assertIn('2024-01-15 price EUR', content)
+        self.assertIn('2024-01-31 balance Assets:Checking', content)
+        self.assertLess(content.index('balance'), content.index('"Later"'))
+        reloaded = LedgerManager()
+        self.assertEqual(reloaded.parse_errors, [])
+        self.assertEqual(len(reloaded.entries), 5)
+
+    def test_compact_refuses_after_parse_errors(self):
+        """Test a ledger that does not parse is left untouched"""
+        original = (
+            '2024-01-01 open Assets:Checking USD\n'
+            '2024-01-15 * "Walmart Supercenter" "Receipt from email"\n'
+            '  Expenses:Receipts   45.67 USD\n'
+            '  Assets:Checking    -45.67 USD\n'
+            '2024-01-16 this is not beancount\n'
+        )
+        self.ledger_file.write_text(original)
+
+        ledger_manager = LedgerManager()
+        self.assertTrue(ledger_manager.parse_errors)
+        with self.assertRaises(ValueError):
+            ledger_manager.compact()
+
+        self.assertEqual(self.ledger_file.read_text(), original)
+
+
+class TestLedgerManagerBatch(unittest.TestCase):
+    """Test batched transaction ingestion"""
+
+    def setUp(self):
+        """Point the ledger manager at a temporary ledger file"""
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.ledger_file = Path(self.tmp_dir.name) / 'ledger.beancount'
+        self.file_patch = patch(
+            'src.processors.ledger_manager.BEANCOUNT_FILE', self.ledger_file
+        )
+        self.file_patch.start()
+        self.receipts = [
+            {'amount': '45.67', 'date': '01/15/2024', 'merchant': 'Walmart'},
+            {'amount': None, 'date': '01/16/2024', 'merchant': 'Unreadable'},
+            {'amount': '$23.99', 'date': '01/17/2024', 'merchant': 'Amazon'}
+        ]
+
+    def tearDown(self):
+        """Remove the temporary ledger file"""
+        self.file_patch.stop()
+        self.tmp_dir.cleanup()
+
+    def test_add_transactions_single_write(self):
+        """Test add_transactions persists all receipts in one write"""
+        ledger_manager = LedgerManager()
+        with patch.object(
+            ledger_manager, '_append_entries',
+            wraps=ledger_manager._append_entries
+        ) as mock_append:
+            added = ledger_manager.add_transactions(self.receipts)
+
+        self.assertEqual(added, 2)
+        self.assertEqual(mock_append.call_count, 1)
+        payees = [tx['payee'] for tx in LedgerManager().get_transactions()]
+        self.assertEqual(payees, ['Walmart', 'Amazon'])
+
+    def test_add_transactions_validates_before_writing(self):
+        """Test an invalid receipt aborts the batch before any write"""
+        ledger_manager = LedgerManager()
+        receipts = self.receipts + [
+            {'amount': 'not-a-number', 'merchant': 'Broken'}
+        ]
+
+        with self.assertRaises(ValueError):
+            ledger_manager.add_transactions(receipts)
+
+        self.assertFalse(self.ledger_file.exists())
+        self.assertEqual(ledger_manager.get_transactions(), [])
+
+    def test_batch_context_commits_on_exit(self):
+        """Test the batch context defers writes until it exits"""
+        ledger_manager = LedgerManager()
+        with ledger_manager.batch():
+            for receipt_data in self.receipts:
+                ledger_manager.add_transaction(receipt_data)
+            self.assertFalse(self.ledger_file.exists())
+
+        self.assertEqual(len(LedgerManager().get_transactions()), 2)
+
+    def test_batch_context_discards_on_error(self):
+        """Test the batch context drops pending transactions on error"""
+        ledger_manager = LedgerManager()
+        with self.assertRaises(RuntimeError):
+            with ledger_manager.batch():
+                ledger_manager.add_transaction(self.receipts[0])
+                raise RuntimeError('parse failed')
+
+        self.assertFalse(self.ledger_file.exists())
+        self.assertEqual(ledger_manager.get_transactions(), [])
+
+    def test_attachment_metadata_round_trip(self):
+        """Test stored attachment hashes are kept as transaction metadata"""
+        sha256 = 'ab' * 32
+        ledger_manager = LedgerManager()
+        ledger_manager.add_transaction(
+            dict(self.receipts[0], attachment=sha256)
+        )
+        ledger_manager.add_transaction(self.receipts[2])
+
+        content = self.ledger_file.read_text()
+        self.assertIn(f'attachment: "{sha256}"', content)
+        self.assertEqual(LedgerManager().referenced_attachments(), {sha256})
+
+
+class TestLedgerManagerCache(unittest.TestCase):
+    """Test the shared ledger manager and its invalidation"""
+
+    def setUp(self):
+        """Point the ledger manager at a temporary ledger file"""
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.ledger_file = Path(self.tmp_dir.name) / 'ledger.beancount'
+        self.file_patch = patch(
+            'src.processors.ledger_manager.BEANCOUNT_FILE', self.ledger_file
+        )
+        self.file_patch.start()
+        self.shared_patch = patch.object(
+            ledger_module, '_shared_manager', None
+        )
+        self.shared_patch.start()
+
+    def tearDown(self):
+        """Remove the temporary ledger file"""
+        self.shared_patch.stop()
+        self.file_patch.stop()
+        self.tmp_dir.cleanup()
+
+    def test_shared_manager_is_reused(self):
+        """Test the shared manager is only parsed once for an unchanged file"""
+        LedgerManager().add_transaction(
+            {'amount': '4.50', 'date': '01/16/2024', 'merchant': 'Starbucks'}
+        )
+        first = get_ledger_manager()
+
+        with patch.object(first, '_load_ledger') as mock_load:
+            second = get_ledger_manager()
+            mock_load.assert_not_called()
+
+        self.assertIs(first, second)
+        self.assertEqual(len(second.get_transactions()), 1)
+
+    def test_own_writes_do_not_trigger_reload(self):
+        """Test writes through the shared manager keep the cache valid"""
+        shared = get_ledger_manager()
+        shared.add_transaction(
+            {'amount': '4.50', 'date': '01/16/2024', 'merchant': 'Starbucks'}
+        )
+
+        with patch.object(shared, '_load_ledger') as mock_load:
+            self.assertFalse(shared.refresh())
+            mock_load.assert_not_called()
+
+    def test_external_writes_trigger_reload(self):
+        """Test writes by another manager invalidate the shared one"""
+        shared = get_ledger_manager()
+        LedgerManager().add_transaction(
+            {'amount': '45.67', 'date': '01/15/2024', 'merchant': 'Walmart'}
+        )
+
+        transactions = get_ledger_manager().get_transactions()
+        self.assertEqual([tx['payee'] for tx in transactions], ['Walmart'])
+        self.assertIs(get_ledger_manager(), shared)
+
+
+class TestLedgerSnapshot(unittest.TestCase):
+    """Test loading parsed entries from the binary snapshot"""
+
+    def setUp(self):
+        """Point the ledger manager at a temporary ledger file"""
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.ledger_file = Path(self.tmp_dir.name) / 'ledger.beancount'
+        self.file_patch = patch(
+            'src.processors.ledger_manager.BEANCOUNT_FILE', self.ledger_file
+        )
+        self.file_patch.start()
+        LedgerManager().add_transactions([
+            {'amount': '45.67', 'date': '01/15/2024', 'merchant': 'Walmart'},
+            {'amount': '4.50', 'date': '01/16/2024', 'merchant': 'Starbucks'}
+        ])
+
+    def tearDown(self):
+        """Remove the temporary ledger file"""
+        self.file_patch.stop()
+        self.tmp_dir.cleanup()
+
+    def test_valid_snapshot_skips_text_parse(self):
+        """Test a matching snapshot is used instead of parsing"""
+        LedgerManager()
+        self.assertTrue(snapshot_path(self.ledger_file).exists())
+
+        with patch('beancount.parser.parser.parse_file') as mock_parse:
+            transactions = LedgerManager().get_transactions()
+            mock_parse.assert_not_called()
+
+        payees = [tx['payee'] for tx in transactions]
+        self.assertEqual(payees, ['Walmart', 'Starbucks'])
+
+    def test_stale_snapshot_falls_back_to_parse(self):
+        """Test a snapshot of older file contents is ignored"""
+        LedgerManager().add_transaction(
+            {'amount': '23.99', 'date': '01/17/2024', 'merchant': 'Amazon'}
+        )
+
+        payees = [tx['payee'] for tx in LedgerManager().get_transactions()]
+        self.assertEqual(payees, ['Walmart', 'Starbucks', 'Amazon'])
+
+    def test_corrupt_snapshot_falls_back_to_parse(self):
+        """Test an unreadable snapshot is ignored"""
+        snapshot_path(self.ledger_file).write_bytes(b'not a pickle')
+
+        payees = [tx['payee'] for tx in LedgerManager().get_transactions()]
+        self.assertEqual(payees, ['Walmart', 'Starbucks'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,256 @@
+#!/usr/bin/env python3
+
+"""
+Unit tests for the time- and memory-bounded parse worker pool
+"""
+
+import multiprocessing
+import os
+import tempfile
+import time
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+from src.processors.parse_sandbox import (
+    ParseMemoryError, ParseTimeout, SandboxPool, WorkerCrashed,
+    WorkerUnavailable, resource
+)
+from src.processors.pdf_parser import ReceiptParser
+from src.processors.quarantine import Quarantine, Quarantined
+
+RECEIPT = (
+    Path(__file__).parent.parent.parent / 'data' / 'sample_data' /
+    'receipts' / 'receipt_01_walmart_supercenter.pdf'
+)
+
+
+def worker_pid() -> int:
+    return os.getpid()
+
+
+def hang(seconds: float) -> None:
+    time.sleep(seconds)
+
+
+def allocate(megabytes: int) -> int:
+    return len(bytearray(megabytes * 1024 * 1024))
+
+
+def crash() -> None:
+    os._exit(3)
+
+
+def fail() -> None:
+    raise ValueError('corrupt PDF')
+
+
+def crash_once(marker: str) -> int:
+    """Crash the first worker it runs on, then succeed"""
+    if not os.path.exists(marker):
+        Path(marker).touch()
+        os._exit(3)
+    return os.getpid()
+
+
+class Odd(Exception):
+    """Pickles, but does not unpickle: args is not (a, b)"""
+
+    def __init__(self, a, b):
+        super().__init__(f'{a} {b}')
+
+
+def fail_oddly() -> None:
+    raise Odd('corrupt', 'PDF')
+
+
+class HangingParser(ReceiptParser):
+    """Parser that never finishes 'slow' files"""
+
+    def parse_receipt(self, source, filename=None, sender=None):
+        if filename.startswith('slow'):
+            time.sleep(60)
+        return super().parse_receipt(source, filename, sender)
+
+
+class GreedyParser(ReceiptParser):
+    """Parser that runs out of memory extracting any page"""
+
+    def _extract_lazy(self, pages, max_pages):
+        allocate(2048)
+        return super()._extract_lazy(pages, max_pages)
+
+
+def sandbox(**kwargs) -> SandboxPool:
+    """A one-worker pool started like the shared parse pool"""
+    methods = multiprocessing.get_all_start_methods()
+    context = multiprocessing.get_context(
+        'forkserver' if 'forkserver' in methods else 'spawn'
+    )
+    return SandboxPool(1, mp_context=context, **kwargs)
+
+
+class TestSandboxPool(unittest.TestCase):
+    """Test a worker over its limits is replaced and the next task runs"""
+
+    def setUp(self):
+        """One worker, so every task reuses or replaces the same slot"""
+        self.pool = sandbox(timeout=1, memory_limit_mb=512)
+        self.addCleanup(self.pool.shutdown)
+        self.pid = self.pool.submit(worker_pid).result()
+
+    def test_worker_is_reused(self):
+        """Test a worker stays warm between tasks"""
+        self.assertEqual(self.pool.submit(worker_pid).result(), self.pid)
+
+    def test_errors_keep_the_worker(self):
+        """Test an exception raised by a task is returned as is"""
+        with self.assertRaises(ValueError):
+            self.pool.submit(fail).result()
+
+        self.assertEqual(self.pool.submit(worker_pid).result(), self.pid)
+
+    def test_timeout_recycles_worker(self):
+        """Test a hanging task is killed after the timeout"""
+        started = time.monotonic()
+        with self.assertRaises(ParseTimeout):
+            self.pool.submit(hang, 30).result()
+
+        self.assertLess(time.monotonic() - started, 10)
+        self.assertNotEqual(self.pool.submit(worker_pid).result(), self.pid)
+
+    @unittest.skipIf(resource is None, 'needs the resource module')
+    def test_memory_limit_recycles_worker(self):
+        """Test a task allocating past the limit fails, not the host"""
+        with self.assertRaises(ParseMemoryError):
+            self.pool.submit(allocate, 1024).result()
+
+        self.assertEqual(self.pool.submit(allocate, 8).result(), 8 << 20)
+
+    def test_crash_recycles_worker(self):
+        """Test a worker that dies fails only its task"""
+        with self.assertRaises(WorkerCrashed):
+            self.pool.submit(crash).result()
+
+        self.assertNotEqual(self.pool.submit(worker_pid).result(), self.pid)
+
+    def test_failed_task_is_retried_on_a_fresh_worker(self):
+        """Test a task that crashed a worker once still succeeds"""
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            marker = str(Path(tmp_dir) / 'crashed')
+            pid = self.pool.submit(crash_once, marker).result(timeout=10)
+
+        self.assertNotEqual(pid, self.pid)
+
+    def test_unpicklable_error_fails_only_its_task(self):
+        """Test a result the pool cannot unpickle fails only its task"""
+        with self.assertRaises(RuntimeError):
+            self.pool.submit(fail_oddly).result(timeout=10)
+
+        self.assertEqual(self.pool.submit(worker_pid).result(), self.pid)
+
+    def test_worker_start_failure_fails_the_task(self):
+        """Test a worker that cannot start fails the task, not the slot"""
+        pool = sandbox()
+        self.addCleanup(pool.shutdown)
+        with patch.object(
+            pool, '_start_worker', side_effect=OSError('no more processes')
+        ):
+            with self.assertRaises(WorkerUnavailable):
+                pool.submit(worker_pid).result(timeout=10)
+
+        self.assertIsInstance(pool.submit(worker_pid).result(), int)
+
+
+class TestQuarantine(unittest.TestCase):
+    """Test PDFs over the limits are quarantined and skipped afterwards"""
+
+    def setUp(self):
+        """Parse into a temporary quarantine on a fast-timeout sandbox"""
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        self.quarantine = Quarantine(Path(tmp_dir.name))
+        with patch('src.processors.pdf_parser.RECEIPT_CACHE_MAX_MB', 0):
+            self.parser = HangingParser(quarantine=self.quarantine)
+        self.pool = sandbox(timeout=1)
+        self.addCleanup(self.pool.shutdown)
+        self.payload = RECEIPT.read_bytes()
+
+    def parse(self, *sources):
+        return list(self.parser.parse_many(sources, executor=self.pool))
+
+    def test_batch_continues(self):
+        """Test a hanging PDF is quarantined and the rest still parse"""
+        results = self.parse(
+            ('slow.pdf', b'%PDF slow'), ('good.pdf', self.payload)
+        )
+
+        self.assertIsInstance(results[0].error, ParseTimeout)
+        self.assertEqual(results[1].receipt['amount'], '$53.66')
+        [(sha256, filename, reason, _)] = self.quarantine.entries()
+        self.assertEqual(filename, 'slow.pdf')
+        self.assertIn('longer than 1s', reason)
+        self.assertEqual(
+            self.quarantine.path(sha256).read_bytes(), b'%PDF slow'
+        )
+
+    def test_quarantined_are_not_parsed_again(self):
+        """Test a re-run fails fast until the PDF is released"""
+        self.parse(('slow.pdf', b'%PDF slow'))
+
+        started = time.monotonic()
+        [result] = self.parse(('slow-again.pdf', b'%PDF slow'))
+
+        self.assertIsInstance(result.error, Quarantined)
+        self.assertLess(time.monotonic() - started, 1)
+
+        sha256 = self.quarantine.entries()[0][0]
+        self.assertTrue(self.quarantine.release(sha256))
+        self.assertEqual(self.quarantine.entries(), [])
+
+    def test_quarantined_paths_are_not_parsed_again(self):
+        """Test a quarantined PDF passed as a file is skipped too"""
+        self.parse(('slow.pdf', b'%PDF slow'))
+        path = self.quarantine.root / 'copy' / 'slow-copy.pdf'
+        path.parent.mkdir()
+        path.write_bytes(b'%PDF slow')
+
+        started = time.monotonic()
+        [result] = self.parse(path)
+
+        self.assertIsInstance(result.error, Quarantined)
+        self.assertLess(time.monotonic() - started, 1)
+
+    def test_unavailable_workers_do_not_quarantine(self):
+        """Test PDFs are not blamed for a worker that cannot start"""
+        with patch.object(
+            self.pool, '_start_worker', side_effect=OSError('no fork server')
+        ):
+            [result] = self.parse(('good.pdf', self.payload))
+
+        self.assertIsInstance(result.error, WorkerUnavailable)
+        self.assertEqual(self.quarantine.entries(), [])
+        [result] = self.parse(('good.pdf', self.payload))
+        self.assertEqual(result.receipt['amount'], '$53.66')
+
+    @unittest.skipIf(resource is None, 'needs the resource module')
+    def test_memory_limit_in_extraction(self):
+        """Test running out of memory in pdfplumber is not an OCR fallback"""
+        with patch('src.processors.pdf_parser.RECEIPT_CACHE_MAX_MB', 0):
+            parser = GreedyParser(quarantine=self.quarantine)
+        pool = sandbox(timeout=30, memory_limit_mb=512)
+        self.addCleanup(pool.shutdown)
+        pid = pool.submit(worker_pid).result()
+
+        [result] = parser.parse_many(
+            [('big.pdf', self.payload)], executor=pool
+        )
+
+        self.assertIsInstance(result.error, ParseMemoryError)
+        [(_, filename, reason, _)] = self.quarantine.entries()
+        self.assertEqual(filename, 'big.pdf')
+        self.assertIn('512 MB', reason)
+        self.assertNotEqual(pool.submit(worker_pid).result(), pid)
+
+
+if __name__ == '__main__':
+    unittest.main()
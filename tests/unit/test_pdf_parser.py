@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+
+"""
+Unit tests for receipt PDF parsing
+"""
+
+import io
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+from src.processors.pdf_parser import ReceiptParser, get_parse_pool
+
+RECEIPT = (
+    Path(__file__).parent.parent.parent / 'data' / 'sample_data' /
+    'receipts' / 'receipt_01_walmart_supercenter.pdf'
+)
+
+
+class TestReceiptSources(unittest.TestCase):
+    """Test receipts parse the same from disk and from memory"""
+
+    def setUp(self):
+        """Parse the sample receipt from its path, bypassing the cache"""
+        with patch('src.processors.pdf_parser.RECEIPT_CACHE_MAX_MB', 0):
+            self.parser = ReceiptParser()
+        self.expected = self.parser.parse_receipt(RECEIPT)
+
+    def test_parses_path(self):
+        """Test fields are extracted and named after the file"""
+        self.assertEqual(self.expected['amount'], '$53.66')
+        self.assertEqual(self.expected['merchant'], 'WALMART SUPERCENTER')
+        self.assertEqual(self.expected['filename'], RECEIPT.name)
+
+    def test_parses_bytes(self):
+        """Test in-memory payloads take the filename they are given"""
+        receipt = self.parser.parse_receipt(RECEIPT.read_bytes(), RECEIPT.name)
+
+        self.assertEqual(receipt, self.expected)
+
+    def test_parses_buffer(self):
+        """Test binary buffers are read without a temporary file"""
+        buffer = io.BytesIO(RECEIPT.read_bytes())
+
+        receipt = self.parser.parse_receipt(buffer, RECEIPT.name)
+
+        self.assertEqual(receipt, self.expected)
+
+    def test_invalid_payload(self):
+        """Test bytes that are not a PDF yield no fields"""
+        receipt = self.parser.parse_receipt(b'not a pdf', 'broken.pdf')
+
+        self.assertIsNone(receipt['amount'])
+        self.assertEqual(receipt['filename'], 'broken.pdf')
+
+
+class FakePage:
+    """Page whose text is given, recording when it is extracted"""
+
+    def __init__(self, index: int, text: str, extracted: list) -> None:
+        self.index = index
+        self.text = text
+        self.extracted = extracted
+
+    def extract_text(self) -> str:
+        self.extracted.append(self.index)
+        return self.text
+
+    def flush_cache(self) -> None:
+        pass
+
+
+class TestLazyExtraction(unittest.TestCase):
+    """Test only the pages needed to resolve the fields are extracted"""
+
+    def setUp(self):
+        """Build pages of a long statement around a header and a total"""
+        self.parser = ReceiptParser()
+        self.extracted = []
+        self.header = 'GRAND HOTEL\nFolio 01/15/2024\n'
+
+    def pages(self, *texts):
+        return [
+            FakePage(index, text, self.extracted)
+            for index, text in enumerate(texts)
+        ]
+
+    def test_first_and_last_pages(self):
+        """Test a header and total resolve the fields in two pages"""
+        pages = self.pages(
+            self.header, *['Night 120.00\n'] * 18, 'Total $2160.00\n'
+        )
+
+        texts = self.parser._extract_lazy(pages, 10)
+        receipt = self.parser.parse_text(''.join(texts.values()))
+
+        self.assertEqual(self.extracted, [0, 19])
+        self.assertEqual(receipt['merchant'], 'GRAND HOTEL')
+        self.assertEqual(receipt['date'], '01/15/2024')
+        self.assertEqual(receipt['amount'], '$2160.00')
+
+    def test_grows_the_missing_side(self):
+        """Test the total is searched for backwards from the last page"""
+        pages = self.pages(
+            self.header, 'Night 120.00\n', 'Total $240.00\n', 'Thank you\n'
+        )
+
+        self.parser._extract_lazy(pages, 10)
+
+        self.assertEqual(self.extracted, [0, 3, 2])
+
+    def test_page_budget(self):
+        """Test extraction stops at the budget when fields stay missing"""
+        pages = self.pages(*['Terms and conditions\n'] * 20)
+
+        self.parser._extract_lazy(pages, 3)
+
+        self.assertEqual(self.extracted, [0, 19, 1])
+
+    def test_full_extraction(self):
+        """Test every page is read when no budget is hit"""
+        pages = self.pages('A\n', 'B\n', 'C\n')
+
+        self.parser._extract_lazy(pages, 10)
+
+        self.assertEqual(sorted(self.extracted), [0, 1, 2])
+
+
+class FailingParser(ReceiptParser):
+    """Parser that fails on 'bad' files, picklable for worker processes"""
+
+    def parse_receipt(self, source, filename=None, sender=None):
+        if filename and filename.startswith('bad'):
+            raise ValueError('corrupt PDF')
+        return super().parse_receipt(source, filename, sender)
+
+
+class TestParseMany(unittest.TestCase):
+    """Test batches are parsed on the shared process pool"""
+
+    def setUp(self):
+        """Name copies of the sample receipt in memory"""
+        with patch('src.processors.pdf_parser.RECEIPT_CACHE_MAX_MB', 0):
+            self.parser = ReceiptParser()
+        self.payload = RECEIPT.read_bytes()
+        self.sources = [(f'{n}.pdf', self.payload) for n in range(4)]
+
+    def test_ordered_results(self):
+        """Test results come in input order with the parsed receipts"""
+        results = list(self.parser.parse_many(self.sources, workers=2))
+
+        self.assertEqual([r.index for r in results], [0, 1, 2, 3])
+        self.assertEqual(
+            [r.receipt['filename'] for r in results],
+            ['0.pdf', '1.pdf', '2.pdf', '3.pdf']
+        )
+        self.assertEqual(results[0].receipt['amount'], '$53.66')
+
+    def test_unordered_results(self):
+        """Test completion order still yields every file once"""
+        results = self.parser.parse_many(
+            self.sources + [RECEIPT], workers=2, ordered=False
+        )
+
+        by_index = {r.index: r for r in results}
+        self.assertEqual(sorted(by_index), [0, 1, 2, 3, 4])
+        self.assertEqual(by_index[4].filename, RECEIPT.name)
+
+    def test_failure_is_isolated(self):
+        """Test a file that raises does not affect the others"""
+        with patch('src.processors.pdf_parser.RECEIPT_CACHE_MAX_MB', 0):
+            parser = FailingParser()
+        results = list(parser.parse_many(
+            [('bad.pdf', self.payload), ('good.pdf', self.payload)],
+            workers=2
+        ))
+
+        self.assertIsInstance(results[0].error, ValueError)
+        self.assertIsNone(results[0].receipt)
+        self.assertIsNone(results[1].error)
+        self.assertEqual(results[1].receipt['amount'], '$53.66')
+
+    def test_pool_is_reused(self):
+        """Test workers stay warm between calls"""
+        list(self.parser.parse_many(self.sources[:1], workers=2))
+        pool = get_parse_pool(2)
+        list(self.parser.parse_many(self.sources[:1], workers=2))
+
+        self.assertIs(get_parse_pool(2), pool)
+
+    def test_other_sizes_do_not_cancel_queued_work(self):
+        """Test asking for another pool size leaves queued parses running"""
+        results = self.parser.parse_many(self.sources[:2], workers=2)
+        other = get_parse_pool(1)
+
+        self.assertIsNot(other, get_parse_pool(2))
+        self.assertEqual(
+            [result.error for result in results], [None, None]
+        )
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+
+"""
+Unit tests for the receipt parse cache
+"""
+
+import pickle
+import tempfile
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+from src.processors.attachment_store import content_hash
+from src.processors.pdf_parser import (
+    EXTRACTOR_VERSION, PARSER_VERSION, ReceiptParser
+)
+from src.processors.receipt_cache import ReceiptCache, get_receipt_cache
+
+RECEIPT = (
+    Path(__file__).parent.parent.parent / 'data' / 'sample_data' /
+    'receipts' / 'receipt_01_walmart_supercenter.pdf'
+)
+
+FIELDS = {'amount': '$1.00', 'date': '01/02/2024', 'merchant': 'SHOP'}
+
+
+class TestReceiptCache(unittest.TestCase):
+    """Test entries are keyed by content and versions, and evicted LRU"""
+
+    def setUp(self):
+        """Cache into a temporary file"""
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        self.path = Path(tmp_dir.name) / 'receipt_cache.sqlite3'
+        self.cache = ReceiptCache(self.path, max_bytes=100)
+
+    def test_round_trip(self):
+        """Test text and fields come back for the same extractor version"""
+        self.cache.put('a' * 64, 1, 'text', 1, FIELDS)
+
+        cached = self.cache.get('a' * 64, 1)
+
+        self.assertEqual(cached.text, 'text')
+        self.assertEqual(cached.parser_version, 1)
+        self.assertEqual(cached.fields, FIELDS)
+        self.assertIsNone(self.cache.get('a' * 64, 2))
+        self.assertIsNone(self.cache.get('b' * 64, 1))
+
+    def test_evicts_least_recently_used(self):
+        """Test the oldest unused entries go once text exceeds max_bytes"""
+        for key in 'abc':
+            self.cache.put(key, 1, 'x' * 40, 1, FIELDS)
+            if key == 'b':
+                # Used again, so 'a' is now the least recent
+                self.cache.get('a', 1)
+
+        self.assertIsNotNone(self.cache.get('a', 1))
+        self.assertIsNone(self.cache.get('b', 1))
+        self.assertIsNotNone(self.cache.get('c', 1))
+        self.assertEqual(self.cache.stats(), {'receipts': 2, 'bytes': 80})
+
+    def test_pickles_to_process_cache(self):
+        """Test parse workers share the cache file, not the connection"""
+        self.cache.get('a', 1)
+
+        copy = pickle.loads(pickle.dumps(self.cache))
+
+        self.assertIs(copy, get_receipt_cache(self.path))
+        self.assertEqual(copy.max_bytes, 100)
+
+
+class TestCachedParsing(unittest.TestCase):
+    """Test ReceiptParser skips pdfplumber for PDFs it has seen"""
+
+    def setUp(self):
+        """Parse through a temporary cache"""
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        self.cache = ReceiptCache(Path(tmp_dir.name) / 'receipt_cache.sqlite3')
+        self.parser = ReceiptParser(self.cache)
+        self.payload = RECEIPT.read_bytes()
+        self.key = content_hash(self.payload)
+        self.expected = self.parser.parse_receipt(self.payload, 'a.pdf')
+
+    def test_hit_skips_extraction(self):
+        """Test a duplicate PDF is parsed from the cache under its name"""
+        with patch('pdfplumber.open') as mock_open:
+            receipt = self.parser.parse_receipt(RECEIPT)
+
+        mock_open.assert_not_called()
+        self.assertEqual(receipt['amount'], '$53.66')
+        self.assertEqual(receipt, dict(self.expected, filename=RECEIPT.name))
+
+    def test_parser_version_reparses_text(self):
+        """Test new rules run on the cached text without pdfplumber"""
+        self.parser.amount_pattern = r'\$\d+\.\d{2}'
+        version = patch(
+            'src.processors.pdf_parser.PARSER_VERSION', PARSER_VERSION + 1
+        )
+        with version, patch('pdfplumber.open') as mock_open:
+            receipt = self.parser.parse_receipt(self.payload, 'a.pdf')
+
+        mock_open.assert_not_called()
+        self.assertEqual(receipt, self.expected)
+        self.assertEqual(
+            self.cache.get(self.key, EXTRACTOR_VERSION).parser_version,
+            PARSER_VERSION + 1
+        )
+
+    def test_extractor_version_extracts_again(self):
+        """Test a new extractor version opens the PDF again"""
+        version = patch(
+            'src.processors.pdf_parser.EXTRACTOR_VERSION',
+            EXTRACTOR_VERSION + 1
+        )
+        extract = patch.object(
+            self.parser, 'extract_text', return_value='$9.99'
+        )
+        with version, extract as mock_extract:
+            receipt = self.parser.parse_receipt(self.payload, 'a.pdf')
+
+        mock_extract.assert_called_once()
+        self.assertEqual(receipt['amount'], '$9.99')
+        self.assertEqual(
+            self.cache.get(self.key, EXTRACTOR_VERSION + 1).text, '$9.99'
+        )
+
+    def test_sender_template_is_not_cached(self):
+        """Test fields from a sender's template are not served without it"""
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        parser = ReceiptParser(
+            ReceiptCache(Path(tmp_dir.name) / 'receipt_cache.sqlite3')
+        )
+
+        mailed = parser.parse_receipt(self.payload, 'a.pdf', 'a@amazon.com')
+        with patch('pdfplumber.open') as mock_open:
+            receipt = parser.parse_receipt(self.payload, 'a.pdf')
+
+        mock_open.assert_not_called()
+        self.assertEqual(mailed['merchant'], 'Amazon')
+        self.assertEqual(receipt, self.expected)
+
+
+if __name__ == '__main__':
+    unittest.main()
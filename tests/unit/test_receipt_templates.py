@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+
+"""
+Unit tests for merchant receipt templates and their dispatch
+"""
+
+import unittest
+from src.processors.pdf_parser import ReceiptParser
+from src.processors.receipt_templates import (
+    ReceiptTemplate, TemplateRegistry, get_template_registry
+)
+
+AMAZON = '''Final Details for Order #112-0000000-0000000
+Order Placed: March 3, 2024
+Item Subtotal: $1,180.00
+Estimated tax: $97.35
+Grand Total: $1,277.35
+'''
+
+COSTCO = '''COSTCO WHOLESALE #1234
+03/05/24 18:12
+KS WATER 4.99
+SUBTOTAL 104.99
+**** TOTAL 112.34
+'''
+
+
+class TestTemplateDispatch(unittest.TestCase):
+    """Test templates are picked by sender domain, then header keyword"""
+
+    def setUp(self):
+        """Use the built-in templates"""
+        self.registry = get_template_registry()
+
+    def test_sender_domain(self):
+        """Test the sender's domain, or a parent domain, picks a template"""
+        for sender in (
+            'auto-confirm@amazon.com',
+            'Amazon.com <shipment-tracking@email.amazon.com>'
+        ):
+            template = self.registry.match('Thank you', sender)
+            self.assertEqual(template.merchant, 'Amazon')
+
+    def test_header_keyword(self):
+        """Test a header line starting with a keyword picks a template"""
+        self.assertEqual(self.registry.match(COSTCO).merchant, 'Costco')
+        self.assertEqual(
+            self.registry.match('Receipt\nUBER EATS\n').merchant, 'Uber Eats'
+        )
+        self.assertEqual(self.registry.match('Receipt\nUber\n').merchant,
+                         'Uber')
+
+    def test_sender_before_header(self):
+        """Test a known sender wins over a header keyword"""
+        template = self.registry.match('NETFLIX\n', 'no-reply@uber.com')
+
+        self.assertEqual(template.merchant, 'Uber')
+
+    def test_no_match(self):
+        """Test unknown senders and keywords past the header are ignored"""
+        text = 'CORNER STORE\n' * 5 + 'NETFLIX\n'
+
+        self.assertIsNone(self.registry.match(text, 'shop@example.com'))
+
+    def test_later_registration_wins(self):
+        """Test a template registered later replaces a shared keyword"""
+        registry = TemplateRegistry([ReceiptTemplate('Old', keywords=['X'])])
+        registry.register(ReceiptTemplate('New', keywords=['x']))
+
+        self.assertEqual(registry.match('X\n').merchant, 'New')
+
+
+class TestTemplateParsing(unittest.TestCase):
+    """Test templates extract what the generic rules get wrong"""
+
+    def setUp(self):
+        """Parse text without a cache"""
+        self.parser = ReceiptParser()
+
+    def test_amazon_order(self):
+        """Test the grand total and order date, not the last amount"""
+        receipt = self.parser.parse_text(AMAZON, 'order.pdf', 'a@amazon.com')
+
+        self.assertEqual(receipt, {
+            'amount': '$1277.35', 'date': '03/03/2024', 'merchant': 'Amazon',
+            'filename': 'order.pdf'
+        })
+
+    def test_costco_total(self):
+        """Test the total printed without a dollar sign is found"""
+        receipt = self.parser.parse_text(COSTCO)
+
+        self.assertEqual(receipt['amount'], '112.34')
+        self.assertEqual(receipt['date'], '03/05/2024')
+        self.assertEqual(receipt['merchant'], 'Costco')
+
+    def test_generic_fallback(self):
+        """Test missed fields and unknown merchants use the generic rules"""
+        receipt = self.parser.parse_text('NETFLIX\nPaid $15.49 on 2-1-24\n')
+        self.assertEqual(receipt['merchant'], 'Netflix')
+        self.assertEqual(receipt['amount'], '$15.49')
+        self.assertEqual(receipt['date'], '2-1-24')
+
+        receipt = self.parser.parse_text('CORNER STORE\n1/2/24\nTOTAL $3.00')
+        self.assertEqual(receipt['merchant'], 'CORNER STORE')
+        self.assertEqual(receipt['amount'], '$3.00')
+
+
+if __name__ == '__main__':
+    unittest.main()
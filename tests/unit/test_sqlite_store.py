@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+
+"""
+Unit tests for the shared SQLite connection and store registry helpers
+"""
+
+import tempfile
+import unittest
+from pathlib import Path
+from src.processors.sqlite_store import ProcessRegistry, SQLiteDatabase
+
+SCHEMA = 'CREATE TABLE IF NOT EXISTS items (name TEXT PRIMARY KEY);'
+
+
+class TestSQLiteDatabase(unittest.TestCase):
+    """Test the file is created on first use with its schema"""
+
+    def setUp(self):
+        """A database in a directory that does not exist yet"""
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        self.path = Path(tmp_dir.name) / 'nested' / 'store.sqlite3'
+
+    def test_created_on_first_connect(self):
+        """Test reads can check for the file before creating it"""
+        database = SQLiteDatabase(self.path, SCHEMA)
+        self.assertFalse(database.exists())
+
+        with database.connect() as db:
+            db.execute("INSERT INTO items VALUES ('a')")
+            db.commit()
+
+        self.assertTrue(database.exists())
+        with database.connect() as db:
+            rows = db.execute('SELECT name FROM items').fetchall()
+        self.assertEqual(rows, [('a',)])
+
+    def test_wal_mode(self):
+        """Test wal switches the journal mode"""
+        with SQLiteDatabase(self.path, SCHEMA, wal=True).connect() as db:
+            mode = db.execute('PRAGMA journal_mode').fetchone()[0]
+
+        self.assertEqual(mode, 'wal')
+
+
+class TestProcessRegistry(unittest.TestCase):
+    """Test one instance is created per key"""
+
+    def test_instances_are_shared(self):
+        """Test the same key returns the first instance"""
+        registry = ProcessRegistry()
+
+        first = registry.get('a', object)
+
+        self.assertIs(registry.get('a', object), first)
+        self.assertIsNot(registry.get('b', object), first)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+
+"""
+Unit tests for the web UI's email processing
+"""
+
+from datetime import datetime
+from pathlib import Path
+from unittest.mock import patch
+from src.processors.email_accounts import EmailAccount
+from src.processors.ledger_manager import LedgerManager
+from src.ui.web_app import app
+from tests.fake_imap_server import (
+    EmailServerTestCase, PASSWORD, USER, build_message
+)
+
+RECEIPT = (
+    Path(__file__).parent.parent.parent / 'data' / 'sample_data' /
+    'receipts' / 'receipt_01_walmart_supercenter.pdf'
+)
+
+
+class TestProcessEmails(EmailServerTestCase):
+    """Test the web UI ingests mail like the API and the CLI"""
+
+    def setUp(self):
+        """Point the web app at the fake server and a temporary ledger"""
+        super().setUp()
+        self.ledger_file = self.attachments_dir / 'ledger.beancount'
+        account = EmailAccount(
+            USER, PASSWORD, host='127.0.0.1', port=self.server.port,
+            ssl=False
+        )
+        for target, value in (
+            ('src.processors.ledger_manager.BEANCOUNT_FILE', self.ledger_file),
+            (
+                'src.processors.ingestion_index.INGESTION_INDEX_FILE',
+                self.attachments_dir / 'ingested.sqlite3'
+            ),
+            ('src.ui.web_app.email_sources', lambda: [(account, 'INBOX')])
+        ):
+            settings = patch(target, value)
+            settings.start()
+            self.addCleanup(settings.stop)
+        self.server.add_message(build_message(
+            'Receipt', datetime(2024, 1, 1),
+            [('receipt.pdf', RECEIPT.read_bytes())]
+        ))
+        self.client = app.test_client()
+
+    def test_receipts_link_their_email_and_attachment(self):
+        """Test transactions carry metadata and re-runs skip them"""
+        response = self.client.post('/process-emails', json={})
+
+        self.assertEqual(response.get_json()['processed_count'], 1)
+        self.assertEqual(len(LedgerManager().referenced_attachments()), 1)
+
+        for msg in self.server.folders['INBOX']:
+            msg.flags.clear()
+        response = self.client.post('/process-emails', json={})
+
+        self.assertEqual(response.get_json()['processed_count'], 0)
+        self.assertEqual(len(LedgerManager().get_transactions()), 1)